@@ -0,0 +1,216 @@
+"""
+Avaliação de Incidências Ambientais (AIncA, DL 140/99): leitura dos
+documentos, prompt do relatório fundamentado e exportação para Word.
+
+Lógica partilhada pela página 05_AIncA e pelo processamento em lote
+(batch_cli.py): não depende do Streamlit.
+"""
+import re
+import time
+from io import BytesIO
+
+from docx import Document
+from docx.shared import Pt, RGBColor
+
+import pdf_extract
+import retrieval
+
+# --- 1. BASE DE CONHECIMENTO SETORIAL ---
+SECTOR_GUIDES = {
+    "Geral / Outros": "Guia da Comissão Europeia (2011) - Avaliação de planos e projetos.",
+    "Infraestruturas Lineares (Estradas)": "Manual de apoio ICNB (2008) e Guia APA (2009) para Infraestruturas Rodoviárias.",
+    "Linhas Elétricas (Transporte >110kV)": "Manual CIBIO/ICNF/REN (2020) - Muito Alta Tensão e Avifauna. Atenção a Áreas Críticas.",
+    "Linhas Elétricas (Distribuição <110kV)": "Manual ICNB (2008) - Linhas de Distribuição e Avifauna.",
+    "Parques Eólicos": "Guias ICNB (2008) para Morcegos e APA (2009) para Parques Eólicos.",
+    "ETAR / Hidráulica": "Guia APA (2008) para ETARs.",
+    "Indústria Extrativa": "Guia CCDR-LVT (2008) para Minas e Pedreiras."
+}
+
+BLANK_PAGE = "[Página em branco ou imagem]"
+
+# ==========================================
+# --- 2. DOCUMENTOS ---
+# ==========================================
+
+def load_documents(file_list, cleaners, on_error=None):
+    """
+    Extrai os PDFs (carregados ou caminhos), em simultâneo, para Documents, já sem
+    cabeçalhos/rodapés repetidos. on_error(ficheiro, exceção) é chamado para
+    cada PDF ilegível; por omissão o erro é propagado.
+    """
+    return load_document_groups([file_list], cleaners, on_error)[0]
+
+def load_document_groups(groups, cleaners, on_error=None):
+    """
+    Como load_documents, para vários grupos de ficheiros (p.ex. projeto e
+    legislação) extraídos todos numa só passagem de extract_many. Devolve
+    uma lista de Documents por grupo.
+    """
+    groups = [[f for f in group or [] if f is not None] for group in groups]
+    files = [f for group in groups for f in group]
+    results = pdf_extract.extract_many(files, clean=True, cleaners=cleaners)
+    out, pos = [], 0
+    for group in groups:
+        docs = []
+        for f, doc in zip(group, results[pos:pos + len(group)]):
+            if isinstance(doc, Exception):
+                if on_error is None:
+                    raise doc
+                on_error(f, doc)
+            else:
+                docs.append(doc)
+        out.append(docs)
+        pos += len(group)
+    return out
+
+def get_text_with_page_markers(docs):
+    """
+    Texto com marcadores de página explícitos.
+    Isso permite à IA citar: 'Conforme Pág. 12 do ficheiro X'.
+    """
+    if not docs: return None, None
+    # INJEÇÃO DE METADADOS PARA A IA LER ([DOC: x | PÁG. n] por página)
+    text = "".join(
+        d.render(
+            blank=BLANK_PAGE,
+            header="\n\n=== INÍCIO DO DOCUMENTO: {name} ===\n",
+            footer="=== FIM DO DOCUMENTO: {name} ===\n"
+        )
+        for d in docs
+    )
+    return text, [d.name for d in docs]
+
+def report_sections(sector):
+    """Consultas BM25 para cada secção do relatório AIncA."""
+    return {
+        "Identificação e Enquadramento": "promotor localização concelho freguesia memória descritiva objetivo projeto área",
+        "Gestão do Sítio": "gestão sítio ZEC ZPE plano de gestão conservação classificado",
+        "Concorrência com AIA": "avaliação impacte ambiental AIA anexo decreto-lei 151-B/2013 enquadramento",
+        "Distância à Rede Natura 2000": "distância rede natura 2000 ZEC ZPE sítio sobreposição km metros limite",
+        "Fauna/Flora": "fauna flora habitat espécie avifauna quirópteros vegetação comunidades",
+        "Impactes na Integridade": "impacte incidência integridade significativo afetação perturbação fragmentação",
+        f"Guia Setorial ({sector})": sector,
+        "Medidas de Mitigação": "medida minimização mitigação compensação monitorização",
+    }
+
+def project_texts(docs_p, docs_l, sector):
+    """
+    Texto do projeto e dos anexos para o prompt. Devolve (texto_projeto,
+    texto_anexos, focado): num processo extenso só entram as páginas mais
+    relevantes para cada secção (focado=True, anexos incluídos no primeiro).
+    """
+    if retrieval.corpus_bytes(docs_p + docs_l) <= retrieval.FULL_TEXT_MAX_BYTES:
+        text_p, _ = get_text_with_page_markers(docs_p)
+        text_l, _ = get_text_with_page_markers(docs_l)
+        return text_p, text_l, False
+    text_p = retrieval.build_focused_context(docs_p + docs_l, report_sections(sector), blank=BLANK_PAGE)
+    return text_p, "", True
+
+# ==========================================
+# --- 3. PROMPT ---
+# ==========================================
+
+def report_prompt(selected_sector, text_p, text_l):
+    """Prompt de auditoria rigorosa (relatório em 5 secções com citação de página)."""
+    guia_especifico = SECTOR_GUIDES[selected_sector]
+    # Texto (e indentação) igual ao que a página sempre enviou: as respostas já
+    # guardadas na cache (llm_cache) continuam válidas
+    return f"""
+            Atua como Perito Sénior em Avaliação Ambiental (Especialista AIncA e Rede Natura 2000).
+            A tua tarefa é produzir um RELATÓRIO TÉCNICO DE FUNDAMENTAÇÃO.
+
+            === REGRAS DE OURO (OBRIGATÓRIAS) ===
+            1. **CITAÇÃO DE FACTOS:** Qualquer afirmação sobre o projeto (distâncias, áreas, características) DEVE ter a fonte exata.
+               Formato obrigatório: "O projeto ocupa 2ha..." [DOC: NomeDoFicheiro | PÁG. X].
+            2. **TRANSCRIÇÃO:** Sempre que possível, transcreve pequenas frases do documento original entre aspas para provar o ponto.
+               Ex: Como refere o promotor: "...não se preveem afetações..." [DOC: X | PÁG. Y].
+            3. **FUNDAMENTAÇÃO LEGAL:** Cita sempre o artigo da lei aplicável (DL 140/99).
+
+            === CONTEXTO TÉCNICO ===
+            Setor: {selected_sector}
+            Guia de Referência: {guia_especifico}
+            
+            === DADOS DO PROJETO (COM MARCADORES DE PÁGINA) ===
+            {text_p}
+            {text_l}
+            
+            === ESTRUTURA DO RELATÓRIO ===
+            
+            ## 1. DADOS DE IDENTIFICAÇÃO E ENQUADRAMENTO
+            (Identifica o Promotor, Localização e Resumo do Projeto com base nos documentos. Cita a página da Memória Descritiva).
+            
+            ## 2. TRIAGEM JURÍDICA (SCREENING)
+            - **Gestão do Sítio:** O projeto é para gestão da ZEC/ZPE? (Cita onde leste isto).
+            - **Concorrência com AIA:** Verifica se o projeto cai nos Anexos do DL 151-B/2013. Se sim, conclui que a AIncA é integrada na AIA.
+            - **Afetação Significativa:** Distância à Rede Natura 2000 mais próxima. Há sobreposição? [Cita Pág.]
+            
+            ## 3. ANÁLISE DE INCIDÊNCIAS (FACTOS E EVIDÊNCIAS)
+            (Aqui deves usar as citações de página intensivamente).
+            - Descritor Fauna/Flora: O que diz o projeto? [Cita Pág.]
+            - Impactos na Integridade: O que diz o estudo de incidências? [Cita Pág.]
+            - Cumprimento do Guia Setorial ({selected_sector}).
+            
+            ## 4. EVIDÊNCIAS TRANSCRITAS
+            (Lista 3 a 5 frases chave copiadas ipsis verbis dos documentos que suportam a tua decisão).
+            
+            ## 5. CONCLUSÃO E PARECER TÉCNICO
+            - O projeto carece de AIncA aprofundada?
+            - Está dispensado?
+            - Que medidas de mitigação são essenciais?
+            """
+
+# ==========================================
+# --- 4. WORD ---
+# ==========================================
+
+def create_word_docx(text, p_files, l_files, tipologia):
+    """Gera Word com formatação profissional."""
+    doc = Document()
+    
+    # Estilo do Título
+    title = doc.add_heading('Parecer Técnico AIncA Fundamentado', 0)
+    title.alignment = 1 # Center
+    
+    # Metadados
+    p = doc.add_paragraph()
+    runner = p.add_run(f"Tipologia: {tipologia}\n")
+    runner.bold = True
+    p.add_run(f"Data da Análise: {time.strftime('%d/%m/%Y')}\n")
+    p.add_run(f"Documentos Analisados: {', '.join(p_files) if p_files else 'N/A'}")
+    
+    doc.add_paragraph("---")
+    
+    # Processamento do Markdown para Word
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line: continue
+        
+        if line.startswith('## '): 
+            h = doc.add_heading(line.replace('##', '').strip(), 1)
+            h.style.font.color.rgb = RGBColor(0, 51, 102) # Azul escuro
+            
+        elif line.startswith('### '): 
+            h = doc.add_heading(line.replace('###', '').strip(), 2)
+            
+        elif line.startswith('- ') or line.startswith('* '): 
+            p = doc.add_paragraph(style='List Bullet')
+            # Tenta detetar citações [Doc X, Pag Y] e pôr a negrito
+            parts = re.split(r'(\[.*?Pág.*?\])', line[2:], flags=re.IGNORECASE)
+            for part in parts:
+                run = p.add_run(part)
+                if "[" in part and "Pág" in part:
+                    run.bold = True
+                    run.font.size = Pt(9)
+                    run.font.color.rgb = RGBColor(80, 80, 80) # Cinza escuro
+                    
+        elif line.startswith('>'): # Citações transcritas
+            p = doc.add_paragraph(style='Intense Quote')
+            p.add_run(line.replace('>', '').strip()).italic = True
+            
+        else: 
+            doc.add_paragraph(line)
+        
+    buffer = BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,231 @@
+"""
+Parecer Técnico de Auditoria Ambiental (protocolo PATE): leitura do corpus,
+pesquisa web, prompt e exportação para Word.
+
+Lógica partilhada pela página 03_Ambiente e por outros pontos de entrada
+(p.ex. benchmark.py): não depende do Streamlit.
+"""
+import re
+import time
+from io import BytesIO
+
+from docx import Document
+from docx.shared import Pt, RGBColor
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from duckduckgo_search import DDGS
+
+import pdf_extract
+import retrieval
+
+# --- 1. CONFIGURAÇÃO ---
+BLANK_PAGE = "[Página em branco/imagem]"
+
+# Consultas BM25 por secção do parecer (usadas quando o corpus é extenso)
+REPORT_SECTIONS = {
+    "Enquadramento e Maturidade": "objetivo âmbito enquadramento projeto plano estratégia fase maturidade promotor",
+    "Conformidade Legal e Normativa": "legislação decreto-lei regulamento diretiva lei artigo conformidade licenciamento",
+    "Indicadores e Monitorização": "indicador meta baseline monitorização kpi valor unidade ano referência",
+    "Riscos Críticos e Lacunas": "risco lacuna impacte ameaça incerteza falta omissão",
+    "Conclusões e Recomendações": "conclusão recomendação medida proposta síntese",
+}
+
+# ==========================================
+# --- 2. CORPUS ---
+# ==========================================
+
+def load_documents(files, cleaners, on_error=None):
+    """
+    Documentos sem cabeçalhos/rodapés repetidos, extraídos em simultâneo e
+    alinhados com `files` (None para entradas None ou PDFs ilegíveis); os
+    limpadores ficam em `cleaners`. on_error(ficheiro, exceção) é chamado
+    para cada PDF ilegível; por omissão o erro é propagado.
+    """
+    docs = pdf_extract.extract_many(files, clean=True, cleaners=cleaners)
+    for i, (f, doc) in enumerate(zip(files, docs)):
+        if isinstance(doc, Exception):
+            if on_error is None:
+                raise doc
+            on_error(f, doc)
+            docs[i] = None
+    return docs
+
+def load_document(pdf_file, cleaners, on_error=None):
+    """Um só documento (ver load_documents)."""
+    return load_documents([pdf_file], cleaners, on_error)[0]
+
+def get_pdf_text_with_pages(doc, simple_citation=False):
+    return doc.render(
+        simple_citation=simple_citation,
+        blank=BLANK_PAGE,
+        header="\n\n=== DOCUMENTO FONTE: {name} ===\n",
+        footer="=== FIM DE: {name} ===\n"
+    )
+
+def corpus_texts(doc_main, docs_extra, web_query=""):
+    """
+    Texto do documento principal e dos anexos para o prompt. Devolve
+    (texto_principal, texto_anexos, focado): num corpus extenso só entram as
+    páginas mais relevantes para cada secção do parecer (focado=True).
+    """
+    all_docs = [d for d in [doc_main, *docs_extra] if d]
+    if retrieval.corpus_bytes(all_docs) <= retrieval.FULL_TEXT_MAX_BYTES:
+        txt_main = get_pdf_text_with_pages(doc_main, simple_citation=not docs_extra) if doc_main else ""
+        txt_extra = "".join(get_pdf_text_with_pages(d) + "\n" for d in docs_extra)
+        return txt_main, txt_extra, False
+    sections = dict(REPORT_SECTIONS)
+    if web_query:
+        sections["Tema da Pesquisa"] = web_query
+    txt_main = retrieval.build_focused_context(all_docs, sections, blank=BLANK_PAGE)
+    txt_extra = "(Os excertos relevantes dos anexos estão incluídos no documento em análise, por secção.)"
+    return txt_main, txt_extra, True
+
+def search_online(query):
+    if not query: return ""
+    results_text = ""
+    try:
+        with DDGS() as ddgs:
+            results = list(ddgs.text(f"{query} legislação portugal ecologia", max_results=3))
+        for r in results:
+            results_text += f"\n>>> FONTE EXTERNA (WEB): {r['title']} ({r['href']}) <<<\n{r['body']}\n"
+        return results_text
+    except Exception as e:
+        return f"Erro na pesquisa web: {str(e)}"
+
+# ==========================================
+# --- 3. PROMPT ---
+# ==========================================
+
+def report_prompt(target_text, lib_ctx, manual_ctx, web_ctx):
+    """Prompt do parecer (5 secções, indicadores em blocos citados)."""
+    return f"""
+    Atua como **Auditor Ambiental Sénior e Investigador Académico**.
+    
+    ⚠️ RESTRIÇÃO DE PERSONA:
+    Nunca utilizes o termo "Analista". Utiliza "O Auditor", "Este Parecer" ou discurso impessoal ("Verifica-se").
+    
+    === CONTEXTO LEGAL ===
+    {lib_ctx}
+    
+    === ANEXOS TÉCNICOS ===
+    {manual_ctx}
+    
+    === PESQUISA ===
+    {web_ctx}
+    
+    === DOCUMENTO EM ANÁLISE ===
+    {target_text}
+    
+    TAREFA:
+    Elaborar um **Parecer Técnico de Auditoria** com elevado rigor científico.
+    
+    ESTRUTURA OBRIGATÓRIA:
+    
+    ## 1. Enquadramento e Maturidade
+    
+    ## 2. Conformidade Legal e Normativa
+    
+    ## 3. Análise de Indicadores e Monitorização (KPIs)
+    (Se existirem indicadores, usa ESTRITAMENTE este formato para CADA um):
+    
+    #### [Nome do Indicador]
+    > **Descrição e Objetivo:** [Texto explicativo...] [CITAR].
+    > **Meta e Baseline:** [Texto com dados...] [CITAR].
+    > **Análise Crítica:** [Texto analítico...] [CITAR].
+    
+    ## 4. Riscos Críticos e Lacunas
+    
+    ## 5. Conclusões e Recomendações Técnicas
+    """
+
+# ==========================================
+# --- 4. WORD ---
+# ==========================================
+
+def format_paragraph(paragraph, text):
+    """
+    Processa o texto para o Word com robustez:
+    Detecta **Negrito** e [Citações] e aplica estilos corretos.
+    """
+    # Regex divide o texto em: Texto Normal | **Negrito** | Texto Normal
+    parts = re.split(r'(\*\*.*?\*\*)', text)
+    
+    for part in parts:
+        # Se for um bloco de negrito markdown (**texto**)
+        if part.startswith('**') and part.endswith('**'):
+            clean_text = part.replace('**', '')
+            run = paragraph.add_run(clean_text)
+            run.bold = True
+        else:
+            # Se for texto normal, processamos as citações dentro dele
+            citation_parts = re.split(r'(\[.*?PÁG.*?\])', part)
+            for sub_part in citation_parts:
+                run = paragraph.add_run(sub_part)
+                # Formatação da citação
+                if "[" in sub_part and "PÁG" in sub_part and "]" in sub_part:
+                    run.font.size = Pt(9)
+                    run.font.color.rgb = RGBColor(80, 80, 80) # Cinza escuro
+                    run.bold = True
+
+def create_docx(text):
+    """Gera DOCX com parsing avançado via Regex."""
+    doc = Document()
+    
+    title = doc.add_heading('Parecer Técnico de Auditoria Ambiental', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    p_date = doc.add_paragraph(f"Data da Emissão: {time.strftime('%d/%m/%Y')}")
+    p_date.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph("---")
+    
+    # Regex para capturar cabeçalhos (#, ##, ###, ####)
+    # Captura os cardinal e o texto separadamente
+    re_header = re.compile(r'^(#{1,6})\s+(.*)')
+    
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line: continue
+        
+        # 1. TÍTULOS (Detecção via Regex)
+        header_match = re_header.match(line)
+        if header_match:
+            hashes, content = header_match.groups()
+            level = len(hashes)
+            # Remove formatação markdown do título para o índice do Word ficar limpo
+            clean_title = content.replace('**', '')
+            
+            if level == 1:
+                h = doc.add_heading(clean_title, level=1)
+                h.style.font.color.rgb = RGBColor(0, 50, 100)
+            elif level == 2:
+                doc.add_heading(clean_title, level=2)
+            else:
+                # Níveis 3, 4, etc.
+                doc.add_heading(clean_title, level=min(level, 3))
+            continue
+
+        # 2. LISTAS
+        if line.startswith('- ') or line.startswith('* '): 
+            clean_line = line[2:] 
+            p = doc.add_paragraph(style='List Bullet')
+            p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+            format_paragraph(p, clean_line)
+            continue
+            
+        # 3. CITAÇÕES / INDICADORES (Blocos >)
+        if line.startswith('>'): 
+            # Usa estilo 'Intense Quote' ou 'Normal' com itálico se preferir
+            p = doc.add_paragraph(style='Intense Quote') 
+            clean_line = line.replace('>', '').strip()
+            format_paragraph(p, clean_line) 
+            p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+            continue
+            
+        # 4. TEXTO NORMAL
+        p = doc.add_paragraph()
+        p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+        format_paragraph(p, line) 
+            
+    b = BytesIO()
+    doc.save(b)
+    b.seek(0)
+    return b
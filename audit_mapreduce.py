@@ -0,0 +1,255 @@
+"""
+Auditoria map-reduce de processos EIA com vários volumes.
+
+Em vez de enviar o processo completo (até 2 GB) como um único anexo da
+File API, o texto extraído é dividido por volume e, nos volumes grandes,
+por intervalos de páginas. Cada parte é auditada em separado (map), com um
+limite de pedidos em simultâneo, e devolve constatações com a citação
+[DOC: x | PÁG. n]. Um passo final (reduce) funde as constatações no
+relatório de cinco secções.
+
+O resultado de cada parte fica num checkpoint em disco, identificado pelo
+modelo, pelas instruções e pelos hashes dos PDFs: se a sessão cair ou a
+página for recarregada, as partes já auditadas não voltam a ser pedidas.
+O checkpoint é apagado quando o relatório fica concluído; os abandonados
+são apagados ao fim do prazo de retenção dos trabalhos.
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pdf_cache
+import token_budget
+
+# --- 1. CONFIGURAÇÃO ---
+CHECKPOINT_DIR = os.path.join(pdf_cache.CACHE_ROOT, "audit_checkpoints")
+MAP_CONCURRENCY = int(os.environ.get("SUPERAPP_AUDIT_CONCURRENCY", "4"))
+CHUNK_TOKENS = int(os.environ.get("SUPERAPP_AUDIT_CHUNK_TOKENS", "60000"))
+KEEP_DAYS = float(os.environ.get("SUPERAPP_JOB_KEEP_DAYS", "14"))   # Mesma retenção que jobs.py
+CHECK_INTERVAL = 1.0      # Segundos entre verificações de cancelamento durante o map
+MIN_CHARS_PER_PAGE = 40   # Abaixo disto o PDF é tratado como digitalizado (sem texto)
+BLANK_PAGE = "[Página sem texto extraível]"
+
+# ==========================================
+# --- 2. DIVISÃO EM PARTES ---
+# ==========================================
+
+class Chunk:
+    """Parte do processo: um volume ou um intervalo de páginas de um volume."""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.tokens = 0
+
+    @property
+    def first(self):
+        return self.doc.first_number
+
+    @property
+    def last(self):
+        return self.doc.first_number + len(self.doc) - 1
+
+    @property
+    def key(self):
+        return f"{self.doc.digest or self.doc.name}:{self.first}-{self.last}"
+
+    @property
+    def label(self):
+        return f"{self.doc.name} (págs. {self.first}-{self.last})"
+
+
+def has_text(docs):
+    """True se os volumes têm texto suficiente para a análise por partes."""
+    pages = sum(len(d) for d in docs)
+    return pages > 0 and sum(d.nchars for d in docs) >= MIN_CHARS_PER_PAGE * pages
+
+def plan_chunks(docs, model_name, fixed_tokens=0, chunk_tokens=CHUNK_TOKENS, catalog_limit=None):
+    """
+    Divide os volumes em partes de até `chunk_tokens` tokens (estimados),
+    cortando sempre entre páginas. Um volume pequeno é uma parte só.
+    """
+    limit = token_budget.context_limit(model_name, catalog_limit)
+    room = int(limit * (1 - token_budget.SAFETY_MARGIN)) - token_budget.OUTPUT_RESERVE - fixed_tokens
+    budget = max(1, min(chunk_tokens, room))
+
+    chunks = []
+    for doc in docs:
+        start, used = 0, 0
+        for i, page in enumerate(doc):
+            cost = token_budget.estimate_tokens(page.text)
+            if used and used + cost > budget:
+                chunk = Chunk(doc[start:i])
+                chunk.tokens = used
+                chunks.append(chunk)
+                start, used = i, 0
+            used += cost
+        if len(doc) > start:
+            chunk = Chunk(doc[start:])
+            chunk.tokens = used
+            chunks.append(chunk)
+    return chunks
+
+# ==========================================
+# --- 3. PROMPTS ---
+# ==========================================
+
+def map_prompt(context_parts, chunk, index, total):
+    return "\n".join([
+        *context_parts,
+        f"\n=== PARTE {index} DE {total} DO PROCESSO: {chunk.label} ===\n",
+        chunk.doc.render(blank=BLANK_PAGE),
+        "\n=== INSTRUÇÃO (FASE DE RECOLHA) ===\n",
+        "Estás a analisar APENAS esta parte do processo. NÃO escrevas o relatório final.",
+        "Lista as constatações desta parte agrupadas pelas 5 secções da ESTRUTURA DA RESPOSTA "
+        "(títulos ## 1. a ## 5.), em tópicos curtos e factuais.",
+        "Cada tópico termina com a citação no formato [DOC: nome | PÁG. n].",
+        "Se uma secção não tiver constatações nesta parte, escreve apenas \"Sem constatações.\"",
+    ])
+
+def reduce_prompt(context_parts, findings, missing=()):
+    parts = [*context_parts, "\n=== CONSTATAÇÕES RECOLHIDAS POR PARTE DO PROCESSO ===\n"]
+    for label, text in findings:
+        parts.append(f"\n### {label}\n{text}\n")
+    if missing:
+        parts.append("\n(Partes NÃO auditadas por erro: " + "; ".join(missing) + ". Assinala esta lacuna no relatório.)\n")
+    parts += [
+        "\n=== INSTRUÇÃO FINAL ===\n",
+        "Funde as constatações num ÚNICO relatório com a ESTRUTURA DA RESPOSTA indicada (5 secções).",
+        "Elimina repetições entre partes, mas mantém TODAS as citações [DOC | PÁG.] que suportam cada ponto.",
+        "Assinala contradições entre volumes. Não inventes factos que não constem das constatações.",
+    ]
+    return "\n".join(parts)
+
+# ==========================================
+# --- 4. CHECKPOINTS ---
+# ==========================================
+
+def run_id(model_name, context_parts, digests):
+    h = hashlib.sha256(model_name.encode("utf-8"))
+    for p in [*context_parts, *digests]:
+        h.update(b"\x00" + str(p).encode("utf-8"))
+    return h.hexdigest()
+
+
+_pruned = False
+
+def _prune():
+    """Apaga (uma vez por processo) os checkpoints com mais de KEEP_DAYS dias."""
+    global _pruned
+    if _pruned:
+        return
+    _pruned = True
+    limit = time.time() - KEEP_DAYS * 86400
+    try:
+        entries = list(os.scandir(CHECKPOINT_DIR))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < limit:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+class Checkpoint:
+    """Resultados das partes já auditadas de uma execução (JSON gravado de forma atómica)."""
+
+    def __init__(self, rid):
+        _prune()
+        self.path = os.path.join(CHECKPOINT_DIR, f"{rid}.json")
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                self._done = json.load(fh)
+        except (OSError, ValueError):
+            self._done = {}
+
+    def __contains__(self, key):
+        return key in self._done
+
+    def get(self, key):
+        return self._done.get(key)
+
+    def put(self, key, text):
+        with self._lock:
+            self._done[key] = text
+            os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=CHECKPOINT_DIR, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                    json.dump(self._done, fh, ensure_ascii=False)
+                os.replace(tmp, self.path)
+            except OSError:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            self._done = {}
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+# ==========================================
+# --- 5. EXECUÇÃO ---
+# ==========================================
+
+def run_map(client, model_name, chunks, context_parts, checkpoint, force=False, workers=MAP_CONCURRENCY, stage=None,
+            check=None):
+    """
+    Audita as partes em paralelo (no máximo `workers` pedidos de cada vez).
+    Gerador de (índice, parte, texto ou exceção, veio_do_checkpoint) pela
+    ordem em que terminam; é consumido na thread do chamador, que pode
+    assim atualizar a interface. `stage` (telemetry.Stage) soma os pedidos
+    de todas as partes; as partes do checkpoint contam como acertos.
+    `check` (p.ex. Job.check) é chamado pelo menos a cada CHECK_INTERVAL
+    segundos; se levantar uma exceção, as partes ainda não iniciadas não
+    são pedidas (as que já estão em curso terminam e ficam no checkpoint).
+    """
+    if force:
+        checkpoint.clear()
+    total = len(chunks)
+    todo = []
+    for i, chunk in enumerate(chunks):
+        if check:
+            check()
+        if chunk.key in checkpoint:
+            if stage:
+                stage.add(cache_hits=1)
+            yield i, chunk, checkpoint.get(chunk.key), True
+        else:
+            todo.append(i)
+    if not todo:
+        return
+
+    def _audit(i):
+        prompt = map_prompt(context_parts, chunks[i], i + 1, total)
+        text = client.generate(model_name, prompt, request_options={"timeout": 600}, force=force, stage=stage).text
+        checkpoint.put(chunks[i].key, text)
+        return text
+
+    ex = ThreadPoolExecutor(max_workers=max(1, min(workers, len(todo))))
+    try:
+        futures = {ex.submit(_audit, i): i for i in todo}
+        pending = set(futures)
+        while pending:
+            if check:
+                check()
+            done, pending = wait(pending, timeout=CHECK_INTERVAL, return_when=FIRST_COMPLETED)
+            for fut in done:
+                i = futures[fut]
+                try:
+                    yield i, chunks[i], fut.result(), False
+                except Exception as e:
+                    yield i, chunks[i], e, False
+    finally:
+        # Cancelamento ou erro do chamador: não inicia as partes que faltam
+        ex.shutdown(wait=False, cancel_futures=True)
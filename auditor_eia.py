@@ -0,0 +1,287 @@
+"""
+Auditor EIA: auditoria crítica de processos EIA face à legislação e aos
+benchmarks setoriais, por partes (map-reduce) ou com os volumes em anexo
+(File API), e exportação para Word.
+
+Lógica partilhada pela página 04_Auditor_EIA e por outros pontos de entrada
+(p.ex. benchmark.py): não depende do Streamlit. As funções recebem um
+objeto `progress` com a interface de st.status (p.ex. um jobs.Job).
+"""
+import io
+from datetime import datetime
+
+from docx import Document
+from docx.shared import Pt, RGBColor
+
+import gemini_client
+import model_catalog
+import pdf_cache
+import pdf_extract
+import token_budget
+import audit_mapreduce
+import file_registry
+import telemetry
+import prefetch
+
+# ==========================================
+# --- 1. BASE DE DADOS: CRITÉRIOS DE RIGOR (BENCHMARKS) ---
+# ==========================================
+
+# Legislação Base (Sempre verificada)
+COMMON_LAWS = {
+    "RJAIA (DL 151-B/2013 consolidado)": "Regime Jurídico da AIA",
+    "SIMPLEX (DL 11/2023)": "Simplificação Licenciamento",
+    "LUA (DL 75/2015)": "Licenciamento Único",
+    "Rede Natura 2000": "DL 140/99"
+}
+
+# Benchmarks de Qualidade (O que a IA deve exigir)
+SECTOR_BENCHMARKS = {
+    "Energia (Eólica, Solar, Linhas)": """
+    CRITÉRIOS DE RIGOR (PORTUGAL - APA/ICNF):
+    1. Avifauna: O ciclo de monitorização foi ANUAL (4 estações)? Se for < 12 meses, é uma falha grave.
+    2. Solar: Existe Estudo de Encandeamento (Glare)? As vedações permitem passagem de fauna (>20cm solo)?
+    3. Ruído: A modelação considerou o pior cenário noturno e recetores sensíveis isolados?
+    4. Cumulativos: Avaliou parques vizinhos num raio de 10km?
+    """,
+    "Indústria Extrativa (Minas/Pedreiras)": """
+    CRITÉRIOS DE RIGOR (PORTUGAL - DGEG):
+    1. PARP: O Plano de Recuperação Paisagística tem orçamento detalhado e cronograma financeiro?
+    2. Vibrações: Existe estudo de uso de explosivos com sismógrafos nos edifícios vizinhos?
+    3. Hidrogeologia: O cone de bombagem afeta furos de captação privados vizinhos?
+    4. Poeiras: Há medidas concretas (aspersão, lavagem de rodados) ou apenas genéricas?
+    """,
+    "Agropecuária e Hidráulica": """
+    CRITÉRIOS DE RIGOR (PORTUGAL):
+    1. Efluentes: Capacidade de armazenamento para 4-6 meses (inverno)?
+    2. Odores: Modelação de dispersão de odores para povoações < 500m.
+    3. Água: Título de utilização hídrica (TUH) compatível com os caudais do projeto?
+    """,
+    "Urbanismo e Turismo": """
+    CRITÉRIOS DE RIGOR:
+    1. Saneamento: Ligação à rede pública garantida ou ETAR própria dimensionada?
+    2. Cargas: Estudo de Tráfego considera a sazonalidade (picos de verão)?
+    3. PDM: Verifica índices de impermeabilização e cérceas máximas.
+    """
+}
+DEFAULT_BENCHMARK = "Critérios Gerais de Boa Prática em EIA."
+
+MODE_MAP_REDUCE = "Por partes (map-reduce)"
+MODE_SINGLE = "Volumes em anexo (File API)"
+
+def audit_instructions(project_type):
+    """Instruções do auditor (persona e estrutura da resposta)."""
+    return f"""
+Atua como um **Auditor Sénior da Agência Portuguesa do Ambiente (APA)**.
+A tua missão NÃO é resumir o documento, mas sim encontrar **FALHAS, OMISSÕES e INCONSISTÊNCIAS**.
+
+Tipologia do Projeto: {project_type}
+
+ESTRUTURA DA RESPOSTA (Markdown):
+
+## 1. CONFORMIDADE ADMINISTRATIVA E LEGAL
+   - O RNT cumpre o RJAIA? É claro para a população?
+   - O projeto respeita as condicionantes (REN, RAN, Domínio Hídrico)? Cita evidências.
+   - O DL 11/2023 (Simplex) foi bem aplicado?
+
+## 2. ANÁLISE CRÍTICA VS BENCHMARKS
+   - Compara o EIA com os "Benchmarks de Exigência" fornecidos. O projeto cumpre os standards nacionais?
+   - **Estudo de Alternativas:** Foi real ou apenas para justificar a escolha prévia?
+   - **Dados de Base:** Os dados (tráfego, ruído, fauna) são atuais (< 2 anos) ou desatualizados?
+
+## 3. IDENTIFICAÇÃO DE "FATAL FLAWS" (ERROS GRAVES)
+   - Lista pontos que inviabilizam o projeto ou requerem alterações profundas.
+   - Ex: Construção em zona proibida, falta de água assegurada, perigo para saúde pública.
+
+## 4. IMPACTES SUBVALORIZADOS PELO PROMOTOR
+   - Onde é que o EIA diz "Impacte Pouco Significativo" mas tu, como perito, discordas?
+   - As Medidas de Minimização são vagas (ex: "boas práticas") ou concretas?
+
+## 5. PARECER TÉCNICO E PEDIDO DE ELEMENTOS
+   - O estudo permite decidir? Ou é necessário pedir "Elementos Adicionais" (Aditamento)?
+   - O que falta entregar?
+
+REGRAS:
+- Fundamenta sempre com **REFERÊNCIA À PÁGINA** do PDF (ex: "Ref: Pág. 45, Tomo I").
+- Sê rigoroso, técnico e direto.
+"""
+
+# ==========================================
+# --- 2. FUNÇÕES CORE ---
+# ==========================================
+
+def load_volumes(uploaded_files, progress):
+    """Texto (limpo) de cada volume do processo. Os erros de leitura são reportados e o volume ignorado."""
+    with telemetry.of(progress).stage("extração") as stage:
+        docs = []
+        for f, doc in zip(uploaded_files, pdf_extract.extract_many(uploaded_files, clean=True)):
+            if isinstance(doc, Exception):
+                progress.write(f"❌ Erro ao ler {f.name}: {doc}")
+            elif doc is not None:
+                docs.append(doc)
+        stage.add(**telemetry.doc_stats(docs))
+    return docs
+
+def audit_context(prompt_instructions, benchmark_text, laws_dict):
+    """Partes comuns do prompt: instruções, legislação e benchmark."""
+    laws_str = "\n".join([f"- {k}: {v}" for k, v in laws_dict.items()])
+    return [
+        prompt_instructions,
+        "\n=== QUADRO LEGISLATIVO A CUMPRIR ===\n",
+        laws_str,
+        "\n=== BENCHMARKS DE EXIGÊNCIA TÉCNICA (NÃO IGNORAR) ===\n",
+        "O projeto DEVE ser comparado com estes standards nacionais:",
+        benchmark_text,
+    ]
+
+def analyze_map_reduce(docs, prompt_instructions, benchmark_text, laws_dict, key, model_name, progress, file_hashes=(), force=False):
+    """
+    Auditoria por partes: cada volume (ou intervalo de páginas) é auditado em
+    paralelo e as constatações são fundidas no relatório final, que é
+    produzido em pedaços (streaming). As partes concluídas ficam em checkpoint.
+    """
+    client = gemini_client.get_client(key)
+    context_parts = audit_context(prompt_instructions, benchmark_text, laws_dict)
+    fixed = sum(token_budget.estimate_tokens(p) for p in context_parts)
+    chunks = audit_mapreduce.plan_chunks(
+        docs, model_name, fixed_tokens=fixed,
+        catalog_limit=model_catalog.input_token_limit(key, model_name)
+    )
+    checkpoint = audit_mapreduce.Checkpoint(audit_mapreduce.run_id(model_name, context_parts, file_hashes))
+    progress.write(f"🧩 Processo dividido em {len(chunks)} partes ({audit_mapreduce.MAP_CONCURRENCY} em simultâneo)...")
+
+    trace = telemetry.of(progress)
+    bar = progress.progress(0.0)
+    results = [None] * len(chunks)
+    missing = []
+    with trace.stage(f"map ({len(chunks)} partes)") as stage:
+        for n, (i, chunk, res, restored) in enumerate(
+            audit_mapreduce.run_map(client, model_name, chunks, context_parts, checkpoint, force=force, stage=stage,
+                                    check=getattr(progress, "check", None)), 1
+        ):
+            if isinstance(res, Exception):
+                missing.append(chunk.label)
+                progress.write(f"❌ {chunk.label}: {res}")
+            else:
+                results[i] = res
+                progress.write(f"{'♻️ (checkpoint)' if restored else '✅'} {chunk.label}")
+            bar.progress(n / len(chunks))
+
+    findings = [(c.label, r) for c, r in zip(chunks, results) if r is not None]
+    if not findings:
+        raise ValueError("Nenhuma parte do processo foi auditada.")
+    progress.write("🧠 A consolidar as constatações no relatório final...")
+    with trace.stage("reduce") as stage:
+        yield from client.stream(
+            model_name, audit_mapreduce.reduce_prompt(context_parts, findings, missing),
+            request_options={"timeout": 600}, force=force, stage=stage
+        )
+    # Relatório concluído: as partes já não são precisas
+    checkpoint.clear()
+
+def analyze_large_document(uploaded_files, prompt_instructions, benchmark_text, laws_dict, key, model_name, progress, file_hashes=(), force=False):
+    """
+    Auditoria com os volumes em anexo (File API). Os volumes já enviados
+    noutra auditoria são reutilizados (file_registry). Produz o texto em
+    pedaços (streaming).
+    """
+    client = gemini_client.get_client(key)
+    trace = telemetry.of(progress)
+
+    # 0. Montagem do Prompt Complexo (os ficheiros são acrescentados após o upload)
+    full_prompt = audit_context(prompt_instructions, benchmark_text, laws_dict) + [
+        "\n=== INSTRUÇÃO FINAL ===\n",
+        "Analisa os volumes do processo em anexo. Sê implacável na procura de erros. Cita sempre o volume e a página.",
+    ]
+
+    # Mesmo processo, benchmark e modelo: devolve a auditoria guardada sem novo upload
+    if file_hashes and not force:
+        with trace.stage("modelo") as stage:
+            cached = client.cached(model_name, full_prompt, file_hashes, stage=stage)
+        if cached is not None:
+            yield cached.text
+            return
+
+    # 1. Upload (em paralelo, por volume; reutiliza os ficheiros que ainda existem na File API)
+    progress.write("📤 A enviar volumes do processo para a Google Cloud (File API)...")
+    with trace.stage("upload (File API)") as stage:
+        uploads = file_registry.upload_many(client, uploaded_files)
+
+        # 2. Aguarda o processamento de cada volume (consulta com intervalos crescentes)
+        remote_files = []
+        reused = 0
+        for fut in uploads:
+            remote, was_reused = fut.result()
+            remote_files.append(remote)
+            reused += was_reused
+        stage.add(bytes=sum(pdf_cache.file_size(f) for f in uploaded_files), cache_hits=reused)
+    if reused:
+        progress.write(f"♻️ {reused} de {len(remote_files)} volumes reutilizados de uma auditoria anterior.")
+    progress.write(f"✅ Indexação concluída. A iniciar Auditoria Crítica ({model_name})...")
+
+    # 3. Geração (Timeout alto para docs grandes)
+    with trace.stage("modelo") as stage:
+        yield from client.stream(
+            model_name, full_prompt + remote_files,
+            request_options={"timeout": 600}, force=force, file_hashes=file_hashes, stage=stage
+        )
+
+def audit_job(job, files, mode, prompt_instructions, benchmark_text, laws_dict, key, model_name, force=False):
+    """Trabalho em segundo plano: auditoria completa do processo (sem chamadas ao Streamlit)."""
+    # Os snapshots trazem o hash calculado pela página (prefetch.digests)
+    file_hashes = [pdf_cache.file_digest(f) for f in files]
+    # Extração/upload especulativos iniciados pela página ainda em curso
+    prefetch.wait(file_hashes)
+    docs = []
+    if mode == MODE_MAP_REDUCE:
+        job.write("📖 A extrair o texto dos volumes...")
+        docs = load_volumes(files, job)
+        if not audit_mapreduce.has_text(docs):
+            job.write("⚠️ Volumes sem texto extraível (digitalizados?): a enviar os volumes em anexo.")
+            docs = []
+
+    if docs:
+        report = analyze_map_reduce(
+            docs, prompt_instructions, benchmark_text, laws_dict, key, model_name, job,
+            file_hashes=file_hashes, force=force
+        )
+    else:
+        report = analyze_large_document(
+            files, prompt_instructions, benchmark_text, laws_dict, key, model_name, job,
+            file_hashes=file_hashes, force=force
+        )
+    return job.consume(report)
+
+# ==========================================
+# --- 3. WORD ---
+# ==========================================
+
+def create_docx(text, p_type):
+    doc = Document()
+    style_normal = doc.styles['Normal']
+    style_normal.font.name = 'Calibri'
+    style_normal.font.size = Pt(11)
+    
+    title = doc.add_heading('RELATÓRIO DE AUDITORIA EIA', 0)
+    title.alignment = 1
+    doc.add_paragraph(f"Tipologia: {p_type} | Data: {datetime.now().strftime('%d/%m/%Y')}")
+    doc.add_paragraph("---")
+    
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line: continue
+        
+        if line.startswith('## '): 
+            h = doc.add_heading(line.replace('##', '').strip(), 1)
+            h.style.font.color.rgb = RGBColor(139, 0, 0) # Dark Red
+        elif line.startswith('### '): 
+            doc.add_heading(line.replace('###', '').strip(), 2)
+        elif line.startswith('- ') or line.startswith('* '): 
+            doc.add_paragraph(line[2:], style='List Bullet')
+        else: 
+            doc.add_paragraph(line)
+            
+    b = io.BytesIO()
+    doc.save(b)
+    b.seek(0)
+    return b
@@ -0,0 +1,299 @@
+"""
+Processamento em lote, sem interface, de processos Caso a Caso e AIncA.
+
+Cada subpasta da pasta de entrada é um processo. Os processos correm num
+pool limitado de threads (--workers); os pedidos à API passam pelo mesmo
+limitador partilhado das páginas (rate_limiter, via gemini_client), pelo
+que mais workers não ultrapassam a quota — apenas enchem a fila.
+
+Para cada processo são gravados os DOCX numa subpasta da saída com o mesmo
+nome, e o resumo (resumo.csv) é reescrito a cada processo concluído. Numa
+nova execução, os processos com estado "ok" cujos DOCX ainda existem são
+saltados; num processo interrompido a meio, as respostas já obtidas vêm
+da cache de respostas (llm_cache) e não voltam a ser pedidas.
+
+Uso:
+    python batch_cli.py caso-a-caso ENTRADA --out SAIDA [--model M] [--workers N] [--force]
+    python batch_cli.py ainca ENTRADA --out SAIDA --sector "Parques Eólicos"
+
+Organização de um processo Caso a Caso (nomes sem distinção de
+maiúsculas/acentos; também vale o prefixo do nome do PDF na raiz do processo):
+    simulacao/  formulario/  projeto/ (ou memoria/)  legislacao/ (ou local/, pdm/)
+Organização de um processo AIncA:
+    PDFs na raiz ou em projeto/; cartografia e anexos em anexos/ (ou cartografia/)
+
+A API key é lida de --api-key ou da variável de ambiente GEMINI_API_KEY.
+"""
+import io
+import os
+import csv
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import ainca
+import caso_a_caso
+import gemini_client
+import model_catalog
+
+# --- 1. CONFIGURAÇÃO ---
+DEFAULT_WORKERS = int(os.environ.get("SUPERAPP_BATCH_WORKERS", "2"))
+SUMMARY_NAME = "resumo.csv"
+SUMMARY_FIELDS = ["processo", "estado", "saidas", "erro", "duracao_s", "modelo", "concluido_em"]
+STATUS_OK, STATUS_ERROR = "ok", "erro"
+
+# Prefixos (normalizados) de pastas/ficheiros para cada fonte do Caso a Caso
+CASO_CATEGORIES = [
+    ("SIM", ("sim",)),
+    ("FORM", ("form",)),
+    ("PROJ", ("proj", "mem")),
+    ("LOCAL", ("leg", "local", "pdm")),
+]
+AINCA_ANNEX_PREFIXES = ("anex", "cart")
+
+VALIDATION_FILE = "Auditoria_Caso_a_Caso.docx"
+DECISION_FILE = "Decisao_Final.docx"
+AINCA_FILE = "Relatorio_AIncA_Fundamentado.docx"
+
+# ==========================================
+# --- 2. DESCOBERTA DOS PROCESSOS ---
+# ==========================================
+
+def _norm(name):
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return text.lower()
+
+def _pdfs(folder):
+    return sorted(
+        os.path.join(folder, n) for n in os.listdir(folder)
+        if n.lower().endswith(".pdf") and os.path.isfile(os.path.join(folder, n))
+    )
+
+def _subfolders(folder):
+    return sorted(n for n in os.listdir(folder) if os.path.isdir(os.path.join(folder, n)))
+
+def find_processes(root):
+    """Subpastas da pasta de entrada (uma por processo), por ordem alfabética."""
+    return [(n, os.path.join(root, n)) for n in _subfolders(root) if not n.startswith(".")]
+
+def caso_files(folder):
+    """PDFs do processo por fonte (SIM, FORM, PROJ, LOCAL)."""
+    groups = {label: [] for label, _ in CASO_CATEGORIES}
+
+    def _category(name):
+        name = _norm(name)
+        return next((label for label, prefixes in CASO_CATEGORIES if name.startswith(prefixes)), None)
+
+    for sub in _subfolders(folder):
+        label = _category(sub)
+        if label:
+            groups[label] += _pdfs(os.path.join(folder, sub))
+    for path in _pdfs(folder):
+        label = _category(os.path.basename(path))
+        if label:
+            groups[label].append(path)
+    return groups
+
+def ainca_files(folder):
+    """(PDFs do projeto, PDFs de cartografia/anexos) do processo."""
+    project, annexes = list(_pdfs(folder)), []
+    for sub in _subfolders(folder):
+        if _norm(sub).startswith(AINCA_ANNEX_PREFIXES):
+            annexes += _pdfs(os.path.join(folder, sub))
+        else:
+            project += _pdfs(os.path.join(folder, sub))
+    return project, annexes
+
+# ==========================================
+# --- 3. EXECUÇÃO DE UM PROCESSO ---
+# ==========================================
+
+def _write_atomic(path, buffer):
+    """Grava o ficheiro de uma vez: um DOCX parcial nunca conta como concluído."""
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(buffer.getvalue())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def _generate(client, model_name, prompt, force, log):
+    return client.generate(
+        model_name, prompt, request_options={"timeout": 600}, force=force,
+        on_wait=lambda s: log(f"cota momentânea atingida: nova tentativa em {s:.0f}s")
+    ).text
+
+def run_caso(client, model_name, folder, out_dir, options, log):
+    groups = caso_files(folder)
+    if not (groups["SIM"] and groups["FORM"] and groups["PROJ"]):
+        raise ValueError("Faltam ficheiros obrigatórios (Simulação, Formulário e Projeto).")
+    streams = {label: caso_a_caso.open_streams(files) for label, files in groups.items()}
+    catalog_limit = model_catalog.input_token_limit(client.api_key, model_name)
+    _, val_args, dec_args = caso_a_caso.prepare_texts(streams, model_name, catalog_limit)
+
+    log("auditoria técnica...")
+    validation = _generate(client, model_name, caso_a_caso.validation_prompt(*val_args), options.force, log)
+    log("minuta de decisão...")
+    decision = _generate(client, model_name, caso_a_caso.decision_prompt(*dec_args), options.force, log)
+
+    outputs = [os.path.join(out_dir, VALIDATION_FILE), os.path.join(out_dir, DECISION_FILE)]
+    _write_atomic(outputs[0], caso_a_caso.create_doc_from_text(validation, caso_a_caso.VALIDATION_TITLE))
+    _write_atomic(outputs[1], caso_a_caso.create_doc_from_text(decision, caso_a_caso.DECISION_TITLE))
+    return outputs
+
+def run_ainca(client, model_name, folder, out_dir, options, log):
+    files_p, files_l = ainca_files(folder)
+    if not files_p:
+        raise ValueError("Sem PDFs do projeto.")
+    cleaners = []
+    docs_p, docs_l = ainca.load_document_groups([files_p, files_l], cleaners)
+    text_p, text_l, focused = ainca.project_texts(docs_p, docs_l, options.sector)
+    if focused:
+        log("processo extenso: só as páginas relevantes por secção")
+
+    log("relatório AIncA...")
+    text = _generate(client, model_name, ainca.report_prompt(options.sector, text_p, text_l), options.force, log)
+
+    output = os.path.join(out_dir, AINCA_FILE)
+    docx = ainca.create_word_docx(text, [d.name for d in docs_p], [d.name for d in docs_l], options.sector)
+    _write_atomic(output, docx)
+    return [output]
+
+RUNNERS = {"caso-a-caso": run_caso, "ainca": run_ainca}
+
+# ==========================================
+# --- 4. RESUMO (CSV) ---
+# ==========================================
+
+class Summary:
+    """resumo.csv: uma linha por processo, reescrita de forma atómica a cada conclusão."""
+
+    def __init__(self, out_root):
+        self.path = os.path.join(out_root, SUMMARY_NAME)
+        self._lock = threading.Lock()
+        self.rows = {}
+        try:
+            with open(self.path, newline="", encoding="utf-8") as fh:
+                for row in csv.DictReader(fh):
+                    self.rows[row["processo"]] = row
+        except (OSError, KeyError, csv.Error):
+            self.rows = {}
+
+    def is_done(self, name):
+        row = self.rows.get(name)
+        if not row or row.get("estado") != STATUS_OK:
+            return False
+        outputs = [p for p in (row.get("saidas") or "").split(";") if p]
+        return bool(outputs) and all(os.path.exists(p) for p in outputs)
+
+    def record(self, name, status, outputs=(), error="", duration=0.0, model_name=""):
+        with self._lock:
+            self.rows[name] = {
+                "processo": name,
+                "estado": status,
+                "saidas": ";".join(outputs),
+                "erro": error,
+                "duracao_s": f"{duration:.1f}",
+                "modelo": model_name,
+                "concluido_em": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            text = io.StringIO(newline="")
+            writer = csv.DictWriter(text, fieldnames=SUMMARY_FIELDS)
+            writer.writeheader()
+            for key in sorted(self.rows):
+                writer.writerow(self.rows[key])
+            _write_atomic(self.path, io.BytesIO(text.getvalue().encode("utf-8")))
+
+# ==========================================
+# --- 5. LINHA DE COMANDOS ---
+# ==========================================
+
+_print_lock = threading.Lock()
+
+def _log(name, message):
+    with _print_lock:
+        print(f"[{time.strftime('%H:%M:%S')}] {name}: {message}", file=sys.stderr, flush=True)
+
+def _default_model(api_key):
+    models = model_catalog.available_models(api_key)
+    return models[model_catalog.default_index(models, model_catalog.FLASH_FIRST)]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Processamento em lote de processos Caso a Caso / AIncA.")
+    parser.add_argument("kind", choices=sorted(RUNNERS), help="Tipo de análise.")
+    parser.add_argument("input", help="Pasta com uma subpasta por processo.")
+    parser.add_argument("--out", required=True, help="Pasta de saída (DOCX por processo e resumo.csv).")
+    parser.add_argument("--model", help="Modelo Gemini (por omissão, o Flash mais recente disponível).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Processos em simultâneo.")
+    parser.add_argument("--sector", default="Geral / Outros", choices=list(ainca.SECTOR_GUIDES),
+                        help="Setor (só AIncA).")
+    parser.add_argument("--force", action="store_true",
+                        help="Refaz também os processos concluídos, sem usar respostas guardadas.")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY", ""),
+                        help="API key (por omissão, a variável GEMINI_API_KEY).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    options = parse_args(argv)
+    if not options.api_key:
+        print("API key em falta (--api-key ou GEMINI_API_KEY).", file=sys.stderr)
+        return 2
+    if not os.path.isdir(options.input):
+        print(f"Pasta de entrada inexistente: {options.input}", file=sys.stderr)
+        return 2
+
+    client = gemini_client.get_client(options.api_key)
+    model_name = options.model or _default_model(options.api_key)
+    runner = RUNNERS[options.kind]
+    summary = Summary(options.out)
+
+    todo = []
+    for name, folder in find_processes(options.input):
+        if not options.force and summary.is_done(name):
+            _log(name, "já concluído (saltado)")
+        else:
+            todo.append((name, folder))
+    _log("lote", f"{len(todo)} processo(s) a analisar com {model_name}, {options.workers} em simultâneo")
+
+    def _process(name, folder):
+        start = time.time()
+        try:
+            outputs = runner(client, model_name, folder, os.path.join(options.out, name), options,
+                             lambda msg: _log(name, msg))
+        except Exception as e:
+            summary.record(name, STATUS_ERROR, error=str(e) or e.__class__.__name__,
+                           duration=time.time() - start, model_name=model_name)
+            _log(name, f"ERRO: {e}")
+            return False
+        summary.record(name, STATUS_OK, outputs, duration=time.time() - start, model_name=model_name)
+        _log(name, f"concluído em {time.time() - start:.0f}s")
+        return True
+
+    failed = 0
+    ex = ThreadPoolExecutor(max_workers=max(1, options.workers), thread_name_prefix="superapp-batch")
+    try:
+        futures = [ex.submit(_process, name, folder) for name, folder in todo]
+        for fut in as_completed(futures):
+            failed += not fut.result()
+    except KeyboardInterrupt:
+        _log("lote", "interrompido: os processos concluídos ficam no resumo; volte a correr para continuar")
+        ex.shutdown(wait=False, cancel_futures=True)
+        return 130
+    ex.shutdown()
+    _log("lote", f"{len(todo) - failed} concluído(s), {failed} com erro — resumo em {summary.path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""
+Benchmark de ponta a ponta dos módulos, com o backend Gemini simulado.
+
+Gera PDFs sintéticos e corre o pipeline de cada módulo tal como a página o
+faz — extração e limpeza, orçamento de contexto, trabalho em segundo plano
+(jobs) com geração em streaming, e exportação para Word — sobre o
+fake_gemini (latência, débito e 429 configuráveis). Cada cenário corre a
+frio (caches de PDF, de respostas, checkpoints e registo da File API
+vazios) e a quente (tudo em cache).
+
+A cache usada é uma pasta temporária própria: o benchmark nunca toca na
+cache real da aplicação. Os limites do rate_limiter são levantados, salvo
+com --real-limits, para medir o pipeline e não a quota.
+
+Uso:
+    python benchmark.py [--pages 40] [--repeat 3] [--only caso-a-caso,ainca]
+                        [--latency 0.8] [--output-tps 150] [--output-tokens 1200]
+                        [--error-rate 0.1] [--json resultados.json] [--compare anterior.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+from contextlib import contextmanager
+
+# --- 1. CONFIGURAÇÃO (antes de importar os módulos da aplicação) ---
+_parser = argparse.ArgumentParser(description="Benchmark de ponta a ponta com o backend Gemini simulado.")
+_parser.add_argument("--pages", type=int, default=40, help="Páginas de cada volume principal.")
+_parser.add_argument("--repeat", type=int, default=3, help="Repetições de cada cenário (a frio e a quente).")
+_parser.add_argument("--only", default="", help="Cenários a correr, separados por vírgulas.")
+_parser.add_argument("--model", default="", help="Modelo (por omissão, o preferido do catálogo simulado).")
+_parser.add_argument("--latency", type=float, help="Segundos até ao primeiro token.")
+_parser.add_argument("--output-tps", type=float, help="Tokens de saída por segundo.")
+_parser.add_argument("--output-tokens", type=int, help="Tamanho das respostas em tokens.")
+_parser.add_argument("--error-rate", type=float, help="Probabilidade de 429 por pedido.")
+_parser.add_argument("--file-processing", type=float, help="Segundos em PROCESSING após cada upload.")
+_parser.add_argument("--real-limits", action="store_true", help="Mantém os limites RPM/TPM reais do rate_limiter.")
+_parser.add_argument("--json", help="Grava os resultados neste ficheiro.")
+_parser.add_argument("--compare", help="Resultados anteriores (JSON) para comparação.")
+
+
+def _configure_environment(options):
+    os.environ["SUPERAPP_CACHE_DIR"] = tempfile.mkdtemp(prefix="superapp-bench-")
+    os.environ["SUPERAPP_GEMINI_BACKEND"] = "fake"
+    if not options.real_limits:
+        os.environ.setdefault("SUPERAPP_RATE_RPM", "100000")
+        os.environ.setdefault("SUPERAPP_RATE_TPM", "1000000000")
+    return os.environ["SUPERAPP_CACHE_DIR"]
+
+
+API_KEY = "benchmark"
+WORDS = (
+    "fauna flora avifauna ruido agua solo paisagem rede natura zona especial conservacao habitat "
+    "medida minimizacao impacte projeto linha eletrica distancia metros indicador monitorizacao"
+).split()
+
+# ==========================================
+# --- 2. PDFS SINTÉTICOS ---
+# ==========================================
+
+def make_pdf(path, pages, seed=0, title="Estudo de Impacte Ambiental"):
+    """PDF com texto aleatório, cabeçalho e rodapé repetidos (exercitam a limpeza)."""
+    import random
+    from fpdf import FPDF
+
+    rnd = random.Random(seed)
+    pdf = FPDF()
+    for i in range(pages):
+        pdf.add_page()
+        pdf.set_font("Arial", size=10)
+        pdf.cell(0, 8, f"CONSULTORA AMBIENTAL LDA - {title}", 0, 1)
+        for _ in range(12):
+            pdf.multi_cell(0, 5, " ".join(rnd.choice(WORDS) for _ in range(25)))
+        pdf.cell(0, 8, f"Pagina {i + 1} de {pages}", 0, 1)
+    pdf.output(path)
+    return path
+
+def make_corpus(folder, pages):
+    """Conjunto de PDFs por papel (volumes do processo, anexos, formulários...)."""
+    spec = {
+        "sim": 2, "form": 4, "local": 3, "annex1": 10, "annex2": 10,
+        "main": pages, "vol1": pages, "vol2": pages, "vol3": pages,
+    }
+    return {
+        role: make_pdf(os.path.join(folder, f"{role}.pdf"), n, seed=i, title=role.upper())
+        for i, (role, n) in enumerate(spec.items())
+    }
+
+# ==========================================
+# --- 3. CENÁRIOS ---
+# ==========================================
+
+class Timings:
+    """Tempos por etapa de uma execução de um cenário."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def _wait(job_id):
+    import jobs
+
+    while True:
+        job = jobs.get(job_id)
+        if job.finished:
+            break
+        time.sleep(0.02)
+    if job.status != jobs.DONE:
+        raise RuntimeError(f"{job.title}: {job.status} ({job.error})")
+    return job.text
+
+def _submit(fn, *args, **kwargs):
+    import jobs
+    return jobs.submit("benchmark", getattr(fn, "__name__", "benchmark"), jobs.owner_id(API_KEY), fn, *args, **kwargs)
+
+def scenario_caso_a_caso(pdfs, model_name, force, t):
+    import jobs
+    import model_catalog
+    import caso_a_caso
+
+    with t.stage("preparação"):
+        streams = {
+            "SIM": caso_a_caso.open_streams([pdfs["sim"]]),
+            "FORM": caso_a_caso.open_streams([pdfs["form"]]),
+            "PROJ": caso_a_caso.open_streams([pdfs["main"]]),
+            "LOCAL": caso_a_caso.open_streams([pdfs["local"]]),
+        }
+        _, val_args, dec_args = caso_a_caso.prepare_texts(
+            streams, model_name, model_catalog.input_token_limit(API_KEY, model_name)
+        )
+    with t.stage("modelo"):
+        # Como na página: os dois documentos em trabalhos simultâneos
+        ids = [
+            _submit(jobs.run_generation, API_KEY, model_name, caso_a_caso.validation_prompt(*val_args), force=force),
+            _submit(jobs.run_generation, API_KEY, model_name, caso_a_caso.decision_prompt(*dec_args), force=force),
+        ]
+        texts = [_wait(job_id) for job_id in ids]
+    with t.stage("word"):
+        caso_a_caso.create_doc_from_text(texts[0], caso_a_caso.VALIDATION_TITLE)
+        caso_a_caso.create_doc_from_text(texts[1], caso_a_caso.DECISION_TITLE)
+
+def scenario_ambiente(pdfs, model_name, force, t):
+    import jobs
+    import ambiente
+
+    with t.stage("preparação"):
+        cleaners = []
+        doc_main = ambiente.load_document(pdfs["main"], cleaners)
+        docs_extra = [ambiente.load_document(pdfs[r], cleaners) for r in ("annex1", "annex2")]
+        txt_main, txt_extra, _ = ambiente.corpus_texts(doc_main, docs_extra)
+        prompt = ambiente.report_prompt(txt_main, "", txt_extra, "")
+    with t.stage("modelo"):
+        text = _wait(_submit(jobs.run_generation, API_KEY, model_name, prompt,
+                             request_options={"timeout": 600}, force=force))
+    with t.stage("word"):
+        ambiente.create_docx(text)
+
+def scenario_ainca(pdfs, model_name, force, t):
+    import jobs
+    import ainca
+
+    sector = "Parques Eólicos"
+    with t.stage("preparação"):
+        cleaners = []
+        docs_p, docs_l = ainca.load_document_groups([[pdfs["main"]], [pdfs["annex1"]]], cleaners)
+        text_p, text_l, _ = ainca.project_texts(docs_p, docs_l, sector)
+        prompt = ainca.report_prompt(sector, text_p, text_l)
+    with t.stage("modelo"):
+        text = _wait(_submit(jobs.run_generation, API_KEY, model_name, prompt,
+                             request_options={"timeout": 600}, force=force))
+    with t.stage("word"):
+        ainca.create_word_docx(text, [d.name for d in docs_p], [d.name for d in docs_l], sector)
+
+def _scenario_auditor(mode):
+    def run(pdfs, model_name, force, t):
+        import jobs
+        import auditor_eia
+
+        project_type = "Energia (Eólica, Solar, Linhas)"
+        with t.stage("preparação"):
+            files = jobs.snapshot([pdfs["vol1"], pdfs["vol2"], pdfs["vol3"]])
+        with t.stage("extração + modelo"):
+            text = _wait(_submit(
+                auditor_eia.audit_job, files, mode,
+                auditor_eia.audit_instructions(project_type), auditor_eia.SECTOR_BENCHMARKS[project_type],
+                auditor_eia.COMMON_LAWS, API_KEY, model_name, force=force
+            ))
+        with t.stage("word"):
+            auditor_eia.create_docx(text, project_type)
+    return run
+
+def _scenarios():
+    import auditor_eia
+    return {
+        "caso-a-caso": scenario_caso_a_caso,
+        "ambiente": scenario_ambiente,
+        "auditor-eia (map-reduce)": _scenario_auditor(auditor_eia.MODE_MAP_REDUCE),
+        "auditor-eia (file api)": _scenario_auditor(auditor_eia.MODE_SINGLE),
+        "ainca": scenario_ainca,
+    }
+
+# ==========================================
+# --- 4. EXECUÇÃO ---
+# ==========================================
+
+def clear_caches(pdfs):
+    """Estado a frio: sem texto extraído, respostas, checkpoints nem uploads registados."""
+    import pdf_cache
+    import llm_cache
+    import file_registry
+    import audit_mapreduce
+
+    pdf_cache.clear()
+    llm_cache.clear()
+    shutil.rmtree(audit_mapreduce.CHECKPOINT_DIR, ignore_errors=True)
+    for path in pdfs.values():
+        file_registry.forget(API_KEY, pdf_cache.content_hash(pdf_cache.file_bytes(path)))
+
+def run_scenario(fn, pdfs, model_name, client, repeat):
+    """Mediana das execuções a frio e a quente, com as etapas e os pedidos simulados."""
+    result = {}
+    for label, cold in (("frio", True), ("quente", False)):
+        totals, stages = [], {}
+        client.stats.reset()
+        for _ in range(repeat):
+            if cold:
+                clear_caches(pdfs)
+            t = Timings()
+            start = time.perf_counter()
+            fn(pdfs, model_name, cold, t)
+            totals.append(time.perf_counter() - start)
+            for name, value in t.stages.items():
+                stages.setdefault(name, []).append(value)
+        result[label] = {
+            "total_s": statistics.median(totals),
+            "min_s": min(totals),
+            "stages_s": {name: statistics.median(v) for name, v in stages.items()},
+            "backend": client.stats.snapshot(),
+        }
+    return result
+
+def print_report(results, previous=None):
+    print(f"\n{'cenário':<28}{'frio (s)':>10}{'quente (s)':>12}{'pedidos':>9}{'429':>6}   etapas a frio")
+    for name, r in results.items():
+        cold, warm = r["frio"], r["quente"]
+        stages = ", ".join(f"{k} {v:.2f}" for k, v in cold["stages_s"].items())
+        line = (f"{name:<28}{cold['total_s']:>10.2f}{warm['total_s']:>12.2f}"
+                f"{cold['backend']['requests']:>9}{cold['backend']['errors']:>6}   {stages}")
+        if previous and name in previous.get("results", {}):
+            before = previous["results"][name]["frio"]["total_s"]
+            line += f"   ({(cold['total_s'] - before) / before * 100:+.0f}% vs anterior)"
+        print(line)
+
+def main(argv=None):
+    options = _parser.parse_args(argv)
+    cache_dir = _configure_environment(options)
+
+    import gemini_client
+    import model_catalog
+
+    try:
+        client = gemini_client.get_client(API_KEY)
+        for attr, value in (("latency", options.latency), ("output_tps", options.output_tps),
+                            ("output_tokens", options.output_tokens), ("error_rate", options.error_rate),
+                            ("file_processing", options.file_processing)):
+            if value is not None:
+                setattr(client, attr, value)
+        models = model_catalog.available_models(API_KEY)
+        model_name = options.model or models[model_catalog.default_index(models, model_catalog.FLASH_FIRST)]
+
+        scenarios = _scenarios()
+        wanted = [s.strip() for s in options.only.split(",") if s.strip()]
+        if wanted:
+            scenarios = {k: v for k, v in scenarios.items() if any(k.startswith(w) for w in wanted)}
+
+        corpus_dir = os.path.join(cache_dir, "corpus")
+        os.makedirs(corpus_dir)
+        pdfs = make_corpus(corpus_dir, options.pages)
+        print(f"Modelo {model_name}; latência {client.latency}s, {client.output_tps} tok/s, "
+              f"{client.output_tokens} tokens/resposta, 429 {client.error_rate:.0%}; "
+              f"{options.pages} páginas/volume; {options.repeat} repetições", file=sys.stderr)
+
+        results = {}
+        for name, fn in scenarios.items():
+            print(f"... {name}", file=sys.stderr)
+            results[name] = run_scenario(fn, pdfs, model_name, client, options.repeat)
+
+        previous = None
+        if options.compare:
+            with open(options.compare, encoding="utf-8") as fh:
+                previous = json.load(fh)
+        print_report(results, previous)
+        if options.json:
+            with open(options.json, "w", encoding="utf-8") as fh:
+                json.dump({
+                    "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "settings": {k: v for k, v in vars(options).items() if k not in ("json", "compare")},
+                    "results": results,
+                }, fh, ensure_ascii=False, indent=2)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
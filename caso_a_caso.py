@@ -0,0 +1,157 @@
+"""
+Análise Caso a Caso (RJAIA): fontes, prompts e documentos Word.
+
+Lógica partilhada pela página 01_Caso_a_Caso e pelo processamento em lote
+(batch_cli.py): não depende do Streamlit.
+"""
+import io
+
+from docx import Document
+
+import pdf_extract
+import token_budget
+
+# --- 1. CONFIGURAÇÃO ---
+LEGISLATION_DB = {
+    "RJAIA (DL 151-B/2013)": "https://diariodarepublica.pt/dr/legislacao-consolidada/decreto-lei/2013-116043164",
+    "Alteração RJAIA (DL 152-B/2017)": "https://diariodarepublica.pt/dr/detalhe/decreto-lei/152-b-2017-114337069",
+    "LUA (DL 75/2015)": "https://diariodarepublica.pt/dr/legislacao-consolidada/decreto-lei/2015-106562356",
+    "Rede Natura 2000 (DL 140/99)": "https://diariodarepublica.pt/dr/legislacao-consolidada/decreto-lei/1999-34460975"
+}
+
+# Fontes de cada prompt: (rótulo, prioridade, peso na divisão do orçamento).
+# O orçamento em tokens resulta da janela de contexto do modelo escolhido; o
+# corte cai sempre no fim de uma página e as páginas que não cabem nunca
+# chegam a ser extraídas.
+VALIDATION_SOURCES = [("SIM", 1, 2), ("FORM", 1, 2), ("PROJ", 2, 6), ("LOCAL", 3, 2)]
+DECISION_SOURCES = [("PROJ", 1, 8), ("FORM", 2, 2)]
+
+VALIDATION_TITLE = "Relatório de Auditoria Técnica"
+DECISION_TITLE = "Minuta de Decisão"
+
+# ==========================================
+# --- 2. DOCUMENTOS E ORÇAMENTO ---
+# ==========================================
+
+def open_streams(files, on_error=None):
+    """
+    Abre os PDFs (carregados ou caminhos) como fluxos de páginas (extração e
+    limpeza a pedido). on_error(ficheiro, exceção) é chamado para cada PDF
+    ilegível; por omissão o erro é propagado.
+    """
+    streams = []
+    for f in files or []:
+        try:
+            streams.append(pdf_extract.open_stream(f, clean=True))
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(f, e)
+    return streams
+
+def plan_sources(streams, spec, model_name, fixed_prompt, catalog_limit=None):
+    """Distribui a janela de contexto do modelo pelas fontes do prompt."""
+    sources = [token_budget.Source(lbl, streams[lbl], prio, weight) for lbl, prio, weight in spec]
+    limit = token_budget.context_limit(model_name, catalog_limit)
+    return token_budget.plan(sources, limit, fixed_parts=[fixed_prompt])
+
+def extract_text(budget_plan, label):
+    """Texto das páginas da fonte incluídas no plano de orçamento."""
+    return "".join(
+        f"\n\n>>> FONTE: {label} ({doc.name}) <<<\n{doc.text()}"
+        for doc in budget_plan.documents(label)
+    )
+
+def prepare_texts(streams, model_name, catalog_limit=None):
+    """
+    Planeia os dois prompts e extrai os textos de cada fonte.
+    Devolve (plano da validação, argumentos de validation_prompt,
+    argumentos de decision_prompt).
+    """
+    plan_val = plan_sources(streams, VALIDATION_SOURCES, model_name, validation_prompt("", "", "", ""), catalog_limit)
+    plan_dec = plan_sources(streams, DECISION_SOURCES, model_name, decision_prompt("", ""), catalog_limit)
+    validation_args = (
+        extract_text(plan_val, "SIM"),
+        extract_text(plan_val, "FORM"),
+        extract_text(plan_val, "PROJ"),
+        extract_text(plan_val, "LOCAL") if streams.get("LOCAL") else "N/A",
+    )
+    decision_args = (extract_text(plan_dec, "FORM"), extract_text(plan_dec, "PROJ"))
+    return plan_val, validation_args, decision_args
+
+# ==========================================
+# --- 3. PROMPTS ---
+# ==========================================
+
+def validation_prompt(t_sim, t_form, t_proj, t_leg):
+    return f"""
+    Atua como Auditor Ambiental da Autoridade de AIA.
+    
+    CONTEXTO LEGAL:
+    Utiliza: RJAIA (DL 151-B/2013) e seus Anexos.
+    Contexto Local (PDM/Condicionantes): {t_leg}
+
+    DADOS DO PROJETO:
+    SIMULAÇÃO: {t_sim}
+    FORMULÁRIO: {t_form}
+    MEMÓRIA DESCRITIVA: {t_proj}
+
+    TAREFA:
+    Realiza uma auditoria de conformidade para verificar se o projeto está bem enquadrado como "Caso a Caso" ou se devia ser AIA direta.
+    Verifica limiares do Anexo II.
+
+    OUTPUT (MARKDOWN):
+    ## 1. Resumo do Projeto
+    ## 2. Verificação de Limiares (Anexo II)
+    - Ponto do Anexo: [Identificar]
+    - Limiar Legal: [Valor]
+    - Valor do Projeto: [Valor]
+    - Parecer: [Cumpre/Não Cumpre]
+    ## 3. Análise de Sensibilidade (Localização)
+    ## 4. Conclusão da Validação
+    """
+
+def decision_prompt(t_form, t_proj):
+    return f"""
+    Redige a MINUTA DE DECISÃO FINAL (Técnico Superior).
+    
+    DADOS: {t_proj} {t_form}
+    
+    OUTPUT - APENAS O TEXTO PARA PREENCHER O WORD (Não uses Markdown aqui, usa texto corrido estruturado):
+    
+    Identificação do Projeto: [Nome]
+    Promotor: [Nome]
+    Localização: [Local]
+    
+    CONSIDERANDO QUE:
+    1. O projeto se enquadra na alínea [X] do ponto [Y] do Anexo II...
+    2. Da análise efetuada, verifica-se que [Resumo dos impactes]...
+    3. Foram consultadas as entidades [Entidades]...
+    
+    DECISÃO:
+    Face ao exposto, propõe-se a [SUJEIÇÃO / NÃO SUJEIÇÃO] a Avaliação de Impacte Ambiental.
+    
+    CONDICIONANTES:
+    (Lista de condicionantes a cumprir caso não seja sujeito a AIA).
+    """
+
+# ==========================================
+# --- 4. WORD ---
+# ==========================================
+
+def create_doc_from_text(text, title):
+    """Gera um ficheiro Word simples."""
+    doc = Document()
+    doc.add_heading(title, 0)
+    
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line: continue
+        if line.startswith('## '): doc.add_heading(line.replace('##', ''), 1)
+        elif line.startswith('- '): doc.add_paragraph(line[2:], style='List Bullet')
+        else: doc.add_paragraph(line)
+        
+    bio = io.BytesIO()
+    doc.save(bio)
+    bio.seek(0)
+    return bio
@@ -0,0 +1,151 @@
+"""
+Modelo compacto de documento indexado por página.
+
+O texto de todas as páginas vive num único buffer UTF-8 (bytearray) com um
+array de offsets, em vez de uma string gigante construída com `+=` dentro
+do ciclo de páginas. Cortes por intervalo de páginas partilham o mesmo
+buffer (não há cópias) e os marcadores [DOC: x | PÁG. n] só são gerados no
+momento de montar o prompt, através de render().
+"""
+from array import array
+
+
+class Page:
+    """Vista leve sobre uma página de um Document."""
+    __slots__ = ("doc", "index")
+
+    def __init__(self, doc, index):
+        self.doc = doc
+        self.index = index
+
+    @property
+    def number(self):
+        """Número da página no PDF original (1-based)."""
+        return self.index + 1
+
+    @property
+    def text(self):
+        return self.doc._decode(self.index, self.index + 1)
+
+    @property
+    def nbytes(self):
+        return self.doc._offsets[self.index + 1] - self.doc._offsets[self.index]
+
+    def citation(self, simple=False):
+        return f"[PÁG. {self.number}]" if simple else f"[DOC: {self.doc.name} | PÁG. {self.number}]"
+
+    def __repr__(self):
+        return f"<Page {self.doc.name} p.{self.number} ({self.nbytes} B)>"
+
+
+class Document:
+    """
+    Páginas de um PDF num buffer contíguo.
+    Um Document obtido por corte (doc[a:b]) partilha o buffer do original e
+    mantém a numeração de páginas do PDF.
+    """
+    __slots__ = ("name", "digest", "_buf", "_offsets", "_start", "_stop")
+
+    def __init__(self, name, digest=None):
+        self.name = name
+        self.digest = digest
+        self._buf = bytearray()
+        self._offsets = array("Q", [0])
+        self._start = 0
+        self._stop = None  # None = documento completo, aceita append()
+
+    @classmethod
+    def from_pages(cls, name, pages, digest=None):
+        doc = cls(name, digest)
+        for text in pages:
+            doc.append(text)
+        return doc
+
+    # --- Construção ---
+    def append(self, text):
+        if self._stop is not None:
+            raise TypeError("Não é possível acrescentar páginas a um corte de documento.")
+        self._buf += (text or "").encode("utf-8")
+        self._offsets.append(len(self._buf))
+
+    # --- Acesso ---
+    def _end(self):
+        return len(self._offsets) - 1 if self._stop is None else self._stop
+
+    def _decode(self, start, stop):
+        return self._buf[self._offsets[start]:self._offsets[stop]].decode("utf-8")
+
+    def __len__(self):
+        return self._end() - self._start
+
+    def __iter__(self):
+        for i in range(self._start, self._end()):
+            yield Page(self, i)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("Só são suportados intervalos contíguos de páginas.")
+            view = Document.__new__(Document)
+            view.name, view.digest = self.name, self.digest
+            view._buf, view._offsets = self._buf, self._offsets
+            view._start, view._stop = self._start + start, self._start + max(start, stop)
+            return view
+        n = len(self)
+        if key < 0:
+            key += n
+        if not 0 <= key < n:
+            raise IndexError(key)
+        return Page(self, self._start + key)
+
+    def page(self, number):
+        """Página pelo número do PDF original (1-based)."""
+        index = number - 1
+        if not self._start <= index < self._end():
+            raise IndexError(number)
+        return Page(self, index)
+
+    def pages_range(self, first, last):
+        """Corte pelas páginas [first, last] (numeração do PDF, inclusiva)."""
+        return self[first - 1 - self._start:last - self._start]
+
+    def texts(self):
+        for i in range(self._start, self._end()):
+            yield self._decode(i, i + 1)
+
+    @property
+    def first_number(self):
+        return self._start + 1
+
+    @property
+    def nbytes(self):
+        """Tamanho exato em bytes (UTF-8) do texto das páginas."""
+        return self._offsets[self._end()] - self._offsets[self._start]
+
+    @property
+    def nchars(self):
+        return sum(len(t) for t in self.texts())
+
+    # --- Montagem do prompt ---
+    def text(self):
+        """Texto corrido das páginas, sem marcadores."""
+        return self._decode(self._start, self._end())
+
+    def render(self, simple_citation=False, blank="", header=None, footer=None):
+        """
+        Texto com marcadores de página, p.ex.:
+            \\n[DOC: nome.pdf | PÁG. 12]\\n<texto>\\n
+        header/footer aceitam {name} (ex.: "=== DOCUMENTO FONTE: {name} ===").
+        """
+        parts = []
+        if header:
+            parts.append(header.format(name=self.name))
+        for page in self:
+            parts.append(f"\n{page.citation(simple_citation)}\n{page.text or blank}\n")
+        if footer:
+            parts.append(footer.format(name=self.name))
+        return "".join(parts)
+
+    def __repr__(self):
+        return f"<Document {self.name}: págs. {self.first_number}-{self._end()} ({self.nbytes} B)>"
@@ -0,0 +1,227 @@
+"""
+Backend Gemini local (sem rede nem API key real) para medições e testes.
+
+Substitui a parte do `google.generativeai` que a aplicação usa —
+list_models, GenerativeModel.generate_content (com e sem streaming),
+upload_file, get_file e delete_file — por uma simulação em memória com
+latência, débito de tokens e erros 429 configuráveis. O FakeGeminiClient
+herda do GeminiClient, pelo que a cache de respostas, o limitador e as
+novas tentativas são os verdadeiros: só a ida à rede é simulada.
+
+Ativa-se com SUPERAPP_GEMINI_BACKEND=fake (ou gemini_client.set_backend("fake")).
+Parâmetros por variável de ambiente (ou argumentos do FakeGeminiClient):
+    SUPERAPP_FAKE_LATENCY         segundos até ao primeiro token (0.8)
+    SUPERAPP_FAKE_INPUT_TPS       tokens de entrada processados por segundo (200000)
+    SUPERAPP_FAKE_OUTPUT_TPS      tokens de saída por segundo (150)
+    SUPERAPP_FAKE_OUTPUT_TOKENS   tamanho das respostas em tokens (1200)
+    SUPERAPP_FAKE_429_RATE        probabilidade de um pedido falhar com 429 (0)
+    SUPERAPP_FAKE_FILE_PROCESSING segundos em PROCESSING após o upload (2)
+"""
+import os
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+
+from google.api_core import exceptions as api_exceptions
+from google.generativeai import protos
+from google.generativeai.types import file_types
+
+import gemini_client
+import token_budget
+
+# --- 1. CONFIGURAÇÃO ---
+LATENCY = float(os.environ.get("SUPERAPP_FAKE_LATENCY", "0.8"))
+INPUT_TPS = float(os.environ.get("SUPERAPP_FAKE_INPUT_TPS", "200000"))
+OUTPUT_TPS = float(os.environ.get("SUPERAPP_FAKE_OUTPUT_TPS", "150"))
+OUTPUT_TOKENS = int(os.environ.get("SUPERAPP_FAKE_OUTPUT_TOKENS", "1200"))
+ERROR_RATE = float(os.environ.get("SUPERAPP_FAKE_429_RATE", "0"))
+FILE_PROCESSING = float(os.environ.get("SUPERAPP_FAKE_FILE_PROCESSING", "2"))
+
+CHUNK_TOKENS = 24          # Tokens por pedaço no streaming
+CHARS_PER_TOKEN = 4
+FILE_TOKENS_PER_KB = 2     # Custo (estimado) de um ficheiro anexo na entrada
+
+# Catálogo simulado: (nome, input_token_limit)
+MODELS = [
+    ("models/gemini-2.5-flash", 1_048_576),
+    ("models/gemini-2.0-flash", 1_048_576),
+    ("models/gemini-1.5-flash", 1_048_576),
+    ("models/gemini-1.5-pro", 2_097_152),
+]
+
+_WORDS = (
+    "o projeto prevê a implantação de medidas de minimização dos impactes sobre a fauna "
+    "a flora os habitats e os recursos hídricos com monitorização anual e relatório final"
+).split()
+
+# ==========================================
+# --- 2. RESPOSTAS SIMULADAS ---
+# ==========================================
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+def _fake_text(seed, tokens):
+    """Relatório markdown determinístico (5 secções, tópicos com citação de página)."""
+    rnd = random.Random(seed)
+    lines, used, section = [], 0, 0
+    while used < tokens:
+        if used >= section * tokens / 5 and section < 5:
+            section += 1
+            lines.append(f"## {section}. SECÇÃO {section}")
+        sentence = " ".join(rnd.choice(_WORDS) for _ in range(14))
+        lines.append(f"- {sentence.capitalize()} [DOC: simulado.pdf | PÁG. {rnd.randint(1, 99)}]")
+        used += 20
+    return "\n".join(lines) + "\n"
+
+
+class _Stats:
+    """Contadores do backend (pedidos, 429 injetados, tokens, uploads)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = self.errors = self.uploads = 0
+        self.input_tokens = self.output_tokens = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self):
+        with self._lock:
+            return {k: getattr(self, k) for k in ("requests", "errors", "uploads", "input_tokens", "output_tokens")}
+
+
+class FakeModel:
+    """Imita GenerativeModel.generate_content (bloqueante e em streaming)."""
+
+    def __init__(self, owner, model_name):
+        self.owner = owner
+        self.model_name = model_name
+
+    def _input_tokens(self, contents):
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        total = 0
+        for p in parts:
+            if isinstance(p, str):
+                total += token_budget.estimate_tokens(p)
+            else:
+                total += self.owner._file_kb(p) * FILE_TOKENS_PER_KB
+        return total
+
+    def generate_content(self, contents, stream=False, request_options=None, **kwargs):
+        o = self.owner
+        tokens_in = self._input_tokens(contents)
+        seed = hashlib.sha256(f"{self.model_name}|{tokens_in}|{str(contents)[:2000]}".encode("utf-8")).hexdigest()
+        text = _fake_text(seed, o.output_tokens)
+        fail = o._rng_error()
+        o.stats.add(requests=1, input_tokens=tokens_in)
+
+        if not stream:
+            if fail:
+                o.stats.add(errors=1)
+                raise api_exceptions.ResourceExhausted("Quota exceeded (simulado). Please retry in 1s")
+            time.sleep(o.latency + tokens_in / o.input_tps + o.output_tokens / o.output_tps)
+            o.stats.add(output_tokens=o.output_tokens)
+            return _Response(text)
+        return self._stream(text, tokens_in, fail)
+
+    def _stream(self, text, tokens_in, fail):
+        # Como no SDK, o erro só aparece ao ler o primeiro pedaço
+        o = self.owner
+        if fail:
+            o.stats.add(errors=1)
+            raise api_exceptions.ResourceExhausted("Quota exceeded (simulado). Please retry in 1s")
+        time.sleep(o.latency + tokens_in / o.input_tps)
+        step = CHUNK_TOKENS * CHARS_PER_TOKEN
+        for i in range(0, len(text), step):
+            piece = text[i:i + step]
+            time.sleep(CHUNK_TOKENS / o.output_tps)
+            o.stats.add(output_tokens=CHUNK_TOKENS)
+            yield _Response(piece)
+
+# ==========================================
+# --- 3. CLIENTE ---
+# ==========================================
+
+class FakeGeminiClient(gemini_client.GeminiClient):
+    """GeminiClient com a rede simulada; cache, limitador e novas tentativas são os reais."""
+
+    def __init__(self, api_key, latency=None, input_tps=None, output_tps=None, output_tokens=None,
+                 error_rate=None, file_processing=None, seed=None):
+        self.api_key = api_key
+        self._lock = threading.Lock()
+        self._models = {}
+        self.latency = LATENCY if latency is None else latency
+        self.input_tps = INPUT_TPS if input_tps is None else input_tps
+        self.output_tps = OUTPUT_TPS if output_tps is None else output_tps
+        self.output_tokens = OUTPUT_TOKENS if output_tokens is None else output_tokens
+        self.error_rate = ERROR_RATE if error_rate is None else error_rate
+        self.file_processing = FILE_PROCESSING if file_processing is None else file_processing
+        self.stats = _Stats()
+        self._rng = random.Random(seed)
+        self._files = {}   # nome -> (protos.File, pronto_em)
+
+    def _rng_error(self):
+        with self._lock:
+            return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    def _file_kb(self, f):
+        entry = self._files.get(getattr(f, "name", None))
+        return entry[0].size_bytes // 1024 if entry else 0
+
+    # --- Modelos ---
+    def model(self, model_name):
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._models[model_name] = FakeModel(self, model_name)
+            return model
+
+    def list_models(self):
+        time.sleep(self.latency / 4)
+        return [
+            SimpleNamespace(name=name, display_name=name.split("/")[-1], input_token_limit=limit,
+                            output_token_limit=8192, supported_generation_methods=["generateContent", "countTokens"])
+            for name, limit in MODELS
+        ]
+
+    # --- File API ---
+    def upload_file(self, path, display_name=None, mime_type="application/pdf"):
+        size = os.path.getsize(path)
+        time.sleep(self.latency / 4 + size / 50_000_000)   # ~50 MB/s
+        name = "files/" + hashlib.sha256(f"{path}|{time.time()}|{random.random()}".encode()).hexdigest()[:12]
+        proto = protos.File(name=name, display_name=display_name or os.path.basename(path),
+                            mime_type=mime_type, size_bytes=size, state=protos.File.State.PROCESSING)
+        with self._lock:
+            self._files[name] = (proto, time.time() + self.file_processing)
+        self.stats.add(uploads=1)
+        return file_types.File(proto)
+
+    def get_file(self, name):
+        if "/" not in name:
+            name = f"files/{name}"
+        with self._lock:
+            entry = self._files.get(name)
+            if entry is None:
+                raise api_exceptions.NotFound(f"{name} não existe (simulado)")
+            proto, ready = entry
+            if proto.state == protos.File.State.PROCESSING and time.time() >= ready:
+                proto.state = protos.File.State.ACTIVE
+        return file_types.File(proto)
+
+    def delete_file(self, name):
+        if not isinstance(name, str):
+            name = name.name
+        if "/" not in name:
+            name = f"files/{name}"
+        with self._lock:
+            self._files.pop(name, None)
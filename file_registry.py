@@ -0,0 +1,172 @@
+"""
+Registo dos ficheiros enviados para a File API.
+
+A File API guarda cada ficheiro durante 48 h. Em vez de enviar, aguardar
+e apagar o processo em cada auditoria, cada volume fica registado pelo
+hash do seu conteúdo (e pela API key, porque os ficheiros pertencem ao
+projeto da chave): auditar outra vez o mesmo processo — p.ex. com outro
+benchmark setorial — reutiliza o ficheiro remoto enquanto ele existir.
+Os volumes são enviados em paralelo e o estado PROCESSING é consultado com
+intervalos crescentes.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pdf_cache
+
+# --- 1. CONFIGURAÇÃO ---
+DB_PATH = os.path.join(pdf_cache.CACHE_ROOT, "remote_files.sqlite")
+RETENTION_SECONDS = 47 * 3600   # A File API apaga ao fim de 48 h; margem de 1 h
+POLL_FIRST = 1.0
+POLL_FACTOR = 1.5
+POLL_MAX = 10.0
+POLL_TIMEOUT = 600
+MAX_PARALLEL_UPLOADS = 4
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _owner(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS remote_files (
+                        owner TEXT,
+                        digest TEXT,
+                        name TEXT,
+                        expires REAL,
+                        PRIMARY KEY (owner, digest)
+                    )""")
+                conn.commit()
+                _initialized = True
+    return conn
+
+# ==========================================
+# --- 2. REGISTO ---
+# ==========================================
+
+def lookup(api_key, digest):
+    """Nome remoto (files/...) ainda válido para o conteúdo, ou None."""
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT name, expires FROM remote_files WHERE owner = ? AND digest = ?",
+                (_owner(api_key), digest)
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    if row is None or row[1] < time.time():
+        return None
+    return row[0]
+
+def record(api_key, digest, name, created=None):
+    expires = (created or time.time()) + RETENTION_SECONDS
+    try:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO remote_files (owner, digest, name, expires) VALUES (?, ?, ?, ?)",
+                (_owner(api_key), digest, name, expires)
+            )
+            conn.execute("DELETE FROM remote_files WHERE expires < ?", (time.time(),))
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
+
+def forget(api_key, digest):
+    try:
+        conn = _connect()
+        try:
+            conn.execute("DELETE FROM remote_files WHERE owner = ? AND digest = ?", (_owner(api_key), digest))
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
+
+# ==========================================
+# --- 3. UPLOAD ---
+# ==========================================
+
+def wait_active(client, remote, timeout=POLL_TIMEOUT):
+    """Aguarda o fim do PROCESSING com intervalos crescentes (1 s, 1.5 s, ... até 10 s)."""
+    delay = POLL_FIRST
+    deadline = time.time() + timeout
+    while remote.state.name == "PROCESSING":
+        if time.time() > deadline:
+            raise TimeoutError(f"O ficheiro {remote.display_name or remote.name} continua em processamento.")
+        time.sleep(delay)
+        delay = min(POLL_MAX, delay * POLL_FACTOR)
+        remote = client.get_file(remote.name)
+    if remote.state.name == "FAILED":
+        raise ValueError("Falha no processamento do ficheiro pela Google.")
+    return remote
+
+def _reuse(client, digest):
+    name = lookup(client.api_key, digest)
+    if not name:
+        return None
+    try:
+        remote = client.get_file(name)
+    except Exception:
+        forget(client.api_key, digest)  # Já apagado do lado do servidor
+        return None
+    if remote.state.name == "FAILED":
+        forget(client.api_key, digest)
+        return None
+    return remote
+
+def ensure_uploaded(client, f, display_name=None, mime_type="application/pdf"):
+    """
+    Ficheiro remoto ACTIVE com o conteúdo de `f` (bytes, caminho ou ficheiro
+    carregado). Reutiliza o upload registado se ainda existir.
+    Devolve (file_types.File, reutilizado).
+    """
+    digest = pdf_cache.file_digest(f)
+    remote = _reuse(client, digest)
+    if remote is not None:
+        return wait_active(client, remote), True
+
+    fd, tmp = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(pdf_cache.file_bytes(f))
+        remote = client.upload_file(tmp, display_name=display_name or getattr(f, "name", None), mime_type=mime_type)
+    finally:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    record(client.api_key, digest, remote.name)
+    return wait_active(client, remote), False
+
+def upload_many(client, files, max_workers=MAX_PARALLEL_UPLOADS):
+    """
+    Inicia o envio (ou reutilização) de vários ficheiros em paralelo e
+    devolve logo os futures, pela ordem de `files`: o chamador pode
+    continuar a preparar o pedido enquanto os envios decorrem.
+    """
+    ex = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(files))))
+    futures = [ex.submit(ensure_uploaded, client, f) for f in files]
+    ex.shutdown(wait=False)
+    return futures
@@ -0,0 +1,218 @@
+"""
+Serviço único de acesso à API Gemini.
+
+O `genai.configure()` do SDK altera um estado global do processo: com
+vários analistas no mesmo servidor, cada sessão sobrepunha a chave das
+outras. Aqui cada API key tem o seu próprio conjunto de clientes (canal
+gRPC reutilizado entre pedidos) e os objetos GenerativeModel são criados
+uma vez por (api_key, modelo). Tudo é seguro para várias sessões e threads
+em simultâneo.
+
+generate() e stream() passam pela cache de respostas (llm_cache.py): o
+mesmo modelo, prompt e anexos devolvem a resposta guardada, salvo com
+force=True. Os pedidos que seguem para a API passam pelo limitador
+partilhado (rate_limiter.py), que também trata das novas tentativas após
+um 429/503.
+
+Com stage=telemetry.Stage, cada chamada soma à etapa os tokens de entrada
+e de saída (estimados), os acertos na cache, as novas tentativas e a
+espera imposta pelo limitador.
+
+Com SUPERAPP_GEMINI_BACKEND=fake (ou set_backend("fake")) os clientes são
+simulados localmente (fake_gemini.py), para medições sem rede nem quota.
+"""
+import os
+import time
+import threading
+import google.generativeai as genai
+from google.generativeai.client import _ClientManager
+from google.generativeai.types import file_types
+
+import llm_cache
+import rate_limiter
+import token_budget
+
+
+class GeminiClient:
+    """Clientes e modelos associados a uma API key."""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        # O _ClientManager é o mesmo mecanismo que o genai.configure usa,
+        # mas numa instância própria em vez da global do módulo.
+        self._manager = _ClientManager()
+        self._manager.configure(api_key=api_key)
+        self._lock = threading.Lock()
+        self._models = {}
+
+    def _service(self, name):
+        with self._lock:
+            return self._manager.get_default_client(name)
+
+    # --- Modelos ---
+    def model(self, model_name):
+        """GenerativeModel reutilizável, ligado ao cliente desta chave."""
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = genai.GenerativeModel(model_name)
+                model._client = self._manager.get_default_client("generative")
+                self._models[model_name] = model
+            return model
+
+    def _input_tokens(self, contents):
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        return sum(token_budget.estimate_tokens(p) for p in parts if isinstance(p, str))
+
+    def _limited(self, model_name, contents, on_wait, stage=None, **kwargs):
+        """generate_content dentro do limitador, com novas tentativas após 429/503."""
+        tokens = self._input_tokens(contents)
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            rate_limiter.acquire(self.api_key, model_name, tokens, on_wait)
+            if stage:
+                stage.add(tokens_in=0 if attempt else tokens, wait_s=round(time.perf_counter() - start, 3))
+            try:
+                response = self.model(model_name).generate_content(contents, **kwargs)
+                rate_limiter.record_success(self.api_key, model_name)
+                return response
+            except Exception as e:
+                if rate_limiter.backoff(self.api_key, model_name, e, attempt) is None:
+                    raise
+                attempt += 1
+                if stage:
+                    stage.add(retries=1)
+
+    def generate(self, model_name, contents, request_options=None, force=False, use_cache=True, file_hashes=(), on_wait=None, stage=None):
+        """
+        Geração (bloqueante) com cache de respostas.
+        force=True ignora a resposta guardada e substitui-a pela nova.
+        on_wait(segundos) é chamado quando o limitador obriga a esperar.
+        """
+        key = llm_cache.make_key(model_name, contents, file_hashes) if use_cache else None
+        if key and not force:
+            text = llm_cache.get(key)
+            if text is not None:
+                if stage:
+                    stage.add(cache_hits=1, tokens_out=token_budget.estimate_tokens(text))
+                return llm_cache.CachedResponse(text)
+
+        response = self._limited(model_name, contents, on_wait, stage, request_options=request_options or {})
+        try:
+            text = response.text
+        except ValueError:
+            text = None  # Resposta bloqueada/sem texto: não se guarda
+        if stage and text:
+            stage.add(tokens_out=token_budget.estimate_tokens(text))
+        if key and text is not None:
+            llm_cache.put(key, model_name, text)
+        return response
+
+    def stream(self, model_name, contents, request_options=None, force=False, use_cache=True, file_hashes=(), on_wait=None, stage=None):
+        """
+        Geração em streaming: produz o texto em pedaços à medida que chega.
+        Um acerto na cache produz a resposta completa de uma só vez; a resposta
+        só é guardada na cache quando o fluxo termina sem erros. Um 429/503
+        só é repetido enquanto ainda não chegou texto nenhum.
+        """
+        key = llm_cache.make_key(model_name, contents, file_hashes) if use_cache else None
+        if key and not force:
+            text = llm_cache.get(key)
+            if text is not None:
+                if stage:
+                    stage.add(cache_hits=1, tokens_out=token_budget.estimate_tokens(text))
+                yield text
+                return
+
+        parts = []
+        attempt = 0
+        while True:
+            response = self._limited(
+                model_name, contents, on_wait, stage, stream=True, request_options=request_options or {}
+            )
+            try:
+                for chunk in response:
+                    try:
+                        piece = chunk.text
+                    except ValueError:
+                        continue  # Pedaço sem texto (p.ex. só o motivo de fim)
+                    if piece:
+                        parts.append(piece)
+                        yield piece
+                break
+            except Exception as e:
+                # O erro pode surgir só ao ler o primeiro pedaço
+                if parts or rate_limiter.backoff(self.api_key, model_name, e, attempt) is None:
+                    raise
+                attempt += 1
+                if stage:
+                    stage.add(retries=1)
+        text = "".join(parts)
+        if stage:
+            stage.add(tokens_out=token_budget.estimate_tokens(text))
+        if key:
+            llm_cache.put(key, model_name, text)
+
+    def cached(self, model_name, contents, file_hashes=(), stage=None):
+        """Resposta guardada para o pedido (ou None), sem chamar a API."""
+        text = llm_cache.get(llm_cache.make_key(model_name, contents, file_hashes))
+        if text is None:
+            return None
+        if stage:
+            stage.add(cache_hits=1, tokens_out=token_budget.estimate_tokens(text))
+        return llm_cache.CachedResponse(text)
+
+    def list_models(self):
+        return list(genai.list_models(client=self._service("model")))
+
+    # --- File API ---
+    def upload_file(self, path, display_name=None, mime_type="application/pdf"):
+        proto = self._service("file").create_file(path=path, mime_type=mime_type, display_name=display_name)
+        return file_types.File(proto)
+
+    def get_file(self, name):
+        if "/" not in name:
+            name = f"files/{name}"
+        return file_types.File(self._service("file").get_file(name=name))
+
+    def delete_file(self, name):
+        if not isinstance(name, str):
+            name = name.name
+        if "/" not in name:
+            name = f"files/{name}"
+        self._service("file").delete_file(name=name)
+
+
+# ==========================================
+# --- REGISTO POR API KEY ---
+# ==========================================
+_clients = {}
+_clients_lock = threading.Lock()
+_backend = os.environ.get("SUPERAPP_GEMINI_BACKEND", "google")
+
+def set_backend(name):
+    """'google' (API real) ou 'fake' (fake_gemini.py); esquece os clientes já criados."""
+    global _backend
+    if name not in ("google", "fake"):
+        raise ValueError(f"Backend desconhecido: {name}")
+    with _clients_lock:
+        _backend = name
+        _clients.clear()
+
+def _new_client(api_key):
+    if _backend == "fake":
+        import fake_gemini  # Importado só quando usado (depende deste módulo)
+        return fake_gemini.FakeGeminiClient(api_key)
+    return GeminiClient(api_key)
+
+def get_client(api_key):
+    """Cliente partilhado para a chave (criado na primeira utilização)."""
+    if not api_key:
+        raise ValueError("API Key em falta.")
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _new_client(api_key)
+            _clients[api_key] = client
+        return client
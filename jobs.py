@@ -0,0 +1,375 @@
+"""
+Trabalhos em segundo plano (auditorias e relatórios longos).
+
+O trabalho pesado corria dentro do `if st.button(...)`, na thread do
+script: qualquer clique noutro widget, mudança de página ou falha do
+browser interrompia uma auditoria de 5 minutos. Aqui cada análise é um
+trabalho com ID, submetido a um pool de threads do servidor (que não
+depende da sessão). O estado, o progresso, as mensagens e o texto — parcial
+enquanto é gerado, completo no fim — ficam numa base SQLite local, pelo que
+a página só tem de consultar o trabalho; o utilizador pode sair e voltar
+mais tarde (com a mesma API key) para recolher o relatório.
+
+Vários processos (workers do Streamlit, batch_cli) podem partilhar a base:
+cada um atualiza periodicamente `updated` dos seus trabalhos em curso e só
+os trabalhos de processos mortos ou sem sinal de vida são dados como
+interrompidos.
+
+As funções dos trabalhos recebem o Job como primeiro argumento e usam-no
+como usariam um st.status: write(), progress(), consume() para texto em
+streaming. Não podem chamar o Streamlit.
+"""
+import io
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pdf_cache
+import gemini_client
+import telemetry
+
+# --- 1. CONFIGURAÇÃO ---
+DB_PATH = os.path.join(pdf_cache.CACHE_ROOT, "jobs.sqlite")
+MAX_WORKERS = int(os.environ.get("SUPERAPP_JOB_WORKERS", "4"))
+KEEP_DAYS = float(os.environ.get("SUPERAPP_JOB_KEEP_DAYS", "14"))
+SAVE_INTERVAL = 0.5   # Gravação do texto parcial no máximo 2x por segundo
+HEARTBEAT = 30        # Segundos entre atualizações de `updated` dos trabalhos em curso
+STALE_AFTER = 10 * HEARTBEAT   # Sem sinal de vida há mais tempo: o processo dono morreu
+
+QUEUED, RUNNING, DONE, ERROR, CANCELLED, INTERRUPTED = (
+    "queued", "running", "done", "error", "cancelled", "interrupted"
+)
+FINISHED = (DONE, ERROR, CANCELLED, INTERRUPTED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def owner_id(api_key):
+    """Dono dos trabalhos: hash da API key (a chave não é guardada)."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+class FileSnapshot(io.BytesIO):
+    """
+    Cópia em memória de um ficheiro carregado, válida depois do rerun que o
+    criou. `digest` (SHA-256 já calculado, p.ex. por prefetch.digests) evita
+    voltar a ler os bytes para o hash.
+    """
+
+    def __init__(self, f, digest=None):
+        super().__init__(pdf_cache.file_bytes(f))
+        self.name = getattr(f, "name", None) or "documento.pdf"
+        self.digest = digest or pdf_cache.file_digest(self)
+
+def snapshot(files, digests=None):
+    files = [f for f in files or [] if f is not None]
+    return [FileSnapshot(f, d) for f, d in zip(files, digests or [None] * len(files))]
+
+# ==========================================
+# --- 2. TRABALHO ---
+# ==========================================
+
+class Job:
+    """Estado de um trabalho; a função do trabalho usa-o para reportar progresso."""
+
+    def __init__(self, job_id, kind, title, owner, meta=None):
+        self.id = job_id
+        self.kind = kind
+        self.title = title
+        self.owner = owner
+        self.meta = meta or {}
+        self.status = QUEUED
+        self.fraction = 0.0
+        self.messages = []
+        self.text = ""
+        self.error = None
+        self.created = self.updated = time.time()
+        self._cancel = threading.Event()
+        self._saved = 0.0
+        self.trace = telemetry.Trace(kind, job_id)
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    # --- Interface tipo st.status (usada pelas funções dos trabalhos) ---
+    def write(self, message):
+        self.messages.append(str(message))
+        self._save()
+        return self
+
+    info = success = warning = write
+
+    def empty(self):
+        return self
+
+    def progress(self, value):
+        self.fraction = max(0.0, min(1.0, float(value)))
+        self._save()
+        return self
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def consume(self, chunks):
+        """Acumula texto em streaming no resultado do trabalho; devolve o texto completo."""
+        parts = []
+        for piece in chunks:
+            self.check()
+            parts.append(piece)
+            # Junta o texto parcial só quando vai ser gravado (não a cada pedaço)
+            if time.time() - self._saved >= SAVE_INTERVAL:
+                self.text = "".join(parts)
+                self._save()
+        self.text = "".join(parts)
+        self._save()
+        return self.text
+
+    # --- Persistência ---
+    def _save(self):
+        self.updated = self._saved = time.time()
+        _store(self)
+
+    @classmethod
+    def _from_row(cls, row):
+        job = cls(row["id"], row["kind"], row["title"], row["owner"], json.loads(row["meta"] or "{}"))
+        job.status = row["status"]
+        job.fraction = row["fraction"]
+        job.messages = json.loads(row["messages"] or "[]")
+        job.text = row["text"] or ""
+        job.error = row["error"]
+        job.created = row["created"]
+        job.updated = row["updated"]
+        return job
+
+# ==========================================
+# --- 3. ARMAZENAMENTO ---
+# ==========================================
+
+_db_lock = threading.Lock()
+_initialized = False
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if not _initialized:
+        with _db_lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id TEXT PRIMARY KEY,
+                        kind TEXT,
+                        title TEXT,
+                        owner TEXT,
+                        pid INTEGER,
+                        status TEXT,
+                        fraction REAL,
+                        messages TEXT,
+                        text TEXT,
+                        error TEXT,
+                        meta TEXT,
+                        created REAL,
+                        updated REAL
+                    )""")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs(owner, created)")
+                _expire(conn)
+                conn.execute("DELETE FROM jobs WHERE created < ?", (time.time() - KEEP_DAYS * 86400,))
+                conn.commit()
+                _initialized = True
+    return conn
+
+def _pid_alive(pid):
+    if os.name == "nt":
+        return True   # No Windows, os.kill termina o processo: fica só o heartbeat
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass          # Existe, mas é de outro utilizador
+    return True
+
+def _expire(conn):
+    """
+    Marca como interrompidos os trabalhos por acabar de outros processos
+    (outro worker do Streamlit, batch_cli) que já terminaram ou deixaram de
+    dar sinal de vida. Os trabalhos vivos de outros processos não são tocados.
+    """
+    rows = conn.execute(
+        "SELECT id, pid, updated FROM jobs WHERE status IN (?, ?) AND pid != ?",
+        (QUEUED, RUNNING, os.getpid())
+    ).fetchall()
+    stale_before = time.time() - STALE_AFTER
+    dead = [r["id"] for r in rows if r["updated"] < stale_before or not _pid_alive(r["pid"])]
+    if dead:
+        conn.executemany(
+            "UPDATE jobs SET status = ? WHERE id = ? AND status IN (?, ?)",
+            [(INTERRUPTED, job_id, QUEUED, RUNNING) for job_id in dead]
+        )
+        conn.commit()
+
+def _heartbeat():
+    """Atualiza `updated` dos trabalhos em curso deste processo (ver _expire)."""
+    while True:
+        time.sleep(HEARTBEAT)
+        live = [job for job in list(_live.values()) if not job.finished]
+        if not live:
+            continue
+        now = time.time()
+        for job in live:
+            job.updated = now
+        try:
+            conn = _connect()
+            try:
+                conn.executemany(
+                    "UPDATE jobs SET updated = ? WHERE id = ? AND status IN (?, ?)",
+                    [(now, job.id, QUEUED, RUNNING) for job in live]
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            pass
+
+def _store(job):
+    try:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, kind, title, owner, pid, status, fraction, messages, text, error, meta, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.kind, job.title, job.owner, os.getpid(), job.status, job.fraction,
+                 json.dumps(job.messages[-200:], ensure_ascii=False), job.text, job.error,
+                 json.dumps(job.meta, ensure_ascii=False), job.created, job.updated)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
+
+# ==========================================
+# --- 4. EXECUÇÃO ---
+# ==========================================
+
+_pool = None
+_pool_lock = threading.Lock()
+_live = {}   # Trabalhos deste processo (estado em memória, mais recente que o da base)
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="superapp-job")
+            threading.Thread(target=_heartbeat, name="superapp-job-heartbeat", daemon=True).start()
+        return _pool
+
+def _run(job, fn, args, kwargs):
+    if job.cancel_requested:
+        job.status = CANCELLED
+        job._save()
+        return
+    job.trace.add("fila", time.time() - job.created)
+    job.status = RUNNING
+    job._save()
+    try:
+        result = fn(job, *args, **kwargs)
+        if isinstance(result, str):
+            job.text = result
+        job.fraction = 1.0
+        job.status = DONE
+    except JobCancelled:
+        job.status = CANCELLED
+    except Exception as e:
+        job.error = str(e) or e.__class__.__name__
+        job.status = ERROR
+    job._save()
+
+def submit(kind, title, owner, fn, *args, meta=None, trace=None, **kwargs):
+    """
+    Cria o trabalho, agenda fn(job, *args, **kwargs) e devolve o ID.
+    `trace` (telemetry.Trace) traz as etapas já medidas pela página antes do
+    trabalho existir; fica ligado ao ID do trabalho.
+    """
+    job = Job(uuid.uuid4().hex, kind, title, owner, meta)
+    if trace is not None:
+        job.trace = trace.bind(job.id)
+    job._save()
+    _live[job.id] = job
+    _get_pool().submit(_run, job, fn, args, kwargs)
+    return job.id
+
+def get(job_id):
+    """Trabalho pelo ID (em curso neste processo ou gravado), ou None."""
+    job = _live.get(job_id)
+    if job is not None:
+        if job.finished:
+            _live.pop(job_id, None)
+        return job
+    try:
+        conn = _connect()
+        try:
+            _expire(conn)
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return Job._from_row(row) if row else None
+
+def recent(owner, kind=None, limit=10):
+    """Trabalhos mais recentes do dono (opcionalmente de um tipo)."""
+    sql = "SELECT * FROM jobs WHERE owner = ?"
+    params = [owner]
+    if kind:
+        sql += " AND kind = ?"
+        params.append(kind)
+    sql += " ORDER BY created DESC LIMIT ?"
+    params.append(limit)
+    try:
+        conn = _connect()
+        try:
+            _expire(conn)
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return []
+    return [_live.get(r["id"]) or Job._from_row(r) for r in rows]
+
+def cancel(job_id):
+    """Pede o cancelamento (efetivo no próximo ponto de verificação do trabalho)."""
+    job = _live.get(job_id)
+    if job is not None:
+        job._cancel.set()
+
+# ==========================================
+# --- 5. TRABALHOS COMUNS ---
+# ==========================================
+
+def run_generation(job, api_key, model_name, contents, request_options=None, force=False, file_hashes=()):
+    """Geração em streaming para o texto do trabalho."""
+    client = gemini_client.get_client(api_key)
+    job.write(f"🧠 A gerar com {model_name}...")
+    with job.trace.stage("modelo") as stage:
+        return job.consume(client.stream(
+            model_name, contents, request_options=request_options, force=force, file_hashes=file_hashes,
+            on_wait=lambda s: job.write(f"⏳ Cota momentânea atingida: nova tentativa em {s:.0f}s."),
+            stage=stage
+        ))
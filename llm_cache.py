@@ -0,0 +1,156 @@
+"""
+Cache de respostas do modelo (SQLite em disco).
+
+A chave é o SHA-256 de: modelo + prompt normalizado (espaços colapsados) +
+hashes dos ficheiros anexados. Pedidos idênticos — p.ex. carregar outra vez
+em "Processar Análise" após recarregar a página — são devolvidos em
+milissegundos. As entradas expiram ao fim de TTL_SECONDS e, acima de
+MAX_CACHE_BYTES, são removidas as usadas há mais tempo (LRU).
+A base de dados é partilhada por todas as sessões e processos do servidor.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+import pdf_cache
+
+# --- 1. CONFIGURAÇÃO ---
+DB_PATH = os.path.join(pdf_cache.CACHE_ROOT, "llm_responses.sqlite")
+TTL_SECONDS = int(float(os.environ.get("SUPERAPP_LLM_CACHE_DAYS", "7")) * 86400)
+MAX_CACHE_BYTES = int(float(os.environ.get("SUPERAPP_LLM_CACHE_MB", "200")) * 1024 * 1024)
+_KEY_VERSION = "v1"
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+class CachedResponse:
+    """Resposta vinda da cache, com a mesma interface mínima (.text) da API."""
+    cached = True
+
+    def __init__(self, text):
+        self.text = text
+
+# ==========================================
+# --- 2. CHAVE ---
+# ==========================================
+
+def _part_fingerprint(part):
+    if isinstance(part, str):
+        return "t:" + " ".join(part.split())
+    # Ficheiros da File API: o hash do conteúdo, não o nome remoto (muda a cada upload)
+    digest = getattr(part, "sha256_hash", None)
+    if digest:
+        return "f:" + (digest.hex() if isinstance(digest, bytes) else str(digest))
+    return "o:" + str(getattr(part, "name", part))
+
+def make_key(model_name, contents, file_hashes=()):
+    """
+    Chave do pedido. Se `file_hashes` for indicado (hashes locais dos PDFs),
+    os anexos não-texto de `contents` são ignorados: assim a chave pode ser
+    calculada antes do upload e um acerto evita o envio dos ficheiros.
+    """
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    if file_hashes:
+        parts = [p for p in parts if isinstance(p, str)]
+    h = hashlib.sha256()
+    h.update(f"{_KEY_VERSION}|{model_name}".encode("utf-8"))
+    for p in parts:
+        h.update(b"\x00" + _part_fingerprint(p).encode("utf-8"))
+    for fh in file_hashes:
+        h.update(b"\x00h:" + str(fh).encode("utf-8"))
+    return h.hexdigest()
+
+# ==========================================
+# --- 3. ARMAZENAMENTO ---
+# ==========================================
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        model TEXT,
+                        text TEXT,
+                        size INTEGER,
+                        created REAL,
+                        accessed REAL
+                    )""")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+                conn.commit()
+                _initialized = True
+    return conn
+
+def get(key):
+    """Texto guardado para a chave, ou None (inexistente ou expirado)."""
+    now = time.time()
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > TTL_SECONDS:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return row[0]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+def put(key, model_name, text):
+    if not text:
+        return
+    now = time.time()
+    try:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, text, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, text, len(text.encode("utf-8")), now, now)
+            )
+            conn.commit()
+            _evict(conn, now)
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
+
+def _evict(conn, now):
+    conn.execute("DELETE FROM responses WHERE created < ?", (now - TTL_SECONDS,))
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total > MAX_CACHE_BYTES:
+        excess = total - MAX_CACHE_BYTES
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if freed >= excess:
+                break
+            victims.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+    conn.commit()
+
+def clear():
+    try:
+        conn = _connect()
+        try:
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
@@ -0,0 +1,118 @@
+"""
+Catálogo de modelos Gemini partilhado pelas páginas.
+
+Cada rerun do Streamlit (qualquer clique num widget) chamava list_models(),
+com uma ida à rede por interação. Aqui a lista é guardada por API key
+durante TTL_SECONDS; depois disso a lista conhecida continua a ser servida
+de imediato enquanto uma thread em segundo plano a atualiza. Se a API
+falhar, mantém-se a última lista válida (ou FALLBACK_MODELS na primeira
+vez). A preferência entre modelos ("2.5-flash" > "2.0-flash" > ...) é
+resolvida uma vez por lista, não em cada página.
+"""
+import os
+import time
+import threading
+from functools import lru_cache
+
+import gemini_client
+
+# --- 1. CONFIGURAÇÃO ---
+TTL_SECONDS = int(os.environ.get("SUPERAPP_MODEL_CATALOG_TTL", "3600"))
+RETRY_SECONDS = 60   # Após uma falha da API, nova tentativa só passado este tempo
+FALLBACK_MODELS = ["models/gemini-2.0-flash", "models/gemini-1.5-flash", "models/gemini-1.5-pro"]
+
+# Preferências usadas pelas páginas (primeiro padrão encontrado no nome ganha)
+FLASH_FIRST = ("2.5-flash", "2.0-flash", "1.5-flash", "flash")
+FLASH_THEN_PRO = ("2.5-flash", "2.0-flash", "1.5-flash", "pro")
+PRO_FIRST = ("1.5-pro",)
+
+
+class _Entry:
+    __slots__ = ("names", "limits", "fetched", "refreshing")
+
+    def __init__(self, names, limits, fetched):
+        self.names = names
+        self.limits = limits       # nome -> input_token_limit
+        self.fetched = fetched
+        self.refreshing = False
+
+
+_entries = {}
+_lock = threading.Lock()
+
+# ==========================================
+# --- 2. CONSULTA À API ---
+# ==========================================
+
+def _fetch(api_key):
+    models = [m for m in gemini_client.get_client(api_key).list_models()
+              if 'generateContent' in m.supported_generation_methods]
+    names = [m.name for m in models]
+    limits = {m.name: getattr(m, "input_token_limit", None) for m in models}
+    return _Entry(names, limits, time.time())
+
+def _refresh(api_key):
+    try:
+        entry = _fetch(api_key)
+    except Exception:
+        entry = None
+    with _lock:
+        if entry is not None and entry.names:
+            _entries[api_key] = entry
+            return
+        # Falhou: mantém a última lista válida (ou a de recurso) e só volta
+        # a tentar passados RETRY_SECONDS, para não bloquear cada rerun
+        old = _entries.get(api_key) or _Entry(list(FALLBACK_MODELS), {}, 0)
+        old.fetched = time.time() - TTL_SECONDS + RETRY_SECONDS
+        old.refreshing = False
+        _entries[api_key] = old
+
+def _entry(api_key):
+    with _lock:
+        entry = _entries.get(api_key)
+        if entry is not None:
+            if time.time() - entry.fetched > TTL_SECONDS and not entry.refreshing:
+                entry.refreshing = True
+                threading.Thread(target=_refresh, args=(api_key,), daemon=True).start()
+            return entry
+    # Primeira utilização desta chave: é preciso esperar pela API uma vez
+    _refresh(api_key)
+    with _lock:
+        return _entries[api_key]
+
+# ==========================================
+# --- 3. INTERFACE PÚBLICA ---
+# ==========================================
+
+def available_models(api_key):
+    """Nomes dos modelos com generateContent (lista em cache)."""
+    if not api_key:
+        return list(FALLBACK_MODELS)
+    return list(_entry(api_key).names)
+
+def input_token_limit(api_key, model_name):
+    """input_token_limit do catálogo, ou None se desconhecido."""
+    with _lock:
+        entry = _entries.get(api_key)
+        return entry.limits.get(model_name) if entry else None
+
+@lru_cache(maxsize=64)
+def _preferred_index(names, preference):
+    lowered = [n.lower() for n in names]
+    for target in preference:
+        for i, name in enumerate(lowered):
+            if target in name:
+                return i
+    return 0
+
+def default_index(models, preference=FLASH_FIRST):
+    """Índice do modelo preferido em `models` (0 se nenhum padrão corresponder)."""
+    return _preferred_index(tuple(models), tuple(preference))
+
+def invalidate(api_key=None):
+    """Esquece a lista de uma chave (ou de todas)."""
+    with _lock:
+        if api_key is None:
+            _entries.clear()
+        else:
+            _entries.pop(api_key, None)
@@ -8,17 +8,13 @@ root_dir = os.path.dirname(current_dir)
 sys.path.insert(0, root_dir)
 
 import utils
+import text_cleanup
 import streamlit as st
-from pypdf import PdfReader
-from docx import Document
-from docx.shared import Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
-import google.generativeai as genai
-import io
-import re
-from datetime import datetime
+import jobs
+import model_catalog
+import caso_a_caso
+import telemetry
+import prefetch
 
 # --- 2. CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(
@@ -47,32 +43,13 @@ if not api_key:
 # ==========================================
 # --- 5. SELETOR DE MODELO (DINÂMICO) ---
 # ==========================================
-def get_available_models(key):
-    """Lista modelos disponíveis na API."""
-    try:
-        genai.configure(api_key=key)
-        return [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
-    except:
-        return ["models/gemini-2.0-flash", "models/gemini-1.5-flash"]
-
 with st.sidebar:
     st.divider()
     st.markdown("### 🧠 Motor de IA")
     
-    opcoes_modelos = get_available_models(api_key)
-    
-    # Lógica de Prioridade: 2.5 Flash > 2.0 Flash > 1.5 Flash > Qualquer Flash
-    targets = ["2.5-flash", "2.0-flash", "1.5-flash", "flash"]
-    idx_padrao = 0
-    found = False
-    
-    for t in targets:
-        for i, m in enumerate(opcoes_modelos):
-            if t in m.lower():
-                idx_padrao = i
-                found = True
-                break
-        if found: break
+    # Lista em cache (model_catalog); prioridade: 2.5 Flash > 2.0 Flash > 1.5 Flash > Qualquer Flash
+    opcoes_modelos = model_catalog.available_models(api_key)
+    idx_padrao = model_catalog.default_index(opcoes_modelos, model_catalog.FLASH_FIRST)
             
     selected_model = st.selectbox(
         "Modelo:", 
@@ -85,106 +62,19 @@ with st.sidebar:
 # --- 6. FUNÇÕES AUXILIARES ---
 # ==========================================
 
-LEGISLATION_DB = {
-    "RJAIA (DL 151-B/2013)": "https://diariodarepublica.pt/dr/legislacao-consolidada/decreto-lei/2013-116043164",
-    "Alteração RJAIA (DL 152-B/2017)": "https://diariodarepublica.pt/dr/detalhe/decreto-lei/152-b-2017-114337069",
-    "LUA (DL 75/2015)": "https://diariodarepublica.pt/dr/legislacao-consolidada/decreto-lei/2015-106562356",
-    "Rede Natura 2000 (DL 140/99)": "https://diariodarepublica.pt/dr/legislacao-consolidada/decreto-lei/1999-34460975"
-}
-
-def extract_text(files, label):
-    """Extrai texto de PDFs carregados."""
-    text = ""
-    if not files: return "" 
-    for f in files:
-        try:
-            reader = PdfReader(f)
-            file_text = ""
-            for page in reader.pages:
-                file_text += page.extract_text() or ""
-            text += f"\n\n>>> FONTE: {label} ({f.name}) <<<\n{file_text}"
-        except Exception as e:
-            st.error(f"Erro ao ler '{f.name}': {e}")
-    return text
-
-def analyze_validation(t_sim, t_form, t_proj, t_leg, key, model_name):
-    """Executa a auditoria de validação (Análise Técnica)."""
-    genai.configure(api_key=key)
-    model = genai.GenerativeModel(model_name)
-    
-    prompt = f"""
-    Atua como Auditor Ambiental da Autoridade de AIA.
-    
-    CONTEXTO LEGAL:
-    Utiliza: RJAIA (DL 151-B/2013) e seus Anexos.
-    Contexto Local (PDM/Condicionantes): {t_leg[:20000]}
+# Fontes, prompts e Word em caso_a_caso.py (partilhados com o processamento em lote)
 
-    DADOS DO PROJETO:
-    SIMULAÇÃO: {t_sim[:20000]}
-    FORMULÁRIO: {t_form[:20000]}
-    MEMÓRIA DESCRITIVA: {t_proj[:60000]}
+def open_streams(files):
+    """Abre os PDFs carregados como fluxos de páginas (extração e limpeza a pedido)."""
+    return caso_a_caso.open_streams(files, on_error=lambda f, e: st.error(f"Erro ao ler '{f.name}': {e}"))
 
-    TAREFA:
-    Realiza uma auditoria de conformidade para verificar se o projeto está bem enquadrado como "Caso a Caso" ou se devia ser AIA direta.
-    Verifica limiares do Anexo II.
+def analyze_validation(job, t_sim, t_form, t_proj, t_leg, key, model_name, force=False):
+    """Executa a auditoria de validação (Análise Técnica) como trabalho em segundo plano."""
+    return jobs.run_generation(job, key, model_name, caso_a_caso.validation_prompt(t_sim, t_form, t_proj, t_leg), force=force)
 
-    OUTPUT (MARKDOWN):
-    ## 1. Resumo do Projeto
-    ## 2. Verificação de Limiares (Anexo II)
-    - Ponto do Anexo: [Identificar]
-    - Limiar Legal: [Valor]
-    - Valor do Projeto: [Valor]
-    - Parecer: [Cumpre/Não Cumpre]
-    ## 3. Análise de Sensibilidade (Localização)
-    ## 4. Conclusão da Validação
-    """
-    return model.generate_content(prompt).text
-
-def generate_decision_text(t_sim, t_form, t_proj, t_leg, key, model_name):
-    """Gera a Minuta de Decisão Final."""
-    genai.configure(api_key=key)
-    model = genai.GenerativeModel(model_name)
-    
-    prompt = f"""
-    Redige a MINUTA DE DECISÃO FINAL (Técnico Superior).
-    
-    DADOS: {t_proj[:80000]} {t_form[:20000]}
-    
-    OUTPUT - APENAS O TEXTO PARA PREENCHER O WORD (Não uses Markdown aqui, usa texto corrido estruturado):
-    
-    Identificação do Projeto: [Nome]
-    Promotor: [Nome]
-    Localização: [Local]
-    
-    CONSIDERANDO QUE:
-    1. O projeto se enquadra na alínea [X] do ponto [Y] do Anexo II...
-    2. Da análise efetuada, verifica-se que [Resumo dos impactes]...
-    3. Foram consultadas as entidades [Entidades]...
-    
-    DECISÃO:
-    Face ao exposto, propõe-se a [SUJEIÇÃO / NÃO SUJEIÇÃO] a Avaliação de Impacte Ambiental.
-    
-    CONDICIONANTES:
-    (Lista de condicionantes a cumprir caso não seja sujeito a AIA).
-    """
-    return model.generate_content(prompt).text
-
-def create_doc_from_text(text, title):
-    """Gera um ficheiro Word simples."""
-    doc = Document()
-    doc.add_heading(title, 0)
-    
-    for line in text.split('\n'):
-        line = line.strip()
-        if not line: continue
-        if line.startswith('## '): doc.add_heading(line.replace('##', ''), 1)
-        elif line.startswith('- '): doc.add_paragraph(line[2:], style='List Bullet')
-        else: doc.add_paragraph(line)
-        
-    bio = io.BytesIO()
-    doc.save(bio)
-    bio.seek(0)
-    return bio
+def generate_decision_text(job, t_form, t_proj, key, model_name, force=False):
+    """Gera a Minuta de Decisão Final como trabalho em segundo plano."""
+    return jobs.run_generation(job, key, model_name, caso_a_caso.decision_prompt(t_form, t_proj), force=force)
 
 # ==========================================
 # --- 7. INTERFACE PRINCIPAL ---
@@ -199,8 +89,13 @@ def reset_app():
     st.session_state.uploader_key += 1
     st.session_state.validation_result = None
     st.session_state.decision_result = None
+    st.session_state.validation_job = None
+    st.session_state.decision_job = None
     st.rerun()
 
+utils.recent_jobs("caso_validacao", "validation_job", "validation_result")
+utils.recent_jobs("caso_decisao", "decision_job", "decision_result")
+
 # Uploads
 c1, c2, c3, c4 = st.columns(4)
 with c1: 
@@ -212,6 +107,10 @@ with c3:
 with c4: 
     files_leg = st.file_uploader("📜 Legislação/PDM", type=['pdf'], accept_multiple_files=True, key=f"l_{st.session_state.uploader_key}")
 
+# A extração começa logo após o upload (em segundo plano, pelo hash do conteúdo)
+all_files = [*(files_sim or []), *(files_form or []), *(files_doc or []), *(files_leg or [])]
+prefetch.extract(all_files)
+
 st.markdown("---")
 
 # Botão de Ação
@@ -223,56 +122,93 @@ if st.button("🚀 Processar Análise", type="primary", use_container_width=True
     else:
         with st.status("⚙️ A processar...", expanded=True) as status:
             st.write("📖 A ler documentos...")
-            ts = extract_text(files_sim, "SIM")
-            tf = extract_text(files_form, "FORM")
-            tp = extract_text(files_doc, "PROJ")
-            tl = extract_text(files_leg, "LOCAL") if files_leg else "N/A"
-            
-            # Validação
-            st.write(f"🕵️ A realizar Auditoria Técnica com **{selected_model}**...")
-            val = analyze_validation(ts, tf, tp, tl, api_key, selected_model)
-            st.session_state.validation_result = val
-            
-            # Decisão
-            st.write("⚖️ A redigir Minuta de Decisão...")
-            dec = generate_decision_text(ts, tf, tp, tl, api_key, selected_model)
-            st.session_state.decision_result = dec
-            
-            status.update(label="✅ Concluído!", state="complete")
-
-# Área de Resultados
-if st.session_state.validation_result:
+            trace = telemetry.Trace("caso_validacao")
+            with trace.stage("extração") as stage:
+                prefetch.wait(prefetch.digests(all_files))
+                streams = {
+                    "SIM": open_streams(files_sim),
+                    "FORM": open_streams(files_form),
+                    "PROJ": open_streams(files_doc),
+                    "LOCAL": open_streams(files_leg),
+                }
+                plan_val, val_args, dec_args = caso_a_caso.prepare_texts(
+                    streams, selected_model, model_catalog.input_token_limit(api_key, selected_model)
+                )
+                stage.add(**telemetry.doc_stats([d for label in plan_val.sources for d in plan_val.documents(label)]),
+                          tokens_in=plan_val.used_tokens)
+            st.write(text_cleanup.summary(s.cleaner for group in streams.values() for s in group))
+            st.caption("  \n".join(plan_val.report()))
+            force = st.session_state.get("force_regenerate", False)
+            st.session_state.validation_result = None
+            st.session_state.decision_result = None
+
+            # Validação e Decisão são independentes: correm em simultâneo, em segundo
+            # plano (sobrevivem a reruns e mudanças de página), e a falha de uma não
+            # afeta a outra.
+            st.write(f"🕵️ A realizar Auditoria Técnica e ⚖️ Minuta de Decisão com **{selected_model}**...")
+            owner = jobs.owner_id(api_key)
+            title = ", ".join(f.name for f in files_doc)
+            st.session_state.validation_job = jobs.submit(
+                "caso_validacao", f"Auditoria — {title}", owner,
+                analyze_validation, *val_args, api_key, selected_model, force=force, trace=trace
+            )
+            st.session_state.decision_job = jobs.submit(
+                "caso_decisao", f"Minuta — {title}", owner,
+                generate_decision_text, *dec_args, api_key, selected_model, force=force,
+                trace=trace.branch("caso_decisao")
+            )
+            status.update(label="✅ Documentos preparados — geração em curso", state="complete")
+
+live_val, live_dec = st.columns(2)
+with live_val:
+    utils.job_monitor("validation_job", "validation_result")
+with live_dec:
+    utils.job_monitor("decision_job", "decision_result", render="text")
+
+# Área de Resultados (cada documento é mostrado mesmo que o outro tenha falhado)
+if st.session_state.validation_result or st.session_state.decision_result:
     st.divider()
-    st.success("Processo concluído com sucesso!")
+    if st.session_state.validation_result and st.session_state.decision_result:
+        st.success("Processo concluído com sucesso!")
+    elif not (st.session_state.get("validation_job") or st.session_state.get("decision_job")):
+        st.warning("Processo concluído parcialmente. Volte a processar para gerar o documento em falta.")
     
     col_res1, col_res2 = st.columns(2)
     
     with col_res1:
         st.subheader("📄 Relatório de Auditoria")
-        with st.expander("Ver Pré-visualização", expanded=False):
-            st.markdown(st.session_state.validation_result)
-        
-        f_val = create_doc_from_text(st.session_state.validation_result, "Relatório de Auditoria Técnica")
-        st.download_button(
-            "📥 Descarregar Auditoria (.docx)", 
-            f_val, 
-            "Auditoria_Caso_a_Caso.docx",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        )
+        if st.session_state.validation_result:
+            with st.expander("Ver Pré-visualização", expanded=False):
+                st.markdown(st.session_state.validation_result)
+            utils.timing_table("validation_result")
+            
+            f_val = caso_a_caso.create_doc_from_text(st.session_state.validation_result, caso_a_caso.VALIDATION_TITLE)
+            st.download_button(
+                "📥 Descarregar Auditoria (.docx)", 
+                f_val, 
+                "Auditoria_Caso_a_Caso.docx",
+                "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            )
+        elif not st.session_state.get("validation_job"):
+            st.error("Auditoria não gerada.")
     
     with col_res2:
         st.subheader("📝 Minuta de Decisão")
-        with st.expander("Ver Pré-visualização", expanded=False):
-            st.text(st.session_state.decision_result) # Usa text para monospaced
-            
-        f_dec = create_doc_from_text(st.session_state.decision_result, "Minuta de Decisão")
-        st.download_button(
-            "📥 Descarregar Decisão (.docx)", 
-            f_dec, 
-            "Decisao_Final.docx",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            type="primary"
-        )
+        if st.session_state.decision_result:
+            with st.expander("Ver Pré-visualização", expanded=False):
+                st.text(st.session_state.decision_result) # Usa text para monospaced
+            utils.timing_table("decision_result")
+                
+            f_dec = caso_a_caso.create_doc_from_text(st.session_state.decision_result, caso_a_caso.DECISION_TITLE)
+            st.download_button(
+                "📥 Descarregar Decisão (.docx)", 
+                f_dec, 
+                "Decisao_Final.docx",
+                "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                type="primary"
+            )
+        elif not st.session_state.get("decision_job"):
+            st.error("Minuta não gerada.")
     
     st.divider()
     if st.button("🔄 Limpar e Começar de Novo"):
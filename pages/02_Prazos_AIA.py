@@ -7,11 +7,12 @@ root_dir = os.path.dirname(current_dir)
 sys.path.insert(0, root_dir)
 import streamlit as st
 import pandas as pd
-from datetime import date, timedelta
+from datetime import date
 import plotly.express as px
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import tempfile
+import prazos
 
 st.set_page_config(page_title="Gestão de Prazos", page_icon="📅", layout="wide")
 
@@ -26,156 +27,9 @@ except ImportError:
     FPDF = None
 
 # ==========================================
-# 2. MOTOR DE FERIADOS (CÓDIGO COMPLETO)
+# 2. MOTOR DE PRAZOS (feriados, dias úteis e suspensões em prazos.py)
 # ==========================================
 
-def get_easter_date(year):
-    a = year % 19
-    b = year // 100
-    c = year % 100
-    d = b // 4
-    e = b % 4
-    f = (b + 8) // 25
-    g = (b - f + 1) // 3
-    h = (19 * a + b - d - g + 15) % 30
-    i = c // 4
-    k = c % 4
-    l = (32 + 2 * e + 2 * i - h - k) % 7
-    m = (a + 11 * h + 22 * l) // 451
-    month = (h + l - 7 * m + 114) // 31
-    day = ((h + l - 7 * m + 114) % 31) + 1
-    return date(year, month, day)
-
-def get_holidays_for_year(year):
-    holidays = set()
-    fixed_dates = [(1, 1), (4, 25), (5, 1), (6, 10), (8, 15), (10, 5), (11, 1), (12, 1), (12, 8), (12, 25)]
-    for m, d in fixed_dates:
-        holidays.add(date(year, m, d))
-    easter = get_easter_date(year)
-    holidays.add(easter - timedelta(days=2))
-    holidays.add(easter + timedelta(days=60))
-    return holidays
-
-def get_holidays_range(start_year, end_year):
-    all_holidays = set()
-    for y in range(start_year, end_year + 1):
-        all_holidays.update(get_holidays_for_year(y))
-    return all_holidays
-
-def is_business_day(check_date, holidays_set):
-    if check_date.weekday() >= 5: return False
-    if check_date in holidays_set: return False
-    return True
-
-def add_business_days(start_date, num_days, holidays_set):
-    current_date = start_date
-    added_days = 0
-    while added_days < num_days:
-        current_date += timedelta(days=1)
-        if is_business_day(current_date, holidays_set):
-            added_days += 1
-    return current_date
-
-def is_suspended(current_date, suspensions):
-    for s in suspensions:
-        if s['start'] <= current_date <= s['end']:
-            return True
-    return False
-
-def calculate_deadline_rigorous(start_date, target_business_days, suspensions, holidays_set, return_log=False):
-    current_date = start_date
-    days_counted = 0
-    log = []
-    if return_log:
-        log.append({"Data": current_date, "Dia Contado": 0, "Status": "Início"})
-    while days_counted < target_business_days:
-        current_date += timedelta(days=1)
-        status = "Util"
-        if is_suspended(current_date, suspensions):
-            status = "Suspenso"
-        elif current_date.weekday() >= 5:
-            status = "Fim de Semana"
-        elif current_date in holidays_set:
-            status = "Feriado"
-        if status == "Util":
-            days_counted += 1
-        if return_log:
-            log.append({"Data": current_date, "Dia Contado": days_counted if status == "Util" else "-", "Status": status})
-    final_date = current_date
-    while final_date.weekday() >= 5 or final_date in holidays_set:
-         final_date += timedelta(days=1)
-    if return_log:
-        return final_date, log
-    return final_date
-
-def calculate_workflow(start_date, suspensions, milestones_config, pea_date=None):
-    holidays_set = get_holidays_range(start_date.year, start_date.year + 2)
-    results = []
-    log_final = []
-    steps = [
-        ("Data Reunião", milestones_config["reuniao"]),
-        ("Limite Conformidade", milestones_config["conformidade"]),
-        ("Envio PTF à AAIA", milestones_config["ptf"]),
-        ("Audiência de Interessados", milestones_config["audiencia"]),
-        ("Emissão da DIA (Decisão Final)", milestones_config["dia"])
-    ]
-    conf_date_real = None 
-    for nome, dias in steps:
-        final_date = None
-        if nome == "Limite Conformidade" and pea_date and suspensions:
-            days_spent = 0
-            check_date = start_date + timedelta(days=1)
-            while check_date < pea_date:
-                if is_business_day(check_date, holidays_set):
-                    days_spent += 1
-                check_date += timedelta(days=1)
-            remaining_days = dias - days_spent
-            if remaining_days < 0: remaining_days = 0
-            last_susp_end = max([s['end'] for s in suspensions])
-            final_date = calculate_deadline_rigorous(last_susp_end, remaining_days, [], holidays_set)
-            conf_date_real = final_date
-        else:
-            if dias == milestones_config["dia"]: 
-                final_date, log_data = calculate_deadline_rigorous(start_date, dias, suspensions, holidays_set, return_log=True)
-                log_final = log_data
-            else:
-                final_date = calculate_deadline_rigorous(start_date, dias, suspensions, holidays_set)
-            if nome == "Limite Conformidade":
-                conf_date_real = final_date
-        results.append({
-            "Etapa": nome, 
-            "Prazo Legal": f"{dias} dias úteis", 
-            "Data Prevista": final_date
-        })
-
-    complementary = []
-    gantt_data = {}
-    if conf_date_real:
-        cp_duration = milestones_config.get("cp_duration", 30)
-        visit_days = milestones_config.get("visita", 15)
-        sectoral_days = milestones_config.get("setoriais", 75)
-        conf_date_theo = calculate_deadline_rigorous(start_date, milestones_config["conformidade"], [], holidays_set)
-        cp_start = add_business_days(conf_date_real, 5, holidays_set)
-        cp_end = add_business_days(cp_start, cp_duration, holidays_set)
-        external_ops = add_business_days(cp_start, 23, holidays_set)
-        cp_report = add_business_days(cp_end, 7, holidays_set)
-        visit_date = add_business_days(cp_start, visit_days, holidays_set)
-        sectoral_date = calculate_deadline_rigorous(start_date, sectoral_days, suspensions, holidays_set)
-        gantt_data = {"cp_start": cp_start, "cp_end": cp_end, "visit": visit_date, "sectoral": sectoral_date}
-        complementary = [
-            {"Etapa": "1. Conformidade (Ref. Teórica)", "Ref": "Sem suspensões", "Data": conf_date_theo},
-            {"Etapa": "1. Conformidade (Real)", "Ref": "Com suspensões", "Data": conf_date_real},
-            {"Etapa": "2. Início Consulta Pública", "Ref": "Conf + 5 dias", "Data": cp_start},
-            {"Etapa": "3. Fim Consulta Pública", "Ref": f"Início CP + {cp_duration} dias", "Data": cp_end},
-            {"Etapa": "4. Data Pareceres Externos", "Ref": "Início CP + 23 dias", "Data": external_ops},
-            {"Etapa": "5. Envio Relatório CP", "Ref": "Fim CP + 7 dias", "Data": cp_report},
-            {"Etapa": "6. Visita Técnica", "Ref": f"Início CP + {visit_days} dias", "Data": visit_date},
-            {"Etapa": "7. Pareceres Setoriais", "Ref": f"Dia {sectoral_days} Global", "Data": sectoral_date},
-        ]
-
-    total_susp = sum([(s['end'] - s['start']).days + 1 for s in suspensions])
-    return results, complementary, total_susp, log_final, gantt_data
-
 def create_pdf(project_name, typology, sector, regime, start_date, milestones, complementary, suspensions, total_susp, gantt_data):
     if FPDF is None: return None
     class PDF(FPDF):
@@ -326,6 +180,9 @@ with st.sidebar:
         d_cp_duration = st.number_input("CP Duração", 30)
         d_visita = st.number_input("Visita", 15)
         pea_date = st.date_input("Data PEA", value=None)
+        region = st.selectbox("Feriados regionais", list(prazos.REGIONAL_HOLIDAYS))
+        municipality = st.selectbox("Feriado municipal", [prazos.NO_MUNICIPALITY, *prazos.MUNICIPAL_HOLIDAYS])
+        holidays = prazos.holiday_calendar(region, municipality)
         
         milestones_config = {
             "reuniao": d_reuniao, "conformidade": d_conf, "ptf": d_ptf,
@@ -341,8 +198,11 @@ with st.sidebar:
         new_start = c1.date_input("Início")
         new_end = c2.date_input("Fim")
         if st.form_submit_button("Adicionar"):
-            st.session_state.suspensions_universal.append({'start': new_start, 'end': new_end})
-            st.rerun()
+            if new_end < new_start:
+                st.error("A data de fim da suspensão é anterior à de início.")
+            else:
+                st.session_state.suspensions_universal.append({'start': new_start, 'end': new_end})
+                st.rerun()
     
     for i, s in enumerate(st.session_state.suspensions_universal):
         st.text(f"{s['start']} a {s['end']}")
@@ -350,42 +210,71 @@ with st.sidebar:
             del st.session_state.suspensions_universal[i]
             st.rerun()
 
-milestones, complementary, total_susp, log_dia, gantt_data = calculate_workflow(
-    start_date, st.session_state.suspensions_universal, milestones_config, pea_date=pea_date
+def build_views(milestones, complementary, suspensions):
+    """Tabelas e Gantt do resultado (refeitos só quando as entradas mudam)."""
+    df_main = pd.DataFrame(milestones)
+    df_main["Data Prevista"] = pd.to_datetime(df_main["Data Prevista"]).dt.strftime("%d-%m-%Y")
+    df_comp = None
+    if complementary:
+        df_comp = pd.DataFrame(complementary)
+        df_comp["Data"] = pd.to_datetime(df_comp["Data"]).dt.strftime("%d-%m-%Y")
+
+    data_gantt = []
+    last = start_date
+    for m in milestones:
+        end = m["Data Prevista"]
+        start = last if last < end else end
+        data_gantt.append(dict(Task=m["Etapa"], Start=start, Finish=end, Resource="Fase Principal"))
+        last = end
+    for s in suspensions:
+        data_gantt.append(dict(Task="Suspensão", Start=s['start'], Finish=s['end'], Resource="Suspensão"))
+    fig = px.timeline(pd.DataFrame(data_gantt), x_start="Start", x_end="Finish", y="Task", color="Resource")
+    return df_main, df_comp, fig
+
+# Resultado memorizado em prazos.py; tabelas e figura memorizadas na sessão pelo mesmo snapshot
+try:
+    milestones, complementary, total_susp, log_dia, gantt_data = prazos.calculate_workflow(
+        start_date, st.session_state.suspensions_universal, milestones_config, pea_date=pea_date, holidays=holidays
+    )
+except ValueError as e:
+    # Períodos invertidos: remover na lista da barra lateral
+    st.error(str(e))
+    st.stop()
+views_key = (
+    prazos.workflow_key(start_date, st.session_state.suspensions_universal, milestones_config, pea_date, holidays),
+    tuple((s['start'], s['end']) for s in st.session_state.suspensions_universal),
 )
+views = st.session_state.get("prazos_views")
+if views is None or views[0] != views_key:
+    views = st.session_state.prazos_views = (views_key, build_views(milestones, complementary, st.session_state.suspensions_universal))
+df_main, df_comp, fig = views[1]
 
 final_dia_date = milestones[-1]["Data Prevista"]
 st.divider()
 c1, c2, c3, c4 = st.columns(4)
 c1.metric("Regime", f"{regime_option} Dias")
 c2.metric("Início", start_date.strftime("%d/%m/%Y"))
-c3.metric("Suspensões", f"{total_susp} dias")
+susp_business = prazos.suspension_index(st.session_state.suspensions_universal).business_days(
+    start_date, final_dia_date, holidays
+)
+c3.metric("Suspensões", f"{total_susp} dias", help=f"{susp_business} dias úteis suspensos até à DIA (períodos sobrepostos contam uma vez)")
 c4.metric("Previsão DIA", final_dia_date.strftime("%d/%m/%Y"))
 
-tab1, tab2, tab3 = st.tabs(["📋 Prazos", "📅 Gantt", "📄 PDF"])
+tab1, tab2, tab3, tab4 = st.tabs(["📋 Prazos", "📅 Gantt", "📄 PDF", "🗂️ Carteira"])
 
 with tab1:
-    df_main = pd.DataFrame(milestones)
-    df_main["Data Prevista"] = pd.to_datetime(df_main["Data Prevista"]).dt.strftime("%d-%m-%Y")
     st.dataframe(df_main, use_container_width=True)
-    if complementary:
+    if df_comp is not None:
         st.write("Prazos Complementares")
-        df_comp = pd.DataFrame(complementary)
-        df_comp["Data"] = pd.to_datetime(df_comp["Data"]).dt.strftime("%d-%m-%Y")
         st.dataframe(df_comp, use_container_width=True)
+    # O registo dia a dia só é calculado com o expander aberto
+    audit = st.expander("Registo de contagem da DIA (dia a dia)", key="prazos_log_dia", on_change="rerun")
+    if audit.open and log_dia:
+        df_log = pd.DataFrame(list(log_dia))
+        df_log["Dia Contado"] = df_log["Dia Contado"].astype(str)
+        audit.dataframe(df_log, use_container_width=True, hide_index=True)
 
 with tab2:
-    data_gantt = []
-    last = start_date
-    for m in milestones:
-        end = m["Data Prevista"]
-        start = last if last < end else end
-        data_gantt.append(dict(Task=m["Etapa"], Start=start, Finish=end, Resource="Fase Principal"))
-        last = end
-    for s in st.session_state.suspensions_universal:
-        data_gantt.append(dict(Task="Suspensão", Start=s['start'], Finish=s['end'], Resource="Suspensão"))
-        
-    fig = px.timeline(pd.DataFrame(data_gantt), x_start="Start", x_end="Finish", y="Task", color="Resource")
     st.plotly_chart(fig, use_container_width=True)
 
 with tab3:
@@ -399,3 +288,32 @@ with tab3:
 
             st.download_button("Descarregar PDF", pdf_bytes, "relatorio_aia.pdf", "application/pdf")
 
+with tab4:
+    st.caption("Prazos de vários processos de uma vez, a partir de um CSV (uma linha por processo). "
+               "Os processos sem região/município usam os feriados escolhidos em Definições Avançadas.")
+    with st.expander("Colunas do CSV"):
+        st.table(pd.DataFrame(
+            [{"Coluna": k, "Descrição": v, "Obrigatória": "Sim" if k in prazos.PORTFOLIO_REQUIRED else ""}
+             for k, v in prazos.PORTFOLIO_COLUMNS.items()]
+        ))
+        st.download_button("Descarregar modelo", prazos.portfolio_template().to_csv(index=False).encode("utf-8-sig"),
+                           "carteira_aia.csv", "text/csv")
+    portfolio_file = st.file_uploader("Carteira de processos (CSV)", type=["csv"])
+    if portfolio_file:
+        try:
+            df_portfolio = prazos.portfolio_deadlines(prazos.read_portfolio(portfolio_file), holidays, today=date.today())
+        except ValueError as e:
+            st.error(f"Erro na carteira: {e}")
+        else:
+            horizon = st.slider("A vencer nos próximos (dias)", 0, 180, 30)
+            due = df_portfolio[df_portfolio[prazos.NEXT_DAYS].le(horizon).fillna(False)]
+            due = due.sort_values(prazos.NEXT_DAYS)
+            st.metric("Processos com prazo a vencer", f"{len(due)} de {len(df_portfolio)}")
+            st.dataframe(
+                due[["Processo", "Regime", prazos.NEXT_LABEL, prazos.NEXT_DATE, prazos.NEXT_DAYS]],
+                use_container_width=True, hide_index=True
+            )
+            with st.expander("Todos os prazos"):
+                st.dataframe(df_portfolio, use_container_width=True, hide_index=True)
+            st.download_button("Exportar CSV", df_portfolio.to_csv(index=False, date_format="%d-%m-%Y").encode("utf-8-sig"),
+                               "prazos_carteira.csv", "text/csv")
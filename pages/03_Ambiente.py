@@ -1,15 +1,6 @@
 import sys
 import os
-import re
 import streamlit as st
-import google.generativeai as genai
-from pypdf import PdfReader
-from docx import Document
-from docx.shared import Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from io import BytesIO
-from duckduckgo_search import DDGS
-import time
 
 # --- 1. CONFIGURAÇÃO DE CAMINHOS ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -18,6 +9,12 @@ sys.path.insert(0, root_dir)
 
 try:
     import utils
+    import jobs
+    import model_catalog
+    import text_cleanup
+    import ambiente
+    import telemetry
+    import prefetch
     try:
         import legislacao
     except ImportError:
@@ -48,185 +45,20 @@ if not api_key:
 # --- 4. FUNÇÕES ---
 # ==========================================
 
-def get_available_models(key):
-    try:
-        genai.configure(api_key=key)
-        models = genai.list_models()
-        return [m.name for m in models if 'generateContent' in m.supported_generation_methods]
-    except:
-        return ["models/gemini-2.0-flash", "models/gemini-1.5-flash"]
-
-def get_pdf_text_with_pages(pdf_file, simple_citation=False):
-    text = ""
-    try:
-        reader = PdfReader(pdf_file)
-        doc_name = pdf_file.name
-        
-        text += f"\n\n=== DOCUMENTO FONTE: {doc_name} ===\n"
-        for i, page in enumerate(reader.pages):
-            content = page.extract_text() or "[Página em branco/imagem]"
-            citation = f"[PÁG. {i+1}]" if simple_citation else f"[DOC: {doc_name} | PÁG. {i+1}]"
-            text += f"\n{citation}\n{content}\n"
-        text += f"=== FIM DE: {doc_name} ===\n"
-    except Exception as e:
-        st.error(f"Erro ao ler PDF {pdf_file.name}: {e}")
-    return text
-
-def search_online(query):
-    if not query: return ""
-    results_text = ""
-    try:
-        with DDGS() as ddgs:
-            results = list(ddgs.text(f"{query} legislação portugal ecologia", max_results=3))
-        for r in results:
-            results_text += f"\n>>> FONTE EXTERNA (WEB): {r['title']} ({r['href']}) <<<\n{r['body']}\n"
-        return results_text
-    except Exception as e:
-        return f"Erro na pesquisa web: {str(e)}"
-
-def format_paragraph(paragraph, text):
-    """
-    Processa o texto para o Word com robustez:
-    Detecta **Negrito** e [Citações] e aplica estilos corretos.
-    """
-    # Regex divide o texto em: Texto Normal | **Negrito** | Texto Normal
-    parts = re.split(r'(\*\*.*?\*\*)', text)
-    
-    for part in parts:
-        # Se for um bloco de negrito markdown (**texto**)
-        if part.startswith('**') and part.endswith('**'):
-            clean_text = part.replace('**', '')
-            run = paragraph.add_run(clean_text)
-            run.bold = True
-        else:
-            # Se for texto normal, processamos as citações dentro dele
-            citation_parts = re.split(r'(\[.*?PÁG.*?\])', part)
-            for sub_part in citation_parts:
-                run = paragraph.add_run(sub_part)
-                # Formatação da citação
-                if "[" in sub_part and "PÁG" in sub_part and "]" in sub_part:
-                    run.font.size = Pt(9)
-                    run.font.color.rgb = RGBColor(80, 80, 80) # Cinza escuro
-                    run.bold = True
-
-def create_docx(text):
-    """Gera DOCX com parsing avançado via Regex."""
-    doc = Document()
-    
-    title = doc.add_heading('Parecer Técnico de Auditoria Ambiental', 0)
-    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    
-    p_date = doc.add_paragraph(f"Data da Emissão: {time.strftime('%d/%m/%Y')}")
-    p_date.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    doc.add_paragraph("---")
-    
-    # Regex para capturar cabeçalhos (#, ##, ###, ####)
-    # Captura os cardinal e o texto separadamente
-    re_header = re.compile(r'^(#{1,6})\s+(.*)')
-    
-    for line in text.split('\n'):
-        line = line.strip()
-        if not line: continue
-        
-        # 1. TÍTULOS (Detecção via Regex)
-        header_match = re_header.match(line)
-        if header_match:
-            hashes, content = header_match.groups()
-            level = len(hashes)
-            # Remove formatação markdown do título para o índice do Word ficar limpo
-            clean_title = content.replace('**', '')
-            
-            if level == 1:
-                h = doc.add_heading(clean_title, level=1)
-                h.style.font.color.rgb = RGBColor(0, 50, 100)
-            elif level == 2:
-                doc.add_heading(clean_title, level=2)
-            else:
-                # Níveis 3, 4, etc.
-                doc.add_heading(clean_title, level=min(level, 3))
-            continue
-
-        # 2. LISTAS
-        if line.startswith('- ') or line.startswith('* '): 
-            clean_line = line[2:] 
-            p = doc.add_paragraph(style='List Bullet')
-            p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-            format_paragraph(p, clean_line)
-            continue
-            
-        # 3. CITAÇÕES / INDICADORES (Blocos >)
-        if line.startswith('>'): 
-            # Usa estilo 'Intense Quote' ou 'Normal' com itálico se preferir
-            p = doc.add_paragraph(style='Intense Quote') 
-            clean_line = line.replace('>', '').strip()
-            format_paragraph(p, clean_line) 
-            p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-            continue
-            
-        # 4. TEXTO NORMAL
-        p = doc.add_paragraph()
-        p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-        format_paragraph(p, line) 
-            
-    b = BytesIO()
-    doc.save(b)
-    b.seek(0)
-    return b
+# Corpus, prompt e Word em ambiente.py
 
-def run_analysis(target_text, lib_ctx, manual_ctx, web_ctx, key, model_name):
-    genai.configure(api_key=key)
-    model = genai.GenerativeModel(model_name)
-    
-    prompt = f"""
-    Atua como **Auditor Ambiental Sénior e Investigador Académico**.
-    
-    ⚠️ RESTRIÇÃO DE PERSONA:
-    Nunca utilizes o termo "Analista". Utiliza "O Auditor", "Este Parecer" ou discurso impessoal ("Verifica-se").
-    
-    === CONTEXTO LEGAL ===
-    {lib_ctx}
-    
-    === ANEXOS TÉCNICOS ===
-    {manual_ctx}
-    
-    === PESQUISA ===
-    {web_ctx}
-    
-    === DOCUMENTO EM ANÁLISE ===
-    {target_text}
-    
-    TAREFA:
-    Elaborar um **Parecer Técnico de Auditoria** com elevado rigor científico.
-    
-    ESTRUTURA OBRIGATÓRIA:
-    
-    ## 1. Enquadramento e Maturidade
-    
-    ## 2. Conformidade Legal e Normativa
-    
-    ## 3. Análise de Indicadores e Monitorização (KPIs)
-    (Se existirem indicadores, usa ESTRITAMENTE este formato para CADA um):
-    
-    #### [Nome do Indicador]
-    > **Descrição e Objetivo:** [Texto explicativo...] [CITAR].
-    > **Meta e Baseline:** [Texto com dados...] [CITAR].
-    > **Análise Crítica:** [Texto analítico...] [CITAR].
-    
-    ## 4. Riscos Críticos e Lacunas
-    
-    ## 5. Conclusões e Recomendações Técnicas
-    """
-    
-    try:
-        return model.generate_content(prompt, request_options={"timeout": 600}).text
-    except Exception as e:
-        return f"Erro na análise: {e}"
+def run_analysis(job, target_text, lib_ctx, manual_ctx, web_ctx, key, model_name, force=False):
+    """Trabalho em segundo plano: elabora o parecer (sem chamadas ao Streamlit)."""
+    prompt = ambiente.report_prompt(target_text, lib_ctx, manual_ctx, web_ctx)
+    return jobs.run_generation(job, key, model_name, prompt, request_options={"timeout": 600}, force=force)
 
 # ==========================================
 # --- 5. INTERFACE ---
 # ==========================================
 
 if 'uploader_key' not in st.session_state: st.session_state.uploader_key = 0
+if 'parecer_result' not in st.session_state: st.session_state.parecer_result = None
+utils.recent_jobs("ambiente", "parecer_job", "parecer_result")
 
 # --- BARRA LATERAL ---
 with st.sidebar:
@@ -236,17 +68,8 @@ with st.sidebar:
         pass
     st.divider()
     st.markdown("### 🧠 Motor de Inferência")
-    opcoes_modelos = get_available_models(api_key)
-    
-    idx_padrao = 0
-    targets = ["2.5-flash", "2.0-flash", "1.5-flash", "pro"]
-    for t in targets:
-        for i, m in enumerate(opcoes_modelos):
-            if t in m.lower():
-                idx_padrao = i
-                break
-        else: continue
-        break
+    opcoes_modelos = model_catalog.available_models(api_key)
+    idx_padrao = model_catalog.default_index(opcoes_modelos, model_catalog.FLASH_THEN_PRO)
             
     selected_model = st.selectbox("Modelo:", opcoes_modelos, index=idx_padrao)
 
@@ -276,37 +99,66 @@ with col_extra:
     f_extra = st.file_uploader("Anexos/Legislação (PDF)", type="pdf", accept_multiple_files=True, key=f"extra_{st.session_state.uploader_key}")
     web_q = st.text_input("Pesquisa Bibliográfica/Web", help="Ex: 'Regulamento UE 2024/1991 artigo 12'")
 
+# A extração começa logo após o upload (em segundo plano, pelo hash do conteúdo)
+all_files = [f_main, *(f_extra or [])]
+prefetch.extract(all_files)
+
 if st.button("⚖️ EMITIR PARECER TÉCNICO", type="primary", use_container_width=True):
     if not f_main:
         st.warning("⚠️ É necessário submeter o documento principal.")
     else:
         with st.status("⚙️ A processar auditoria académica...", expanded=True):
             
-            has_extras = True if f_extra else False
             st.write("📖 A analisar corpus documental...")
+            trace = telemetry.Trace("ambiente")
+            with trace.stage("extração") as stage:
+                prefetch.wait(prefetch.digests(all_files))
+                
+                cleaners = []
+                on_error = lambda f, e: st.error(f"Erro ao ler PDF {f.name}: {e}")
+                # Uma só passagem, em simultâneo; a lista vem alinhada com all_files
+                doc_main, *docs_extra = ambiente.load_documents(all_files, cleaners, on_error)
+                docs_extra = [d for d in docs_extra if d]
+                stage.add(**telemetry.doc_stats([doc_main, *docs_extra]))
+            st.write(text_cleanup.summary(cleaners))
             
-            txt_main = get_pdf_text_with_pages(f_main, simple_citation=not has_extras)
-            
-            txt_extra = ""
-            if f_extra:
-                for f in f_extra: 
-                    txt_extra += get_pdf_text_with_pages(f, simple_citation=False) + "\n"
+            with trace.stage("contexto"):
+                txt_main, txt_extra, focused = ambiente.corpus_texts(doc_main, docs_extra, web_q)
+            if focused:
+                # Corpus extenso: só as páginas mais relevantes para cada secção do parecer
+                st.write("🔎 Corpus extenso: a selecionar as páginas relevantes por secção...")
             
             txt_web = ""
             if web_q:
                 st.write("🌍 A consultar fontes externas...")
-                txt_web = search_online(web_q)
+                with trace.stage("pesquisa web"):
+                    txt_web = ambiente.search_online(web_q)
             
+            # O parecer é elaborado em segundo plano (sobrevive a reruns e mudanças de página)
             st.write(f"🧠 A elaborar parecer com **{selected_model}**...")
-            res = run_analysis(txt_main, lib_context, txt_extra, txt_web, api_key, selected_model)
-            
-            st.success("Parecer emitido com sucesso.")
-            st.markdown("### 📝 Parecer Técnico")
-            st.markdown(res)
-            
-            st.download_button(
-                "📥 Descarregar Parecer (DOCX)", 
-                create_docx(res), 
-                "Parecer_Tecnico_Ambiental.docx",
-                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            st.session_state.parecer_result = None
+            st.session_state.parecer_job = jobs.submit(
+                "ambiente",
+                f"Parecer — {f_main.name}",
+                jobs.owner_id(api_key),
+                run_analysis,
+                txt_main, lib_context, txt_extra, txt_web, api_key, selected_model,
+                force=st.session_state.get("force_regenerate", False),
+                trace=trace,
             )
+
+utils.job_monitor("parecer_job", "parecer_result")
+
+# --- RESULTADO ---
+if st.session_state.parecer_result:
+    res = st.session_state.parecer_result
+    st.markdown("### 📝 Parecer Técnico")
+    st.markdown(res)
+    utils.timing_table("parecer_result")
+    
+    st.download_button(
+        "📥 Descarregar Parecer (DOCX)", 
+        ambiente.create_docx(res), 
+        "Parecer_Tecnico_Ambiental.docx",
+        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    )
@@ -1,8 +1,5 @@
 import sys
 import os
-import re
-import time
-from io import BytesIO
 
 # --- 1. CONFIGURAÇÃO DE CAMINHOS ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -10,11 +7,13 @@ root_dir = os.path.dirname(current_dir)
 sys.path.insert(0, root_dir)
 
 import utils
+import text_cleanup
 import streamlit as st
-import google.generativeai as genai
-import pypdf
-from docx import Document
-from docx.shared import Pt, RGBColor
+import jobs
+import model_catalog
+import ainca
+import telemetry
+import prefetch
 
 # --- 2. CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(
@@ -44,130 +43,13 @@ if not api_key:
     st.stop()
 
 # ==========================================
-# --- 5. BASE DE CONHECIMENTO SETORIAL ---
+# --- 5. FUNÇÕES ---
 # ==========================================
-SECTOR_GUIDES = {
-    "Geral / Outros": "Guia da Comissão Europeia (2011) - Avaliação de planos e projetos.",
-    "Infraestruturas Lineares (Estradas)": "Manual de apoio ICNB (2008) e Guia APA (2009) para Infraestruturas Rodoviárias.",
-    "Linhas Elétricas (Transporte >110kV)": "Manual CIBIO/ICNF/REN (2020) - Muito Alta Tensão e Avifauna. Atenção a Áreas Críticas.",
-    "Linhas Elétricas (Distribuição <110kV)": "Manual ICNB (2008) - Linhas de Distribuição e Avifauna.",
-    "Parques Eólicos": "Guias ICNB (2008) para Morcegos e APA (2009) para Parques Eólicos.",
-    "ETAR / Hidráulica": "Guia APA (2008) para ETARs.",
-    "Indústria Extrativa": "Guia CCDR-LVT (2008) para Minas e Pedreiras."
-}
+# Guias setoriais, prompt e Word em ainca.py (partilhados com o processamento em lote)
 
-# ==========================================
-# --- FUNÇÕES ---
-# ==========================================
-
-def get_available_models(key):
-    """Lista modelos disponíveis na API."""
-    try:
-        genai.configure(api_key=key)
-        models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
-        return models
-    except:
-        # Fallback genérico se a API falhar a listagem
-        return ["models/gemini-2.0-flash", "models/gemini-1.5-flash", "models/gemini-1.5-pro"]
-
-def get_text_with_page_markers(file_list):
-    """
-    Extrai texto inserindo marcadores de página explícitos.
-    Isso permite à IA citar: 'Conforme Pág. 12 do ficheiro X'.
-    """
-    combined_text = ""
-    file_names = []
-    if not file_list: return None, None
-
-    for uploaded_file in file_list:
-        try:
-            reader = pypdf.PdfReader(uploaded_file)
-            doc_name = uploaded_file.name
-            
-            combined_text += f"\n\n=== INÍCIO DO DOCUMENTO: {doc_name} ===\n"
-            
-            for i, page in enumerate(reader.pages):
-                content = page.extract_text() or "[Página em branco ou imagem]"
-                # INJEÇÃO DE METADADOS PARA A IA LER
-                combined_text += f"\n[DOC: {doc_name} | PÁG. {i+1}]\n{content}\n"
-            
-            combined_text += f"=== FIM DO DOCUMENTO: {doc_name} ===\n"
-            file_names.append(doc_name)
-            
-        except Exception as e:
-            st.error(f"Erro a ler {uploaded_file.name}: {e}")
-            
-    return combined_text, file_names
-
-def create_word_docx(text, p_files, l_files, tipologia):
-    """Gera Word com formatação profissional."""
-    doc = Document()
-    
-    # Estilo do Título
-    title = doc.add_heading('Parecer Técnico AIncA Fundamentado', 0)
-    title.alignment = 1 # Center
-    
-    # Metadados
-    p = doc.add_paragraph()
-    runner = p.add_run(f"Tipologia: {tipologia}\n")
-    runner.bold = True
-    p.add_run(f"Data da Análise: {time.strftime('%d/%m/%Y')}\n")
-    p.add_run(f"Documentos Analisados: {', '.join(p_files) if p_files else 'N/A'}")
-    
-    doc.add_paragraph("---")
-    
-    # Processamento do Markdown para Word
-    for line in text.split('\n'):
-        line = line.strip()
-        if not line: continue
-        
-        if line.startswith('## '): 
-            h = doc.add_heading(line.replace('##', '').strip(), 1)
-            h.style.font.color.rgb = RGBColor(0, 51, 102) # Azul escuro
-            
-        elif line.startswith('### '): 
-            h = doc.add_heading(line.replace('###', '').strip(), 2)
-            
-        elif line.startswith('- ') or line.startswith('* '): 
-            p = doc.add_paragraph(style='List Bullet')
-            # Tenta detetar citações [Doc X, Pag Y] e pôr a negrito
-            parts = re.split(r'(\[.*?Pág.*?\])', line[2:], flags=re.IGNORECASE)
-            for part in parts:
-                run = p.add_run(part)
-                if "[" in part and "Pág" in part:
-                    run.bold = True
-                    run.font.size = Pt(9)
-                    run.font.color.rgb = RGBColor(80, 80, 80) # Cinza escuro
-                    
-        elif line.startswith('>'): # Citações transcritas
-            p = doc.add_paragraph(style='Intense Quote')
-            p.add_run(line.replace('>', '').strip()).italic = True
-            
-        else: 
-            doc.add_paragraph(line)
-        
-    buffer = BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
-
-def generate_with_retry(model, prompt, max_retries=3):
-    """Tenta gerar com gestão automática de erros de cota (429)."""
-    wait_time = 15 
-    for attempt in range(max_retries):
-        try:
-            return model.generate_content(prompt, request_options={"timeout": 600})
-        except Exception as e:
-            error_msg = str(e)
-            if "429" in error_msg or "quota" in error_msg.lower():
-                if attempt < max_retries - 1:
-                    st.warning(f"⚠️ Cota momentânea atingida ({model.model_name}). Aguarde {wait_time}s para nova tentativa automática...")
-                    time.sleep(wait_time)
-                    wait_time += 15
-                else:
-                    raise e
-            else:
-                raise e
+def load_documents(groups, cleaners):
+    """Extrai os PDFs carregados (por grupo, numa só passagem) para Documents, já sem cabeçalhos/rodapés repetidos."""
+    return ainca.load_document_groups(groups, cleaners, on_error=lambda f, e: st.error(f"Erro a ler {f.name}: {e}"))
 
 # ==========================================
 # --- INTERFACE ---
@@ -178,21 +60,10 @@ with st.sidebar:
     st.divider()
     st.markdown("### 🧠 Motor de IA")
     
-    opcoes_modelos = get_available_models(api_key)
+    opcoes_modelos = model_catalog.available_models(api_key)
     
-    # --- LÓGICA DE PRIORIDADE REFORÇADA ---
     # Ordem de preferência: 2.5 Flash -> 2.0 Flash -> 1.5 Flash -> Qualquer Flash -> Outros
-    priority_targets = ["2.5-flash", "2.0-flash", "1.5-flash", "flash"]
-    idx_padrao = 0
-    found = False
-    
-    for target in priority_targets:
-        for i, m in enumerate(opcoes_modelos):
-            if target in m.lower():
-                idx_padrao = i
-                found = True
-                break
-        if found: break
+    idx_padrao = model_catalog.default_index(opcoes_modelos, model_catalog.FLASH_FIRST)
             
     selected_model = st.selectbox(
         "Modelo:", 
@@ -203,8 +74,8 @@ with st.sidebar:
     
     st.divider()
     st.header("Contexto Setorial")
-    selected_sector = st.selectbox("Setor:", list(SECTOR_GUIDES.keys()))
-    st.info(f"📚 {SECTOR_GUIDES[selected_sector]}")
+    selected_sector = st.selectbox("Setor:", list(ainca.SECTOR_GUIDES.keys()))
+    st.info(f"📚 {ainca.SECTOR_GUIDES[selected_sector]}")
 
 # --- B. UPLOADS ---
 col1, col2 = st.columns(2)
@@ -213,7 +84,15 @@ with col1:
 with col2:
     files_l = st.file_uploader("2. Cartografia/Anexos (Opcional)", type=["pdf"], accept_multiple_files=True)
 
+# A extração começa logo após o upload (em segundo plano, pelo hash do conteúdo)
+all_files = [*(files_p or []), *(files_l or [])]
+prefetch.extract(all_files)
+
 # --- C. AÇÃO ---
+if 'ainca_result' not in st.session_state: st.session_state.ainca_result = None
+if 'ainca_meta' not in st.session_state: st.session_state.ainca_meta = {}
+utils.recent_jobs("ainca", "ainca_job", "ainca_result", "ainca_meta")
+
 if st.button("🚀 Gerar Relatório Fundamentado", type="primary", use_container_width=True):
     if not files_p:
         st.error("⚠️ Carregue os ficheiros do projeto.")
@@ -222,83 +101,57 @@ if st.button("🚀 Gerar Relatório Fundamentado", type="primary", use_container
             
             # 1. Leitura com Mapeamento de Páginas
             status.write("📖 A indexar páginas e documentos...")
-            text_p, names_p = get_text_with_page_markers(files_p)
-            text_l, names_l = get_text_with_page_markers(files_l)
-            
-            # 2. Configuração
-            genai.configure(api_key=api_key)
-            status.write(f"🤖 A analisar com **{selected_model}**...")
-            model = genai.GenerativeModel(selected_model)
-            
-            guia_especifico = SECTOR_GUIDES[selected_sector]
-            
-            # 3. Prompt de Auditoria Rigorosa
-            prompt = f"""
-            Atua como Perito Sénior em Avaliação Ambiental (Especialista AIncA e Rede Natura 2000).
-            A tua tarefa é produzir um RELATÓRIO TÉCNICO DE FUNDAMENTAÇÃO.
-
-            === REGRAS DE OURO (OBRIGATÓRIAS) ===
-            1. **CITAÇÃO DE FACTOS:** Qualquer afirmação sobre o projeto (distâncias, áreas, características) DEVE ter a fonte exata.
-               Formato obrigatório: "O projeto ocupa 2ha..." [DOC: NomeDoFicheiro | PÁG. X].
-            2. **TRANSCRIÇÃO:** Sempre que possível, transcreve pequenas frases do documento original entre aspas para provar o ponto.
-               Ex: Como refere o promotor: "...não se preveem afetações..." [DOC: X | PÁG. Y].
-            3. **FUNDAMENTAÇÃO LEGAL:** Cita sempre o artigo da lei aplicável (DL 140/99).
-
-            === CONTEXTO TÉCNICO ===
-            Setor: {selected_sector}
-            Guia de Referência: {guia_especifico}
-            
-            === DADOS DO PROJETO (COM MARCADORES DE PÁGINA) ===
-            {text_p}
-            {text_l}
-            
-            === ESTRUTURA DO RELATÓRIO ===
-            
-            ## 1. DADOS DE IDENTIFICAÇÃO E ENQUADRAMENTO
-            (Identifica o Promotor, Localização e Resumo do Projeto com base nos documentos. Cita a página da Memória Descritiva).
-            
-            ## 2. TRIAGEM JURÍDICA (SCREENING)
-            - **Gestão do Sítio:** O projeto é para gestão da ZEC/ZPE? (Cita onde leste isto).
-            - **Concorrência com AIA:** Verifica se o projeto cai nos Anexos do DL 151-B/2013. Se sim, conclui que a AIncA é integrada na AIA.
-            - **Afetação Significativa:** Distância à Rede Natura 2000 mais próxima. Há sobreposição? [Cita Pág.]
-            
-            ## 3. ANÁLISE DE INCIDÊNCIAS (FACTOS E EVIDÊNCIAS)
-            (Aqui deves usar as citações de página intensivamente).
-            - Descritor Fauna/Flora: O que diz o projeto? [Cita Pág.]
-            - Impactos na Integridade: O que diz o estudo de incidências? [Cita Pág.]
-            - Cumprimento do Guia Setorial ({selected_sector}).
-            
-            ## 4. EVIDÊNCIAS TRANSCRITAS
-            (Lista 3 a 5 frases chave copiadas ipsis verbis dos documentos que suportam a tua decisão).
-            
-            ## 5. CONCLUSÃO E PARECER TÉCNICO
-            - O projeto carece de AIncA aprofundada?
-            - Está dispensado?
-            - Que medidas de mitigação são essenciais?
-            """
-
-            try:
-                # 4. Geração
-                response = generate_with_retry(model, prompt)
-                
-                status.update(label="✅ Relatório Gerado", state="complete")
-                
-                # Visualização
-                st.markdown("### 🦅 Relatório Técnico Fundamentado")
-                st.markdown(response.text)
-                
-                # Download
-                doc = create_word_docx(response.text, names_p, names_l, selected_sector)
-                st.download_button(
-                    "📥 Descarregar Relatório (Word)", 
-                    doc, 
-                    "Relatorio_AIncA_Fundamentado.docx", 
-                    "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                )
-                
-            except Exception as e:
-                status.update(label="❌ Erro", state="error")
-                if "429" in str(e):
-                    st.error(f"Cota excedida no modelo {selected_model}. Tente novamente em 1 minuto.")
-                else:
-                    st.error(f"Erro: {e}")
+            trace = telemetry.Trace("ainca")
+            with trace.stage("extração") as stage:
+                prefetch.wait(prefetch.digests(all_files))
+                cleaners = []
+                docs_p, docs_l = load_documents([files_p, files_l], cleaners)
+                stage.add(**telemetry.doc_stats(docs_p + docs_l))
+            status.write(text_cleanup.summary(cleaners))
+            names_p = [d.name for d in docs_p]
+            names_l = [d.name for d in docs_l]
+            
+            with trace.stage("contexto"):
+                text_p, text_l, focused = ainca.project_texts(docs_p, docs_l, selected_sector)
+            if focused:
+                # Processo extenso: só as páginas mais relevantes para cada secção
+                status.write("🔎 Processo extenso: a selecionar as páginas relevantes por secção...")
+            
+            # 2. Configuração e prompt de auditoria rigorosa
+            status.write(f"🤖 A preparar a análise com **{selected_model}**...")
+            prompt = ainca.report_prompt(selected_sector, text_p, text_l)
+
+            # 4. Geração em segundo plano (sobrevive a reruns e mudanças de página);
+            # quotas (429) tratadas pelo limitador partilhado de gemini_client
+            st.session_state.ainca_result = None
+            st.session_state.ainca_job = jobs.submit(
+                "ainca",
+                f"{selected_sector} — {', '.join(names_p)}",
+                jobs.owner_id(api_key),
+                jobs.run_generation,
+                api_key, selected_model, prompt,
+                request_options={"timeout": 600},
+                force=st.session_state.get("force_regenerate", False),
+                meta={"files": [names_p, names_l, selected_sector]},
+                trace=trace,
+            )
+            status.update(label="✅ Documentos preparados — relatório em geração", state="complete")
+
+utils.job_monitor("ainca_job", "ainca_result", "ainca_meta")
+
+# --- D. RESULTADO ---
+if st.session_state.ainca_result:
+    # Visualização
+    st.markdown("### 🦅 Relatório Técnico Fundamentado")
+    st.markdown(st.session_state.ainca_result)
+    utils.timing_table("ainca_result")
+    
+    # Download
+    names_p, names_l, sector = st.session_state.ainca_meta.get("files", ([], [], selected_sector))
+    doc = ainca.create_word_docx(st.session_state.ainca_result, names_p, names_l, sector)
+    st.download_button(
+        "📥 Descarregar Relatório (Word)", 
+        doc, 
+        "Relatorio_AIncA_Fundamentado.docx", 
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    )
@@ -0,0 +1,200 @@
+"""
+Cache partilhada de texto extraído de PDFs.
+
+A chave é o SHA-256 dos bytes do ficheiro carregado. O texto de cada página
+é guardado comprimido (zlib) num ficheiro por documento, em disco, pelo que
+a cache é partilhada entre sessões Streamlit e entre processos do servidor.
+Quando o tamanho total ultrapassa o limite, os documentos usados há mais
+tempo são removidos (LRU pela data de modificação, renovada a cada leitura).
+"""
+import os
+import io
+import struct
+import zlib
+import hashlib
+import tempfile
+
+# --- 1. CONFIGURAÇÃO ---
+CACHE_ROOT = os.environ.get(
+    "SUPERAPP_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "superapp")
+)
+PDF_TEXT_DIR = os.path.join(CACHE_ROOT, "pdf_text")
+MAX_CACHE_BYTES = int(float(os.environ.get("SUPERAPP_PDF_CACHE_MB", "2048")) * 1024 * 1024)
+
+# Formato do ficheiro: MAGIC | n.º de páginas (uint32) | n tamanhos (uint32) | blocos zlib
+_MAGIC = b"SAPT1"
+_SUFFIX = ".pages"
+
+# ==========================================
+# --- 2. CHAVES DE CONTEÚDO ---
+# ==========================================
+
+def file_bytes(f):
+    """Obtém os bytes de um UploadedFile, caminho ou objeto tipo ficheiro."""
+    if isinstance(f, (bytes, bytearray)):
+        return bytes(f)
+    if isinstance(f, (str, os.PathLike)):
+        with open(f, "rb") as fh:
+            return fh.read()
+    if hasattr(f, "getvalue"):
+        return f.getvalue()
+    pos = f.tell()
+    f.seek(0)
+    data = f.read()
+    f.seek(pos)
+    return data
+
+def content_hash(data):
+    """SHA-256 (hex) dos bytes do documento."""
+    return hashlib.sha256(data).hexdigest()
+
+def file_digest(f):
+    """
+    SHA-256 do conteúdo de `f`, sem copiar os bytes de um ficheiro em
+    memória (lê o buffer). Usa o `digest` já calculado de um snapshot.
+    """
+    digest = getattr(f, "digest", None)
+    if digest:
+        return digest
+    if hasattr(f, "getbuffer"):
+        with f.getbuffer() as view:
+            return content_hash(view)
+    return content_hash(file_bytes(f))
+
+def file_size(f):
+    """Tamanho em bytes de `f`, sem ler o conteúdo."""
+    if isinstance(f, (bytes, bytearray)):
+        return len(f)
+    if isinstance(f, (str, os.PathLike)):
+        return os.path.getsize(f)
+    size = getattr(f, "size", None)
+    if isinstance(size, int):
+        return size
+    if hasattr(f, "getbuffer"):
+        with f.getbuffer() as view:
+            return view.nbytes
+    return len(file_bytes(f))
+
+def _path(digest):
+    return os.path.join(PDF_TEXT_DIR, digest[:2], digest + _SUFFIX)
+
+# ==========================================
+# --- 3. LEITURA / ESCRITA ---
+# ==========================================
+
+def _read_header(fh):
+    if fh.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError("Formato de cache desconhecido.")
+    (n,) = struct.unpack("<I", fh.read(4))
+    sizes = struct.unpack(f"<{n}I", fh.read(4 * n)) if n else ()
+    return sizes
+
+def get(digest):
+    """Devolve a lista de textos por página, ou None se o documento não estiver em cache."""
+    path = _path(digest)
+    try:
+        with open(path, "rb") as fh:
+            sizes = _read_header(fh)
+            pages = [zlib.decompress(fh.read(s)).decode("utf-8") for s in sizes]
+    except FileNotFoundError:
+        return None
+    except (ValueError, zlib.error, struct.error):
+        # Ficheiro truncado ou corrompido: descarta e força nova extração
+        _remove(path)
+        return None
+    _touch(path)
+    return pages
+
+def get_page(digest, index):
+    """Lê apenas uma página do documento em cache (sem descomprimir as restantes)."""
+    path = _path(digest)
+    try:
+        with open(path, "rb") as fh:
+            sizes = _read_header(fh)
+            if not 0 <= index < len(sizes):
+                raise IndexError(index)
+            fh.seek(sum(sizes[:index]), io.SEEK_CUR)
+            return zlib.decompress(fh.read(sizes[index])).decode("utf-8")
+    except FileNotFoundError:
+        return None
+    except (ValueError, zlib.error, struct.error):
+        _remove(path)
+        return None
+
+def put(digest, pages):
+    """Grava as páginas de forma atómica (ficheiro temporário + os.replace)."""
+    path = _path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    blobs = [zlib.compress((p or "").encode("utf-8"), 6) for p in pages]
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(_MAGIC)
+            fh.write(struct.pack("<I", len(blobs)))
+            if blobs:
+                fh.write(struct.pack(f"<{len(blobs)}I", *[len(b) for b in blobs]))
+            for b in blobs:
+                fh.write(b)
+        os.replace(tmp, path)
+    except OSError:
+        _remove(tmp)
+        return
+    evict()
+
+def contains(digest):
+    return os.path.exists(_path(digest))
+
+# ==========================================
+# --- 4. GESTÃO DE ESPAÇO (LRU) ---
+# ==========================================
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _entries():
+    if not os.path.isdir(PDF_TEXT_DIR):
+        return []
+    out = []
+    for sub in os.scandir(PDF_TEXT_DIR):
+        if not sub.is_dir():
+            continue
+        for e in os.scandir(sub.path):
+            if not e.name.endswith(_SUFFIX):
+                continue
+            try:
+                info = e.stat()
+            except FileNotFoundError:
+                continue
+            out.append((info.st_mtime, info.st_size, e.path))
+    return out
+
+def evict(max_bytes=None):
+    """Remove os documentos menos usados até o total caber no limite."""
+    limit = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    entries = _entries()
+    total = sum(size for _, size, _ in entries)
+    if total <= limit:
+        return 0
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        _remove(path)
+        total -= size
+        removed += 1
+    return removed
+
+def clear():
+    for _, _, path in _entries():
+        _remove(path)
@@ -0,0 +1,286 @@
+"""
+Extração de texto de PDFs partilhada por todos os módulos.
+
+Cada documento é identificado pelo SHA-256 do seu conteúdo; o texto por
+página fica na cache em disco (ver pdf_cache.py), pelo que um PDF lido uma
+vez é devolvido de imediato em qualquer sessão ou módulo.
+
+Documentos grandes são divididos em intervalos de páginas extraídos num
+pool de processos (o pypdf é Python puro e não liberta o GIL); vários
+ficheiros são processados em simultâneo através de extract_many().
+
+Os consumidores com orçamento de caracteres usam PageStream/take_budget:
+as páginas são extraídas a pedido e as que ficam fora do orçamento nunca
+chegam a ser lidas. Em paralelo lê-se uma janela de páginas de cada vez,
+limitada pela estimativa (caracteres médios por página) das páginas que
+ainda cabem no orçamento; com limpeza de texto são lidas no máximo mais
+CLEAN_LOOKAHEAD páginas, para detetar cabeçalhos e rodapés. O resultado é
+sempre um document_model.Document.
+"""
+import os
+import io
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pypdf import PdfReader
+
+import pdf_cache
+import text_cleanup
+from document_model import Document
+
+# --- 1. CONFIGURAÇÃO ---
+MAX_WORKERS = int(os.environ.get("SUPERAPP_PDF_WORKERS", os.cpu_count() or 2))
+PARALLEL_MIN_PAGES = 24   # Abaixo disto o arranque do pool não compensa
+MIN_PAGES_PER_TASK = 8
+CLEAN_LOOKAHEAD = 8       # Páginas observadas à frente para detetar cabeçalhos/rodapés
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# ==========================================
+# --- 2. POOL DE PROCESSOS ---
+# ==========================================
+
+def _get_pool():
+    """Pool único por processo do servidor, partilhado por todas as sessões."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 'spawn' evita herdar por fork o estado das threads do Streamlit
+            ctx = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=ctx)
+        return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def _extract_range(path, start, stop):
+    """Executado no processo filho: extrai as páginas [start, stop)."""
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def _page_ranges(n_pages, workers):
+    # ~3 tarefas por processo para equilibrar páginas lentas (tabelas, mapas)
+    size = max(MIN_PAGES_PER_TASK, -(-n_pages // (workers * 3)))
+    return [(s, min(s + size, n_pages)) for s in range(0, n_pages, size)]
+
+# ==========================================
+# --- 3. LEITURA PREGUIÇOSA POR PÁGINA ---
+# ==========================================
+
+class PageStream:
+    """
+    Fluxo preguiçoso das páginas de um PDF.
+    As páginas são extraídas apenas quando um consumidor as pede e ficam
+    memorizadas (num Document), pelo que vários consumidores com orçamentos
+    diferentes partilham o mesmo trabalho. Só um documento lido até ao fim
+    entra na cache.
+
+    Com clean=True, `document` contém o texto já sem ruído (ver
+    text_cleanup.py) e o texto original fica em `raw` (é este que vai para a
+    cache).
+    """
+
+    def __init__(self, f, clean=False):
+        self.name = getattr(f, "name", None) or os.path.basename(str(f))
+        self.digest = pdf_cache.file_digest(f)
+        self._lock = threading.Lock()
+        self._clean_lock = threading.Lock()
+        self._spool = None
+
+        cached = pdf_cache.get(self.digest)
+        if cached is not None:
+            self.raw = Document.from_pages(self.name, cached, self.digest)
+            self._data = self._reader = None
+            self.n_pages = len(cached)
+        else:
+            self.raw = Document(self.name, self.digest)
+            self._data = data = pdf_cache.file_bytes(f)
+            self._reader = PdfReader(io.BytesIO(data))
+            self.n_pages = len(self._reader.pages)
+
+        self.cleaner = text_cleanup.BoilerplateCleaner() if clean else None
+        self.document = Document(self.name, self.digest) if clean else self.raw
+        self.budget = None   # Caracteres que o consumidor ainda pode ler (ver take_budget)
+
+    @property
+    def complete(self):
+        return len(self.raw) >= self.n_pages
+
+    @property
+    def pages_read(self):
+        return len(self.raw)
+
+    def page(self, i):
+        """Página i (0-based), extraída (e limpa) só se ainda não o foi."""
+        if self.cleaner is None:
+            if i >= len(self.raw):
+                self._fill(i + 1)
+            return self.raw[i]
+        with self._clean_lock:
+            while len(self.document) <= i:
+                j = len(self.document)
+                self._fill(min(self.n_pages, j + 1 + CLEAN_LOOKAHEAD))
+                while self.cleaner.pages_seen < len(self.raw):
+                    self.cleaner.observe(self.raw[self.cleaner.pages_seen].text)
+                self.document.append(self.cleaner.clean(self.raw[j].text))
+        return self.document[i]
+
+    def __iter__(self):
+        """Percorre as páginas (Page), extraindo-as só quando necessário."""
+        for i in range(self.n_pages):
+            yield self.page(i)
+
+    def read_all(self):
+        self._fill(self.n_pages)
+        if self.n_pages:
+            self.page(self.n_pages - 1)
+        return self.document
+
+    def _fill(self, upto):
+        """Garante que as páginas [0, upto) estão extraídas."""
+        with self._lock:
+            start = len(self.raw)
+            if upto <= start:
+                return
+            if MAX_WORKERS > 1 and self.n_pages >= PARALLEL_MIN_PAGES:
+                # Em paralelo lê-se uma janela inteira de cada vez, sem passar do orçamento
+                upto = min(self.n_pages, max(upto, start + self._window()))
+                for text in self._extract_parallel(start, upto):
+                    self.raw.append(text)
+            else:
+                for i in range(start, upto):
+                    self.raw.append(self._reader.pages[i].extract_text() or "")
+            if self.complete:
+                pdf_cache.put(self.digest, self.raw.texts())
+                self._release()
+
+    def _window(self):
+        """Páginas a ler de uma vez em paralelo: as que (estimadamente) ainda cabem no orçamento."""
+        window = MAX_WORKERS * MIN_PAGES_PER_TASK
+        if self.budget is None:
+            return window
+        seen = self.document   # O que o consumidor lê (limpo, se clean=True)
+        if not len(seen):
+            return min(window, MIN_PAGES_PER_TASK)   # Sem média ainda: uma tarefa só
+        # Bytes UTF-8 como estimativa dos caracteres (O(1) no Document)
+        per_page = max(seen.nbytes / len(seen), 1)
+        needed = int(max(self.budget - seen.nbytes, 0) // per_page) + 1
+        ahead = len(self.raw) - len(seen)                # Já lidas para a limpeza
+        return max(1, min(window, needed - ahead))
+
+    def _extract_parallel(self, start, stop):
+        if self._spool is None:
+            fd, self._spool = tempfile.mkstemp(suffix=".pdf")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(self._data)
+        try:
+            pool = _get_pool()
+            futures = [
+                pool.submit(_extract_range, self._spool, start + s, start + e)
+                for s, e in _page_ranges(stop - start, MAX_WORKERS)
+            ]
+            # Remontagem pela ordem das páginas
+            pages = []
+            for fut in futures:
+                pages.extend(fut.result())
+            return pages
+        except BrokenProcessPool:
+            _reset_pool()
+            return [self._reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+    def _release(self):
+        self._data = self._reader = None
+        if self._spool:
+            try: os.remove(self._spool)
+            except OSError: pass
+            self._spool = None
+
+    def __del__(self):
+        if getattr(self, "_spool", None):
+            self._release()
+
+def _cut_at_sentence(text, max_chars):
+    """Corta no último fim de frase/parágrafo antes do limite."""
+    head = text[:max_chars]
+    cut = max(head.rfind(". "), head.rfind(".\n"), head.rfind("\n\n"))
+    return head[:cut + 1] if cut > 0 else head
+
+def take_budget(streams, max_chars):
+    """
+    Lê páginas, por ordem, até preencher max_chars.
+    O corte cai sempre numa fronteira de página (só a primeira página, se
+    sozinha exceder o orçamento, é cortada no fim de uma frase) e as páginas
+    seguintes não chegam a ser extraídas: o orçamento restante é passado a
+    cada PageStream, que limita a ela a leitura em paralelo. Excesso máximo:
+    a primeira tarefa (MIN_PAGES_PER_TASK páginas, antes de haver média),
+    uma página de folga da estimativa e, com limpeza, CLEAN_LOOKAHEAD.
+    Devolve uma lista de Documents (cortes por intervalo de páginas).
+    """
+    out = []
+    used = 0
+    for stream in streams:
+        taken = 0
+        stream.budget = max_chars - used
+        for page in stream:
+            text = page.text
+            if used + len(text) > max_chars:
+                if used == 0:
+                    # Mantém as páginas em branco anteriores, para a numeração seguir a do PDF
+                    pages = [*stream.document[:taken].texts(), _cut_at_sentence(text, max_chars)]
+                    out.append(Document.from_pages(stream.name, pages, stream.digest))
+                    return out
+                break
+            taken += 1
+            used += len(text)
+        out.append(stream.document[:taken])
+        if taken < stream.n_pages:
+            break
+    return out
+
+# ==========================================
+# --- 4. API PÚBLICA ---
+# ==========================================
+
+def open_stream(f, clean=False):
+    return PageStream(f, clean=clean)
+
+def extract_document(f, clean=False):
+    """Documento completo (página em branco -> texto vazio)."""
+    return PageStream(f, clean=clean).read_all()
+
+def extract_many(files, clean=False, cleaners=None):
+    """
+    Extrai vários ficheiros em simultâneo.
+    Devolve uma lista alinhada com `files`: Document de cada ficheiro, a exceção
+    ocorrida (para que a página possa reportar cada erro com st.error) ou None
+    nas posições em que `files` tem None.
+    Com clean=True, o limpador de cada documento lido é acrescentado a
+    `cleaners` (pela ordem de `files`), como em ambiente/ainca.
+    """
+    files = list(files or [])
+    if not any(f is not None for f in files):
+        return [None] * len(files)
+
+    def _safe(f):
+        if f is None:
+            return None
+        try:
+            stream = open_stream(f, clean=clean)
+            stream.read_all()
+            return stream
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(len(files), 8)) as ex:
+        results = list(ex.map(_safe, files))
+    for res in results:
+        if isinstance(res, PageStream) and res.cleaner is not None and cleaners is not None:
+            cleaners.append(res.cleaner)
+    return [res.document if isinstance(res, PageStream) else res for res in results]
@@ -0,0 +1,975 @@
+"""
+Motor de prazos AIA (dias úteis, feriados nacionais e suspensões).
+
+Lógica da página 02_Prazos_AIA, sem dependência do Streamlit.
+
+O cálculo original avançava um dia de calendário de cada vez e, para cada
+dia, percorria a lista de suspensões; calculate_workflow repete-o 6 a 8
+vezes por rerun. Aqui os prazos saem de um BusinessCalendar: um array
+NumPy com os dias que contam (nem fim de semana, nem feriado, nem
+suspensão) e a sua soma acumulada. Avançar N dias úteis é uma pesquisa
+binária nessa soma e contar dias úteis entre duas datas é uma subtração.
+
+Os feriados vêm de um HolidayCalendar: um bitmap NumPy por ano, criado
+uma vez por processo e alargado a pedido a qualquer ano (antes só havia
+feriados até ao ano de início + 2, e uma suspensão longa fazia o prazo
+passar por feriados desconhecidos). Os feriados regionais (Açores,
+Madeira) e municipais são camadas opcionais fundidas no mesmo bitmap,
+pelo que não custam nada no cálculo.
+
+As suspensões (pedidos de elementos) são normalizadas uma vez num
+SuspensionIndex: ordenadas e fundidas quando se sobrepõem ou tocam, pelo
+que um período repetido já não conta a dobrar no total. O índice responde
+por pesquisa binária se um dia está suspenso e quantos dias úteis ficaram
+suspensos entre duas datas, e dá ao BusinessCalendar a máscara fundida:
+um processo com muitos pedidos de elementos custa o mesmo que um sem
+nenhum.
+
+Para uma carteira de processos (CSV, uma linha por processo),
+portfolio_deadlines() calcula as mesmas datas para todos de uma vez: os
+processos são agrupados por conjunto de feriados e cada prazo é uma
+pesquisa vetorizada na soma acumulada do calendário, em vez de uma
+chamada a calculate_workflow por processo.
+
+A página recalcula o fluxo em cada rerun do Streamlit: calculate_workflow
+é memorizado por um snapshot imutável das entradas (workflow_key) e cada
+prazo também, pelo que só as fases cujos dias mudaram são recalculadas.
+
+O ciclo dia a dia mantém-se em deadline_log(), que produz o registo de
+auditoria (um registo por dia, calculado só quando é lido: AuditLog) e
+serve de referência: check() compara os dois cálculos em datas, prazos e
+suspensões aleatórios (python prazos.py --check; corre também em
+tests/test_prazos.py).
+"""
+import random
+import argparse
+import threading
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from datetime import date, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# --- 1. CONFIGURAÇÃO ---
+CALENDAR_MARGIN = 31      # Dias de calendário antes da data mais antiga pedida
+CALENDAR_SPAN = 3 * 366   # Dimensão inicial; cresce para o dobro quando um prazo a ultrapassa
+CALENDAR_CACHE = 64       # Calendários (feriados + suspensões) memorizados
+WORKFLOW_CACHE = 256      # Resultados de calculate_workflow memorizados
+DEADLINE_CACHE = 4096     # Prazos individuais memorizados (uma fase alterada não recalcula as outras)
+
+REGION_MAINLAND = "Continente"
+NO_MUNICIPALITY = "(nenhum)"
+
+# Prazos (dias úteis) de cada regime
+REGIME_DEFAULTS = {
+    150: {"reuniao": 9, "conformidade": 30, "ptf": 85, "audiencia": 100, "dia": 150,
+          "setoriais": 75, "visita": 15, "cp_duration": 30},
+    90: {"reuniao": 9, "conformidade": 20, "ptf": 65, "audiencia": 70, "dia": 90,
+         "setoriais": 60, "visita": 15, "cp_duration": 30},
+}
+
+# Fases principais: (etapa, chave de milestones_config)
+MILESTONES = [
+    ("Data Reunião", "reuniao"),
+    ("Limite Conformidade", "conformidade"),
+    ("Envio PTF à AAIA", "ptf"),
+    ("Audiência de Interessados", "audiencia"),
+    ("Emissão da DIA (Decisão Final)", "dia"),
+]
+
+# ==========================================
+# --- 2. FERIADOS NACIONAIS ---
+# ==========================================
+
+def get_easter_date(year):
+    a = year % 19
+    b = year // 100
+    c = year % 100
+    d = b // 4
+    e = b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i = c // 4
+    k = c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = ((h + l - 7 * m + 114) % 31) + 1
+    return date(year, month, day)
+
+def get_holidays_for_year(year):
+    holidays = set()
+    fixed_dates = [(1, 1), (4, 25), (5, 1), (6, 10), (8, 15), (10, 5), (11, 1), (12, 1), (12, 8), (12, 25)]
+    for m, d in fixed_dates:
+        holidays.add(date(year, m, d))
+    easter = get_easter_date(year)
+    holidays.add(easter - timedelta(days=2))
+    holidays.add(easter + timedelta(days=60))
+    return holidays
+
+def get_holidays_range(start_year, end_year):
+    all_holidays = set()
+    for y in range(start_year, end_year + 1):
+        all_holidays.update(get_holidays_for_year(y))
+    return all_holidays
+
+def is_business_day(check_date, holidays_set):
+    if check_date.weekday() >= 5: return False
+    if check_date in holidays_set: return False
+    return True
+
+def _fixed(month, day):
+    return lambda year: date(year, month, day)
+
+def _from_easter(days):
+    return lambda year: get_easter_date(year) + timedelta(days=days)
+
+# Camadas opcionais: regra(ano) -> data
+REGIONAL_HOLIDAYS = {
+    REGION_MAINLAND: [],
+    "Açores": [_from_easter(50)],                   # Segunda-feira do Espírito Santo
+    "Madeira": [_fixed(7, 1), _fixed(12, 26)],      # Dia da Região e 1.ª Oitava
+}
+
+# Feriados municipais das sedes de distrito e das regiões autónomas
+MUNICIPAL_HOLIDAYS = {
+    "Angra do Heroísmo": _fixed(6, 24),
+    "Aveiro": _fixed(5, 12),
+    "Beja": _from_easter(39),                       # Quinta-feira da Ascensão
+    "Braga": _fixed(6, 24),
+    "Bragança": _fixed(8, 22),
+    "Castelo Branco": _from_easter(39),
+    "Coimbra": _fixed(7, 4),
+    "Évora": _fixed(6, 29),
+    "Faro": _fixed(9, 7),
+    "Funchal": _fixed(8, 21),
+    "Guarda": _fixed(11, 27),
+    "Leiria": _fixed(5, 22),
+    "Lisboa": _fixed(6, 13),
+    "Portalegre": _fixed(5, 23),
+    "Porto": _fixed(6, 24),
+    "Santarém": _fixed(3, 19),
+    "Setúbal": _fixed(9, 15),
+    "Viana do Castelo": _fixed(8, 20),
+    "Vila Real": _fixed(6, 13),
+    "Viseu": _fixed(9, 21),
+}
+
+class HolidayCalendar:
+    """
+    Feriados como um bitmap NumPy por ano (índice = dia do ano), criado na
+    primeira consulta desse ano. `rules` são funções ano -> data(s) somadas
+    aos feriados nacionais. `date in calendário` é O(1); mask() devolve o
+    bitmap de um intervalo de datas para o BusinessCalendar.
+    """
+
+    def __init__(self, rules=(), name=REGION_MAINLAND):
+        self.rules = tuple(rules)
+        self.name = name
+        self._years = {}
+        self._lock = threading.Lock()
+
+    def _year(self, year):
+        """(ordinal de 1 de janeiro, bitmap) do ano."""
+        entry = self._years.get(year)
+        if entry is None:
+            first = date(year, 1, 1).toordinal()
+            bits = np.zeros(date(year + 1, 1, 1).toordinal() - first, dtype=bool)
+            days = set(get_holidays_for_year(year))
+            for rule in self.rules:
+                days.add(rule(year))
+            bits[[d.toordinal() - first for d in days]] = True
+            with self._lock:
+                entry = self._years.setdefault(year, (first, bits))
+        return entry
+
+    def __contains__(self, d):
+        first, bits = self._years.get(d.year) or self._year(d.year)
+        return bool(bits[d.toordinal() - first])
+
+    def dates(self, start_year, end_year):
+        """Feriados (datas) dos anos indicados."""
+        return {date.fromordinal(first + int(i))
+                for first, bits in (self._year(y) for y in range(start_year, end_year + 1))
+                for i in np.flatnonzero(bits)}
+
+    def mask(self, first, days):
+        """Bitmap dos `days` dias de calendário a partir de `first`."""
+        last = first + timedelta(days=days - 1)
+        bits = np.concatenate([self._year(y)[1] for y in range(first.year, last.year + 1)])
+        skip = first.toordinal() - date(first.year, 1, 1).toordinal()
+        return bits[skip:skip + days]
+
+
+@lru_cache(maxsize=None)
+def _holiday_calendar(region, municipality):
+    rules = list(REGIONAL_HOLIDAYS[region])
+    if municipality:
+        rules.append(MUNICIPAL_HOLIDAYS[municipality])
+    return HolidayCalendar(rules, " / ".join(p for p in (region, municipality) if p))
+
+def holiday_calendar(region=REGION_MAINLAND, municipality=None):
+    """Calendário de feriados (único por processo para cada região/município)."""
+    if municipality == NO_MUNICIPALITY:
+        municipality = None
+    return _holiday_calendar(region or REGION_MAINLAND, municipality)
+
+def is_suspended(current_date, suspensions):
+    for s in suspensions:
+        if s['start'] <= current_date <= s['end']:
+            return True
+    return False
+
+# ==========================================
+# --- 3. SUSPENSÕES ---
+# ==========================================
+
+class SuspensionIndex:
+    """
+    Períodos de suspensão ({'start', 'end'}, inclusivos) ordenados e
+    fundidos: `intervals` é um tuplo de (início, fim) sem sobreposições, que
+    também serve de chave (dois conjuntos de pedidos com os mesmos dias
+    suspensos partilham o mesmo calendário). Um período com fim antes do
+    início é rejeitado (ValueError): no cálculo original não suspendia dia
+    nenhum, mas a sua data de fim entrava no prazo de conformidade com PEA.
+    """
+
+    def __init__(self, suspensions=()):
+        merged = []
+        for start, end in sorted((s['start'], s['end']) for s in suspensions):
+            if end < start:
+                raise ValueError(f"Suspensão com fim ({end:%d/%m/%Y}) anterior ao início ({start:%d/%m/%Y}).")
+            if merged and start <= merged[-1][1] + timedelta(days=1):
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        self.intervals = tuple(merged)
+        self._starts = [a for a, _ in merged]
+        self._ends = [b for _, b in merged]
+
+    def __bool__(self):
+        return bool(self.intervals)
+
+    def __iter__(self):
+        """Períodos fundidos, no formato da página ({'start', 'end'})."""
+        return iter({'start': a, 'end': b} for a, b in self.intervals)
+
+    def __contains__(self, d):
+        i = bisect_right(self._starts, d) - 1
+        return i >= 0 and d <= self._ends[i]
+
+    @property
+    def last_end(self):
+        return self._ends[-1] if self._ends else None
+
+    def total_days(self):
+        """Dias de calendário suspensos (cada dia conta uma vez)."""
+        return sum((b - a).days + 1 for a, b in self.intervals)
+
+    def business_days(self, start, end, holidays):
+        """Dias úteis suspensos em [start, end]."""
+        lo = bisect_left(self._ends, start)       # Primeiro período que acaba em start ou depois
+        hi = bisect_right(self._starts, end)      # Períodos que começam até end
+        if lo >= hi:
+            return 0
+        plain = calendar(holidays)
+        return sum(plain.business_days_in(max(a, start), min(b, end))
+                   for a, b in self.intervals[lo:hi])
+
+    def mask(self, first, days):
+        """Bitmap (True = suspenso) dos `days` dias de calendário a partir de `first`."""
+        bits = np.zeros(days, dtype=bool)
+        base = first.toordinal()
+        lo = bisect_left(self._ends, first)
+        hi = bisect_right(self._starts, first + timedelta(days=days - 1))
+        for a, b in self.intervals[lo:hi]:
+            bits[max(a.toordinal() - base, 0):b.toordinal() - base + 1] = True
+        return bits
+
+
+def suspension_index(suspensions):
+    """SuspensionIndex de uma lista de períodos (ou o próprio índice)."""
+    if isinstance(suspensions, SuspensionIndex):
+        return suspensions
+    return SuspensionIndex(suspensions or ())
+
+# ==========================================
+# --- 4. CALENDÁRIO DE DIAS ÚTEIS ---
+# ==========================================
+
+class BusinessCalendar:
+    """
+    Dias de calendário a partir de `first` em arrays NumPy:
+    `_business` (dia útil: nem fim de semana nem feriado) e as somas
+    acumuladas dos dias úteis e dos dias que contam para os prazos (úteis e
+    fora das suspensões). Os arrays são criados na primeira consulta e
+    crescem quando uma consulta sai do intervalo.
+    """
+
+    def __init__(self, holidays, suspensions=()):
+        # HolidayCalendar, ou um conjunto de datas (como no cálculo original)
+        self.holidays = holidays if isinstance(holidays, HolidayCalendar) else frozenset(holidays)
+        self.suspensions = suspension_index(suspensions)
+        self.first = None
+        self._business = None
+        self._lock = threading.RLock()   # Calendários memorizados são partilhados entre sessões
+
+    def _build(self, first, days):
+        self.first = first
+        base = self.first.toordinal()
+        ordinals = base + np.arange(days)
+        # date.toordinal(): o dia 1 (01/01/0001) foi uma segunda-feira
+        business = (ordinals - 1) % 7 < 5
+        if isinstance(self.holidays, HolidayCalendar):
+            business &= ~self.holidays.mask(first, days)
+        else:
+            hol = [h.toordinal() - base for h in self.holidays]
+            business[[i for i in hol if 0 <= i < days]] = False
+        counted = business & ~self.suspensions.mask(first, days)
+        self._base = base
+        self._business = business
+        self._cum_business = np.cumsum(business, dtype=np.int64)
+        self._cum_counted = np.cumsum(counted, dtype=np.int64)
+
+    def _index(self, d):
+        """Posição de d nos arrays, alargando o intervalo se necessário."""
+        if self.first is None:
+            self._build(d - timedelta(days=CALENDAR_MARGIN), CALENDAR_SPAN)
+        i = d.toordinal() - self._base
+        if i < 0:
+            first = d - timedelta(days=CALENDAR_MARGIN)
+            self._build(first, len(self._business) + (self.first - first).days)
+            i = d.toordinal() - self._base
+        while i >= len(self._business):
+            self._build(self.first, 2 * len(self._business))
+        return i
+
+    def _date(self, i):
+        return date.fromordinal(self._base + int(i))
+
+    def offset(self, start, n, suspended=True):
+        """Data do n-ésimo dia útil depois de start (fora das suspensões, se suspended)."""
+        if n <= 0:
+            return start
+        with self._lock:
+            i = self._index(start)
+            cum = self._cum_counted if suspended else self._cum_business
+            target = int(cum[i]) + n
+            while int(cum[-1]) < target:
+                self._build(self.first, 2 * len(cum))
+                cum = self._cum_counted if suspended else self._cum_business
+            return self._date(np.searchsorted(cum, target, side="left"))
+
+    def roll_forward(self, d):
+        """d, se for dia útil; senão o dia útil seguinte (as suspensões não contam)."""
+        with self._lock:
+            i = self._index(d)
+            if self._business[i]:
+                return d
+            return self.offset(d, 1, suspended=False)
+
+    def deadline(self, start, n):
+        """Fim do prazo de n dias úteis contados a partir de start."""
+        return self.roll_forward(self.offset(start, n))
+
+    def business_days_in(self, start, end):
+        """Dias úteis em [start, end] (as suspensões não contam)."""
+        if end < start:
+            return 0
+        with self._lock:
+            i = self._index(start)
+            j = self._index(end)
+            return int(self._cum_business[j] - self._cum_business[i]) + bool(self._business[i])
+
+    def business_days_between(self, start, end):
+        """Dias úteis em ]start, end[ (as suspensões não contam)."""
+        if end <= start + timedelta(days=1):
+            return 0
+        with self._lock:
+            i = self._index(start)   # Primeiro a data mais antiga: pode mudar a origem dos arrays
+            j = self._index(end - timedelta(days=1))
+            return int(self._cum_business[j] - self._cum_business[i])
+
+
+@lru_cache(maxsize=CALENDAR_CACHE)
+def _calendar(holidays, intervals):
+    return BusinessCalendar(holidays, [{'start': s, 'end': e} for s, e in intervals])
+
+def calendar(holidays, suspensions=()):
+    """
+    BusinessCalendar (memorizado) para estes feriados (HolidayCalendar ou
+    datas) e suspensões (lista de períodos ou SuspensionIndex).
+    """
+    if not isinstance(holidays, HolidayCalendar):
+        holidays = frozenset(holidays)
+    return _calendar(holidays, suspension_index(suspensions).intervals)
+
+# ==========================================
+# --- 5. PRAZOS ---
+# ==========================================
+
+def add_business_days(start_date, num_days, holidays_set):
+    return calendar(holidays_set).offset(start_date, num_days)
+
+def deadline_log(start_date, target_business_days, suspensions, holidays_set):
+    """Contagem dia a dia (referência e registo de auditoria): devolve (data final, registo)."""
+    suspensions = suspension_index(suspensions)
+    current_date = start_date
+    days_counted = 0
+    log = [{"Data": current_date, "Dia Contado": 0, "Status": "Início"}]
+    while days_counted < target_business_days:
+        current_date += timedelta(days=1)
+        status = "Util"
+        if current_date in suspensions:
+            status = "Suspenso"
+        elif current_date.weekday() >= 5:
+            status = "Fim de Semana"
+        elif current_date in holidays_set:
+            status = "Feriado"
+        if status == "Util":
+            days_counted += 1
+        log.append({"Data": current_date, "Dia Contado": days_counted if status == "Util" else "-", "Status": status})
+    final_date = current_date
+    while final_date.weekday() >= 5 or final_date in holidays_set:
+         final_date += timedelta(days=1)
+    return final_date, log
+
+def calculate_deadline_rigorous(start_date, target_business_days, suspensions, holidays_set, return_log=False):
+    if return_log:
+        return deadline_log(start_date, target_business_days, suspensions, holidays_set)
+    return calendar(holidays_set, suspensions).deadline(start_date, target_business_days)
+
+class AuditLog(Sequence):
+    """
+    Registo dia a dia de um prazo (deadline_log), só calculado quando é
+    lido pela primeira vez. Partilhado entre reruns: não alterar as linhas.
+    """
+
+    def __init__(self, start_date, target_business_days, suspensions, holidays_set):
+        self._args = (start_date, target_business_days, suspensions, holidays_set)
+        self._rows = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._rows is None:
+                self._rows = deadline_log(*self._args)[1] if self._args[1] is not None else []
+            return self._rows
+
+    def __len__(self):
+        return len(self._load())
+
+    def __getitem__(self, i):
+        return self._load()[i]
+
+    def __bool__(self):
+        return self._args[1] is not None
+
+
+@lru_cache(maxsize=DEADLINE_CACHE)
+def _deadline(holidays, intervals, start_date, days):
+    return _calendar(holidays, intervals).deadline(start_date, days)
+
+@lru_cache(maxsize=DEADLINE_CACHE)
+def _conformity_after_pea(holidays, start_date, pea_date, days, last_susp_end):
+    plain = _calendar(holidays, ())
+    remaining_days = max(days - plain.business_days_between(start_date, pea_date), 0)
+    return plain.deadline(last_susp_end, remaining_days)
+
+@lru_cache(maxsize=DEADLINE_CACHE)
+def _complementary(holidays, start_date, conf_date_real, conformity, cp_duration, visit_days):
+    plain = _calendar(holidays, ())
+    cp_start = plain.offset(conf_date_real, 5)
+    cp_end = plain.offset(cp_start, cp_duration)
+    return (plain.deadline(start_date, conformity), cp_start, cp_end, plain.offset(cp_start, 23),
+            plain.offset(cp_end, 7), plain.offset(cp_start, visit_days))
+
+def workflow_key(start_date, suspensions, milestones_config, pea_date=None, holidays=None):
+    """
+    Snapshot imutável das entradas de calculate_workflow: suspensões já
+    fundidas e prazos ordenados, para comparar e memorizar resultados.
+    """
+    holidays = holidays or holiday_calendar()
+    if not isinstance(holidays, HolidayCalendar):
+        holidays = frozenset(holidays)
+    return (start_date, suspension_index(suspensions).intervals,
+            tuple(sorted(milestones_config.items())), pea_date, holidays)
+
+@lru_cache(maxsize=WORKFLOW_CACHE)
+def _workflow(key):
+    start_date, intervals, config, pea_date, holidays_set = key
+    milestones_config = dict(config)
+    suspensions = SuspensionIndex({'start': a, 'end': b} for a, b in intervals)
+    results = []
+    log_days = None
+    conf_date_real = None
+    for nome, key_name in MILESTONES:
+        dias = milestones_config[key_name]
+        if nome == "Limite Conformidade" and pea_date and suspensions:
+            final_date = _conformity_after_pea(holidays_set, start_date, pea_date, dias, suspensions.last_end)
+        else:
+            if dias == milestones_config["dia"]:
+                log_days = dias   # Registo de auditoria do último prazo com os dias da DIA
+            final_date = _deadline(holidays_set, intervals, start_date, dias)
+        if nome == "Limite Conformidade":
+            conf_date_real = final_date
+        results.append({
+            "Etapa": nome,
+            "Prazo Legal": f"{dias} dias úteis",
+            "Data Prevista": final_date
+        })
+
+    complementary = []
+    gantt_data = {}
+    if conf_date_real:
+        cp_duration = milestones_config.get("cp_duration", 30)
+        visit_days = milestones_config.get("visita", 15)
+        sectoral_days = milestones_config.get("setoriais", 75)
+        conf_date_theo, cp_start, cp_end, external_ops, cp_report, visit_date = _complementary(
+            holidays_set, start_date, conf_date_real, milestones_config["conformidade"], cp_duration, visit_days
+        )
+        sectoral_date = _deadline(holidays_set, intervals, start_date, sectoral_days)
+        gantt_data = {"cp_start": cp_start, "cp_end": cp_end, "visit": visit_date, "sectoral": sectoral_date}
+        complementary = [
+            {"Etapa": "1. Conformidade (Ref. Teórica)", "Ref": "Sem suspensões", "Data": conf_date_theo},
+            {"Etapa": "1. Conformidade (Real)", "Ref": "Com suspensões", "Data": conf_date_real},
+            {"Etapa": "2. Início Consulta Pública", "Ref": "Conf + 5 dias", "Data": cp_start},
+            {"Etapa": "3. Fim Consulta Pública", "Ref": f"Início CP + {cp_duration} dias", "Data": cp_end},
+            {"Etapa": "4. Data Pareceres Externos", "Ref": "Início CP + 23 dias", "Data": external_ops},
+            {"Etapa": "5. Envio Relatório CP", "Ref": "Fim CP + 7 dias", "Data": cp_report},
+            {"Etapa": "6. Visita Técnica", "Ref": f"Início CP + {visit_days} dias", "Data": visit_date},
+            {"Etapa": "7. Pareceres Setoriais", "Ref": f"Dia {sectoral_days} Global", "Data": sectoral_date},
+        ]
+
+    log_final = AuditLog(start_date, log_days, suspensions, holidays_set)
+    return results, complementary, suspensions.total_days(), log_final, gantt_data
+
+def calculate_workflow(start_date, suspensions, milestones_config, pea_date=None, holidays=None):
+    """
+    `holidays`: HolidayCalendar (por omissão, só os feriados nacionais).
+    O resultado é memorizado por workflow_key() e cada prazo individualmente,
+    pelo que um rerun sem alterações não recalcula nada e uma fase alterada
+    só recalcula essa fase. O registo de auditoria é um AuditLog, calculado
+    dia a dia só quando é lido.
+    """
+    results, complementary, total_susp, log_final, gantt_data = _workflow(
+        workflow_key(start_date, suspensions, milestones_config, pea_date, holidays)
+    )
+    # Cópias: quem chama pode alterar as listas sem estragar a cache
+    return ([dict(r) for r in results], [dict(c) for c in complementary], total_susp,
+            log_final, dict(gantt_data))
+
+# ==========================================
+# --- 6. CARTEIRA DE PROCESSOS ---
+# ==========================================
+
+# Uma linha por processo; só as três primeiras colunas são obrigatórias.
+# As datas aceitam AAAA-MM-DD ou DD/MM/AAAA; as suspensões são períodos
+# "início a fim" separados por ";" (como na lista da barra lateral).
+PORTFOLIO_COLUMNS = {
+    "processo": "Identificação do processo",
+    "data_inicio": "Data de instrução (dia 0)",
+    "regime": "Prazo global: 150 ou 90",
+    "reuniao": "Dias úteis até à reunião (por omissão, o do regime)",
+    "conformidade": "Dias úteis até ao limite da conformidade",
+    "ptf": "Dias úteis até ao envio do PTF",
+    "audiencia": "Dias úteis até à audiência de interessados",
+    "dia": "Dias úteis até à DIA",
+    "setoriais": "Dias úteis até aos pareceres setoriais",
+    "visita": "Dias úteis do início da CP até à visita",
+    "cp_duracao": "Duração da consulta pública (dias úteis)",
+    "suspensoes": "Períodos de suspensão: 2025-03-03 a 2025-03-21; ...",
+    "data_pea": "Data do PEA",
+    "regiao": "Continente, Açores ou Madeira",
+    "municipio": "Município (feriado municipal)",
+}
+PORTFOLIO_REQUIRED = ("processo", "data_inicio", "regime")
+# Coluna do CSV -> chave de milestones_config
+PORTFOLIO_DAYS = {
+    "reuniao": "reuniao", "conformidade": "conformidade", "ptf": "ptf", "audiencia": "audiencia",
+    "dia": "dia", "setoriais": "setoriais", "visita": "visita", "cp_duracao": "cp_duration",
+}
+NEXT_LABEL = "Próximo prazo"
+NEXT_DATE = "Data do próximo prazo"
+NEXT_DAYS = "Dias até ao próximo prazo"
+
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+class _Overflow(Exception):
+    """Um prazo caiu fora do calendário: alarga-se e repete-se."""
+
+
+def portfolio_template():
+    """Exemplo de carteira (modelo para o CSV)."""
+    return pd.DataFrame([
+        {"processo": "AIA 1234", "data_inicio": "2025-01-15", "regime": 150, "suspensoes": "", "data_pea": ""},
+        {"processo": "AIA 1240", "data_inicio": "2025-02-03", "regime": 90,
+         "suspensoes": "2025-03-03 a 2025-03-21; 2025-05-05 a 2025-05-09", "data_pea": "2025-02-20"},
+    ], columns=["processo", "data_inicio", "regime", "suspensoes", "data_pea"])
+
+def read_portfolio(f):
+    """Lê o CSV da carteira (separador , ou ; detetado automaticamente)."""
+    df = pd.read_csv(f, sep=None, engine="python", dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    df.columns = [c.strip().lower() for c in df.columns]
+    return df
+
+def _lines(mask, rows=None):
+    """Linhas do CSV (1 = cabeçalho) assinaladas em mask, para as mensagens de erro."""
+    idx = np.flatnonzero(mask)
+    if rows is not None:
+        idx = np.asarray(rows)[idx]
+    return ", ".join(str(i + 2) for i in sorted(set(idx.tolist()))[:10])
+
+def _parse_dates(values, rows=None):
+    """Datas ou texto -> dias desde 1970 (int64); -1 onde está vazio. ValueError se inválido."""
+    values = pd.Series(values, dtype=None if len(values) else object)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        days = values.to_numpy().astype("datetime64[D]").astype(np.int64)
+        return np.where(values.isna().to_numpy(), -1, days)
+    text = values.fillna("").astype(str).str.strip()
+    parsed = pd.to_datetime(text, format="%Y-%m-%d", errors="coerce")
+    parsed = parsed.fillna(pd.to_datetime(text, format="%d/%m/%Y", errors="coerce"))
+    bad = (parsed.isna() & (text != "") & (text.str.lower() != "nan")).to_numpy()
+    if bad.any():
+        raise ValueError(f"Datas inválidas (linhas {_lines(bad, rows)}): use AAAA-MM-DD ou DD/MM/AAAA.")
+    days = parsed.to_numpy().astype("datetime64[D]").astype(np.int64)
+    return np.where(parsed.isna().to_numpy(), -1, days)
+
+def _text_column(df, column):
+    if column not in df.columns:
+        return pd.Series([""] * len(df))
+    return df[column].fillna("").astype(str).str.strip()
+
+def _parse_suspensions(texts):
+    """
+    Coluna de suspensões -> períodos fundidos em arrays planos (processo,
+    início, fim), em dias desde 1970, ordenados por processo e início.
+    """
+    pid, starts, ends = [], [], []
+    for row, text in enumerate(texts):
+        for part in text.replace("|", ";").split(";"):
+            part = part.strip()
+            if not part:
+                continue
+            bounds = part.replace(" até ", " a ").split(" a ")
+            if len(bounds) != 2:
+                raise ValueError(f"Suspensão inválida na linha {row + 2}: '{part}' (use 'início a fim').")
+            pid.append(row)
+            starts.append(bounds[0].strip())
+            ends.append(bounds[1].strip())
+    pid = np.array(pid, dtype=np.int64)
+    a, b = _parse_dates(starts, pid), _parse_dates(ends, pid)
+    if ((a < 0) | (b < 0)).any():
+        raise ValueError(f"Suspensão incompleta (linhas {_lines((a < 0) | (b < 0), pid)}).")
+    if (b < a).any():
+        raise ValueError(f"Suspensão com fim anterior ao início (linhas {_lines(b < a, pid)}).")
+    # Como no SuspensionIndex: funde os períodos que se sobrepõem ou tocam
+    order = np.lexsort((a, pid))
+    pid, a, b = pid[order], a[order], b[order]
+    if not len(pid):
+        return pid, a, b
+    span = int(b.max() - a.min()) + 2
+    shift = (pid - pid[0]) * span                       # Acumulado por processo, sem ciclo
+    reach = np.maximum.accumulate(b - a.min() + shift) - shift + a.min()
+    new = np.ones(len(pid), dtype=bool)
+    new[1:] = (pid[1:] != pid[:-1]) | (a[1:] > reach[:-1] + 1)
+    first = np.flatnonzero(new)
+    return pid[first], a[first], np.maximum.reduceat(b, first)
+
+def _normalise(df):
+    """Valida as colunas e devolve-as convertidas (datas em dias desde 1970, prazos em dias úteis)."""
+    missing = [c for c in PORTFOLIO_REQUIRED if c not in df.columns]
+    if missing:
+        raise ValueError(f"Faltam colunas obrigatórias: {', '.join(missing)}.")
+    start = _parse_dates(df["data_inicio"])
+    if (start < 0).any():
+        raise ValueError(f"Processos sem data de instrução (linhas {_lines(start < 0)}).")
+    regime = pd.to_numeric(df["regime"], errors="coerce").to_numpy()
+    valid = np.isin(regime, list(REGIME_DEFAULTS))
+    if not valid.all():
+        raise ValueError(f"Regime inválido (linhas {_lines(~valid)}): use 150 ou 90.")
+    days = {}
+    for column, key in PORTFOLIO_DAYS.items():
+        default = np.where(regime == 150, REGIME_DEFAULTS[150][key], REGIME_DEFAULTS[90][key])
+        if column in df.columns:
+            value = pd.to_numeric(df[column].replace("", np.nan), errors="coerce").to_numpy(dtype=float)
+            days[key] = np.where(np.isnan(value), default, value).astype(np.int64)
+        else:
+            days[key] = default.astype(np.int64)
+    pea = _parse_dates(df["data_pea"]) if "data_pea" in df.columns else np.full(len(df), -1)
+    return start, regime, days, pea, _parse_suspensions(_text_column(df, "suspensoes"))
+
+def _offset(cum, i, n):
+    """Índices do n-ésimo dia útil depois de i (i se n <= 0), sem arredondar."""
+    j = np.searchsorted(cum, cum[i] + np.maximum(n, 0), side="left")
+    if (j >= len(cum)).any():
+        raise _Overflow
+    return np.where(n > 0, j, i)
+
+def _roll(business, cum, i):
+    """O próprio índice, se for dia útil; senão o do dia útil seguinte."""
+    nxt = np.searchsorted(cum, cum[i] + 1, side="left")
+    if (nxt >= len(cum)).any():
+        raise _Overflow
+    return np.where(business[i], i, nxt)
+
+def _suspended_deadline(cum, business, s, n, pid, ia, ib):
+    """
+    Prazos com suspensões por ponto fixo: avança n dias úteis, soma os dias
+    úteis suspensos pelo caminho e volta a avançar até o total estabilizar
+    (no máximo uma ronda por período de suspensão).
+    """
+    i = _offset(cum, s, n)
+    if len(pid):
+        while True:
+            lo = np.maximum(ia, s[pid] + 1)
+            hi = np.minimum(ib, i[pid])
+            part = np.where(hi >= lo, cum[np.maximum(hi, 0)] - cum[np.maximum(lo, 1) - 1], 0)
+            suspended = np.bincount(pid, weights=part, minlength=len(s)).astype(np.int64)
+            j = _offset(cum, s, np.where(n > 0, n + suspended, 0))
+            if (j == i).all():
+                break
+            i = j
+    return _roll(business, cum, i)
+
+def _workflow_arrays(business, cum, s, days, pea, last_end, pid, ia, ib):
+    """Datas de calculate_workflow (índices no calendário) para todos os processos de uma vez."""
+    deadline = lambda n: _suspended_deadline(cum, business, s, n, pid, ia, ib)
+    plain = lambda i, n: _roll(business, cum, _offset(cum, i, n))
+    fixed = lambda n: np.full(len(s), n)
+
+    out = {label: deadline(days[key]) for label, key in MILESTONES}
+
+    # Com PEA e suspensões, a conformidade conta o que restava no PEA a partir do fim da última suspensão
+    with_pea = (pea >= 0) & (last_end >= 0)
+    if with_pea.any():
+        spent = np.where(pea > s + 1, cum[np.clip(pea - 1, 0, None)] - cum[s], 0)
+        remaining = np.where(with_pea, np.maximum(days["conformidade"] - spent, 0), 0)
+        from_pea = plain(np.where(with_pea, last_end, s), remaining)
+        out["Limite Conformidade"] = np.where(with_pea, from_pea, out["Limite Conformidade"])
+
+    cp_start = _offset(cum, out["Limite Conformidade"], fixed(5))
+    cp_end = _offset(cum, cp_start, days["cp_duration"])
+    out["1. Conformidade (Ref. Teórica)"] = plain(s, days["conformidade"])
+    out["2. Início Consulta Pública"] = cp_start
+    out["3. Fim Consulta Pública"] = cp_end
+    out["4. Data Pareceres Externos"] = _offset(cum, cp_start, fixed(23))
+    out["5. Envio Relatório CP"] = _offset(cum, cp_end, fixed(7))
+    out["6. Visita Técnica"] = _offset(cum, cp_start, days["visita"])
+    out["7. Pareceres Setoriais"] = deadline(days["setoriais"])
+    return out
+
+def _group_dates(holidays, start, days, pea, pid, ia, ib):
+    """Datas (dias desde 1970) de um grupo de processos com os mesmos feriados."""
+    last_end = np.full(len(start), -1, dtype=np.int64)
+    np.maximum.at(last_end, pid, ib)
+    susp_days = np.bincount(pid, weights=ib - ia + 1, minlength=len(start))
+    longest = max(int(v.max(initial=0)) for v in days.values())
+    first = int(min(start.min(), last_end[last_end >= 0].min(initial=start.min()))) - CALENDAR_MARGIN
+    horizon = int(max(start.max(), last_end.max(), pea.max())) + int(susp_days.max(initial=0)) + 3 * longest + 400
+    cal = calendar(holidays)
+    while True:
+        with cal._lock:
+            cal._index(date.fromordinal(first + _EPOCH))
+            cal._index(date.fromordinal(horizon + _EPOCH))
+            base = cal._base - _EPOCH
+            business, cum = cal._business, cal._cum_business
+        rel = lambda x: np.where(x >= 0, x - base, -1)
+        try:
+            dates = _workflow_arrays(business, cum, start - base, days, rel(pea), rel(last_end),
+                                     pid, ia - base, ib - base)
+        except _Overflow:
+            horizon += 3 * longest + 400
+            continue
+        return {label: idx + base for label, idx in dates.items()}
+
+def portfolio_deadlines(df, holidays=None, today=None):
+    """
+    Prazos de uma carteira de processos (ver PORTFOLIO_COLUMNS), numa
+    passagem vetorizada por conjunto de feriados. Devolve um DataFrame com
+    as datas das fases principais e complementares (as mesmas de
+    calculate_workflow), o total de suspensão e, com `today`, o próximo
+    prazo de cada processo.
+    `holidays` aplica-se aos processos sem região/município indicados.
+    """
+    df = df.reset_index(drop=True)
+    n = len(df)
+    start, regime, days, pea, (pid, ia, ib) = _normalise(df)
+    region, municipality = _text_column(df, "regiao"), _text_column(df, "municipio")
+    unknown = sorted(set(region[(region != "") & ~region.isin(list(REGIONAL_HOLIDAYS))])
+                     | set(municipality[(municipality != "") & ~municipality.isin(list(MUNICIPAL_HOLIDAYS))]))
+    if unknown:
+        raise ValueError(f"Região/município sem calendário de feriados: {', '.join(unknown)}.")
+
+    columns = {}
+    local = np.full(n, -1, dtype=np.int64)
+    for (reg, mun), rows in pd.DataFrame({"r": region, "m": municipality}).groupby(["r", "m"]).indices.items():
+        cal = holiday_calendar(reg, mun or None) if reg or mun else (holidays or holiday_calendar())
+        local[:] = -1
+        local[rows] = np.arange(len(rows))
+        mine = local[pid] >= 0
+        dates = _group_dates(cal, start[rows], {k: v[rows] for k, v in days.items()}, pea[rows],
+                             local[pid[mine]], ia[mine], ib[mine])
+        for label, values in dates.items():
+            columns.setdefault(label, np.zeros(n, dtype=np.int64))[rows] = values
+
+    out = pd.DataFrame({"Processo": df["processo"], "Regime": regime.astype(int),
+                        "Data de Instrução": start.astype("datetime64[D]")})
+    for label, values in columns.items():
+        out[label] = values.astype("datetime64[D]")
+    out["Suspensões (dias)"] = np.bincount(pid, weights=ib - ia + 1, minlength=n).astype(int)
+
+    if today is not None:
+        labels = np.array(list(columns), dtype=object)
+        matrix = np.stack(list(columns.values()), axis=1)
+        now = today.toordinal() - _EPOCH
+        pending = np.where(matrix >= now, matrix, np.iinfo(np.int64).max)
+        nearest = pending.argmin(axis=1)
+        has_next = (matrix >= now).any(axis=1)
+        chosen = matrix[np.arange(n), nearest]
+        out[NEXT_LABEL] = np.where(has_next, labels[nearest], "—")
+        out[NEXT_DATE] = pd.Series(chosen.astype("datetime64[D]")).where(has_next)
+        out[NEXT_DAYS] = pd.Series(chosen - now).where(has_next).astype("Int64")
+    return out
+
+# ==========================================
+# --- 7. VERIFICAÇÃO ---
+# ==========================================
+
+def _loop_add_business_days(start_date, num_days, holidays_set):
+    current_date = start_date
+    added_days = 0
+    while added_days < num_days:
+        current_date += timedelta(days=1)
+        if is_business_day(current_date, holidays_set):
+            added_days += 1
+    return current_date
+
+def _loop_deadline(start_date, target_business_days, suspensions, holidays_set):
+    # Contagem original: percorre a lista de suspensões em cada dia
+    current_date = start_date
+    days_counted = 0
+    while days_counted < target_business_days:
+        current_date += timedelta(days=1)
+        if not is_suspended(current_date, suspensions) and is_business_day(current_date, holidays_set):
+            days_counted += 1
+    while not is_business_day(current_date, holidays_set):
+        current_date += timedelta(days=1)
+    return current_date
+
+def check(samples=20000, seed=0):
+    """
+    Compara o BusinessCalendar com a contagem dia a dia em casos aleatórios
+    (datas de 2000 a 2060, 0 a 200 dias, 0 a 6 suspensões, sobrepostas ou
+    não, com os feriados do cálculo original ou com um HolidayCalendar de
+    uma região/município ao acaso), o SuspensionIndex com a lista de
+    períodos, o bitmap nacional com get_holidays_for_year e, numa carteira
+    de samples/20 processos, portfolio_deadlines com calculate_workflow (e
+    o AuditLog com deadline_log).
+    Devolve a lista de divergências (vazia se tudo coincide).
+    """
+    rnd = random.Random(seed)
+    mismatches = []
+    national = holiday_calendar()
+    expected = get_holidays_range(1900, 2200)
+    if national.dates(1900, 2200) != expected:
+        mismatches.append(("feriados", 1900, 2200, [], len(expected), len(national.dates(1900, 2200))))
+    for _ in range(samples):
+        start = date(2000, 1, 1) + timedelta(days=rnd.randrange(60 * 365))
+        n = rnd.randrange(201)
+        if rnd.random() < 0.5:
+            holidays = get_holidays_range(start.year, start.year + 2)
+        else:
+            holidays = holiday_calendar(rnd.choice(list(REGIONAL_HOLIDAYS)),
+                                        rnd.choice([None, *MUNICIPAL_HOLIDAYS]))
+        suspensions = []
+        for _ in range(rnd.choice((0, 0, 1, 2, 6))):
+            a = start + timedelta(days=rnd.randrange(-30, 300))
+            suspensions.append({'start': a, 'end': a + timedelta(days=rnd.randrange(60))})
+        expected = _loop_deadline(start, n, suspensions, holidays)
+        for got in (deadline_log(start, n, suspensions, holidays)[0],
+                    calculate_deadline_rigorous(start, n, suspensions, holidays)):
+            if got != expected:
+                mismatches.append(("prazo", start, n, suspensions, expected, got))
+        index = suspension_index(suspensions)
+        a = start + timedelta(days=rnd.randrange(-40, 200))
+        b = a + timedelta(days=rnd.randrange(-5, 200))
+        days = [a + timedelta(days=k) for k in range((b - a).days + 1)]
+        expected = (sum(1 for d in days if is_suspended(d, suspensions) and is_business_day(d, holidays)),
+                    [is_suspended(d, suspensions) for d in days],
+                    len({s['start'] + timedelta(days=k) for s in suspensions for k in range((s['end'] - s['start']).days + 1)}))
+        got = (index.business_days(a, b, holidays), [d in index for d in days], index.total_days())
+        if got != expected:
+            mismatches.append(("suspensões", a, b, suspensions, expected[0::2], got[0::2]))
+        expected = _loop_add_business_days(start, n, holidays)
+        got = add_business_days(start, n, holidays)
+        if got != expected:
+            mismatches.append(("dias úteis", start, n, [], expected, got))
+        end = start + timedelta(days=rnd.randrange(-5, 400))
+        expected = sum(1 for k in range(1, (end - start).days) if is_business_day(start + timedelta(days=k), holidays))
+        got = calendar(holidays).business_days_between(start, end)
+        if got != expected:
+            mismatches.append(("contagem", start, end, [], expected, got))
+    mismatches.extend(_check_portfolio(rnd, max(samples // 20, 1)))
+    return mismatches
+
+def _check_portfolio(rnd, size):
+    """portfolio_deadlines contra calculate_workflow, processo a processo."""
+    rows, cases = [], []
+    for k in range(size):
+        start = date(2000, 1, 1) + timedelta(days=rnd.randrange(60 * 365))
+        regime = rnd.choice((150, 90))
+        config = dict(REGIME_DEFAULTS[regime], cp_duration=rnd.randrange(40))
+        suspensions = []
+        for _ in range(rnd.choice((0, 0, 1, 2, 5))):
+            a = start + timedelta(days=rnd.randrange(-20, 250))
+            suspensions.append({'start': a, 'end': a + timedelta(days=rnd.randrange(40))})
+        pea = start + timedelta(days=rnd.randrange(1, 60)) if rnd.random() < 0.3 else None
+        municipality = rnd.choice([None, None, *MUNICIPAL_HOLIDAYS])
+        rows.append({"processo": k, "data_inicio": start.strftime("%d/%m/%Y"), "regime": str(regime),
+                     "cp_duracao": str(config["cp_duration"]), "data_pea": str(pea or ""),
+                     "suspensoes": "; ".join(f"{s['start']} a {s['end']}" for s in suspensions),
+                     "municipio": municipality or ""})
+        cases.append((start, suspensions, config, pea, holiday_calendar(municipality=municipality)))
+    out = portfolio_deadlines(pd.DataFrame(rows))
+    mismatches = []
+    for k, (start, suspensions, config, pea, holidays) in enumerate(cases):
+        milestones, complementary, total, log, _ = calculate_workflow(start, suspensions, config, pea, holidays)
+        if k % 10 == 0 and list(log) != deadline_log(start, config["dia"], suspensions, holidays)[1]:
+            mismatches.append(("registo", start, config["dia"], suspensions, len(log), None))
+        expected = {m["Etapa"]: m["Data Prevista"] for m in milestones}
+        expected.update({c["Etapa"]: c["Data"] for c in complementary if c["Etapa"] in out.columns})
+        expected["Suspensões (dias)"] = total
+        got = {label: out.at[k, label] for label in expected}
+        got = {label: v.date() if hasattr(v, "date") else v for label, v in got.items()}
+        if got != expected:
+            mismatches.append(("carteira", start, config["cp_duration"], suspensions, expected, got))
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Motor de prazos AIA.")
+    parser.add_argument("--check", action="store_true", help="Compara o calendário vetorizado com a contagem dia a dia.")
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--portfolio", metavar="CSV", help="Calcula os prazos de uma carteira de processos.")
+    parser.add_argument("--out", metavar="CSV", help="Ficheiro de saída da carteira (por omissão, o ecrã).")
+    args = parser.parse_args()
+    if args.portfolio:
+        result = portfolio_deadlines(read_portfolio(args.portfolio), today=date.today())
+        if args.out:
+            result.to_csv(args.out, index=False, encoding="utf-8-sig")
+        else:
+            print(result.to_string(index=False))
+        raise SystemExit(0)
+    if args.check:
+        bad = check(args.samples, args.seed)
+        for m in bad[:20]:
+            print("DIVERGÊNCIA", *m)
+        print(f"{args.samples} casos, {len(bad)} divergências")
+        raise SystemExit(1 if bad else 0)
+    parser.print_help()
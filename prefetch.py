@@ -0,0 +1,133 @@
+"""
+Leitura especulativa dos PDFs logo após o upload.
+
+Os ficheiros costumam ser carregados minutos antes de o utilizador carregar
+no botão, mas a extração só começava nesse momento. As páginas chamam
+extract() (e, no Auditor EIA em modo de volumes em anexo, upload()) logo a
+seguir aos file_uploader: cada PDF novo é extraído num pool de threads do
+servidor e o texto fica na cache em disco (pdf_cache.py), pelo SHA-256 do
+conteúdo. Quando o botão é premido, a extração normal encontra o texto na
+cache e a análise segue diretamente para o modelo.
+
+Os uploads para a File API ficam registados em file_registry.py, também
+pelo hash, e são reutilizados pela auditoria. wait() aguarda as tarefas
+ainda em curso para os mesmos ficheiros, para que o mesmo PDF nunca seja
+lido duas vezes em simultâneo.
+
+Desativa-se com SUPERAPP_PREFETCH=0.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as _wait_futures
+
+import pdf_cache
+import pdf_extract
+import file_registry
+import gemini_client
+import jobs
+
+# --- 1. CONFIGURAÇÃO ---
+ENABLED = os.environ.get("SUPERAPP_PREFETCH", "1") != "0"
+MAX_WORKERS = int(os.environ.get("SUPERAPP_PREFETCH_WORKERS", "2"))
+MAX_DIGESTS = 512   # Hashes memorizados por file_id (evita reler os bytes em cada rerun)
+
+_pool = None
+_lock = threading.Lock()
+_tasks = {}     # ("text", hash) / ("file", api_key, hash) -> Future
+_digests = {}   # file_id do Streamlit -> SHA-256
+
+# ==========================================
+# --- 2. TAREFAS EM CURSO ---
+# ==========================================
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="superapp-prefetch")
+        return _pool
+
+def _digest(f):
+    file_id = getattr(f, "file_id", None)
+    with _lock:
+        digest = _digests.get(file_id) if file_id else None
+    if digest is None:
+        digest = pdf_cache.file_digest(f)
+        if file_id:
+            with _lock:
+                if len(_digests) >= MAX_DIGESTS:
+                    _digests.clear()
+                _digests[file_id] = digest
+    return digest
+
+def digests(files):
+    """SHA-256 de cada ficheiro (memorizado por file_id nos ficheiros carregados)."""
+    return [_digest(f) for f in files or [] if f is not None]
+
+def _submit(key, fn, *args, snapshot=None):
+    """
+    Agenda fn(*args, snap) se ainda não houver tarefa para `key`. O snapshot
+    (cópia dos bytes) só é criado quando a tarefa é mesmo submetida: num
+    rerun com a extração ainda em curso, o ficheiro não volta a ser copiado.
+    """
+    pool = _get_pool()
+    with _lock:
+        # Tarefas concluídas já deixaram o resultado na cache/registo
+        for k in [k for k, fut in _tasks.items() if fut.done()]:
+            del _tasks[k]
+        if key in _tasks:
+            return
+    snap = snapshot()   # Fora do lock: copiar um volume grande não bloqueia as outras sessões
+    with _lock:
+        if key not in _tasks:
+            _tasks[key] = pool.submit(fn, *args, snap)
+
+def _new_files(files, done):
+    """(ficheiro, hash) dos ficheiros para os quais done(hash) é falso."""
+    out = []
+    for f in files or []:
+        if f is None:
+            continue
+        digest = _digest(f)
+        if not done(digest):
+            out.append((f, digest))
+    return out
+
+# ==========================================
+# --- 3. TAREFAS ---
+# ==========================================
+
+def _extract(snap):
+    try:
+        pdf_extract.extract_document(snap)
+    except Exception:
+        pass  # PDF ilegível: o erro é reportado pela análise, como antes
+
+def _upload(api_key, snap):
+    try:
+        file_registry.ensure_uploaded(gemini_client.get_client(api_key), snap)
+    except Exception:
+        pass  # A auditoria volta a tentar e reporta o erro
+
+def extract(files):
+    """Inicia a extração em segundo plano dos PDFs que ainda não estão na cache."""
+    if not ENABLED:
+        return
+    for f, digest in _new_files(files, pdf_cache.contains):
+        # Cópia dos bytes (só se a tarefa for nova): o UploadedFile pertence à sessão
+        _submit(("text", digest), _extract, snapshot=lambda f=f, d=digest: jobs.FileSnapshot(f, d))
+
+def upload(api_key, files):
+    """Inicia o envio para a File API dos PDFs sem upload registado para esta API key."""
+    if not (ENABLED and api_key):
+        return
+    for f, digest in _new_files(files, lambda d: file_registry.lookup(api_key, d)):
+        _submit(("file", api_key, digest), _upload, api_key, snapshot=lambda f=f, d=digest: jobs.FileSnapshot(f, d))
+
+def wait(file_digests, timeout=None):
+    """Aguarda as extrações e uploads especulativos ainda em curso para estes hashes."""
+    wanted = set(file_digests or ())
+    with _lock:
+        futures = [fut for key, fut in _tasks.items() if key[-1] in wanted]
+    if futures:
+        _wait_futures(futures, timeout=timeout)
@@ -0,0 +1,184 @@
+"""
+Limitador de pedidos à API Gemini, partilhado por todas as sessões.
+
+Cada par (API key, modelo) tem dois baldes de fichas (token bucket): um de
+pedidos por minuto (RPM) e outro de tokens de entrada por minuto (TPM).
+Antes de cada pedido, acquire() espera até haver fichas nos dois. Quando o
+servidor responde 429/503, backoff() calcula a espera — o retry_delay
+indicado pelo servidor, se existir, ou backoff exponencial com jitter — e
+bloqueia o par para TODAS as sessões durante esse tempo, em vez de cada
+uma insistir por sua conta. Após um 429 o ritmo desce para metade e vai
+recuperando a cada pedido bem-sucedido (AIMD).
+
+Por omissão o estado vive na memória do processo. Com
+SUPERAPP_RATE_SHARED=1 fica numa base SQLite em CACHE_ROOT, partilhada por
+vários processos/servidores no mesmo disco.
+"""
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+import pdf_cache
+
+# --- 1. CONFIGURAÇÃO ---
+# (padrão no nome do modelo, pedidos/min, tokens de entrada/min); o primeiro que corresponde ganha
+DEFAULT_LIMITS = [
+    ("flash-lite", 30, 1_000_000),
+    ("flash", 15, 1_000_000),
+    ("pro", 5, 250_000),
+]
+FALLBACK_LIMITS = (10, 250_000)
+RPM_OVERRIDE = int(os.environ.get("SUPERAPP_RATE_RPM", "0"))
+TPM_OVERRIDE = int(os.environ.get("SUPERAPP_RATE_TPM", "0"))
+SHARED = os.environ.get("SUPERAPP_RATE_SHARED", "0") == "1"
+DB_PATH = os.path.join(pdf_cache.CACHE_ROOT, "rate_limits.sqlite")
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 2.0        # Segundos (1.ª tentativa); duplica a cada falha
+BACKOFF_MAX = 120.0
+MIN_FACTOR = 0.1          # O ritmo nunca desce abaixo de 10% do limite
+RECOVERY_STEP = 0.05      # Recuperação do ritmo por pedido bem-sucedido
+SLEEP_SLICE = 5.0         # Espera máxima de uma vez (o estado é revisto entre esperas)
+
+_RETRY_IN = re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE)
+_RETRY_DELAY = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE)
+
+
+def limits(model_name):
+    """(pedidos/min, tokens/min) para o modelo."""
+    name = (model_name or "").lower()
+    rpm, tpm = next(((r, t) for key, r, t in DEFAULT_LIMITS if key in name), FALLBACK_LIMITS)
+    return RPM_OVERRIDE or rpm, TPM_OVERRIDE or tpm
+
+def _bucket_key(api_key, model_name):
+    # A chave nunca é guardada em claro (nem em memória partilhada nem em disco)
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16] + "|" + model_name
+
+# ==========================================
+# --- 2. ESTADO (MEMÓRIA OU SQLITE) ---
+# ==========================================
+
+def _new_state(rpm, tpm):
+    return {"req": float(rpm), "tok": float(tpm), "ts": time.time(), "blocked": 0.0, "factor": 1.0}
+
+_states = {}
+_states_lock = threading.Lock()
+
+@contextmanager
+def _memory_state(key, rpm, tpm):
+    with _states_lock:
+        state = _states.get(key)
+        if state is None:
+            state = _states[key] = _new_state(rpm, tpm)
+        yield state
+
+@contextmanager
+def _shared_state(key, rpm, tpm):
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, state TEXT)")
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT state FROM buckets WHERE key = ?", (key,)).fetchone()
+        state = json.loads(row[0]) if row else _new_state(rpm, tpm)
+        yield state
+        conn.execute("INSERT OR REPLACE INTO buckets (key, state) VALUES (?, ?)", (key, json.dumps(state)))
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def _state(api_key, model_name):
+    rpm, tpm = limits(model_name)
+    key = _bucket_key(api_key, model_name)
+    return (_shared_state if SHARED else _memory_state)(key, rpm, tpm)
+
+def _refill(state, rpm, tpm, now):
+    rate = state["factor"] / 60.0
+    elapsed = max(0.0, now - state["ts"])
+    state["req"] = min(rpm * state["factor"], state["req"] + elapsed * rpm * rate)
+    state["tok"] = min(tpm * state["factor"], state["tok"] + elapsed * tpm * rate)
+    state["ts"] = now
+
+# ==========================================
+# --- 3. INTERFACE PÚBLICA ---
+# ==========================================
+
+def acquire(api_key, model_name, tokens=0, on_wait=None):
+    """
+    Espera até o par (chave, modelo) ter capacidade para um pedido de
+    `tokens` tokens de entrada e consome-a. on_wait(segundos) é chamado
+    antes de cada espera igual ou superior a 1 s.
+    """
+    rpm, tpm = limits(model_name)
+    tokens = min(tokens, tpm)  # Um pedido maior que o TPM nunca caberia no balde
+    while True:
+        with _state(api_key, model_name) as state:
+            now = time.time()
+            _refill(state, rpm, tpm, now)
+            wait = state["blocked"] - now
+            if wait <= 0:
+                per_sec = state["factor"] / 60.0
+                wait = max((1 - state["req"]) / (rpm * per_sec), (tokens - state["tok"]) / (tpm * per_sec), 0.0)
+                if wait <= 0:
+                    state["req"] -= 1
+                    state["tok"] -= tokens
+                    return
+        if on_wait and wait >= 1:
+            on_wait(wait)
+        time.sleep(min(wait, SLEEP_SLICE))
+
+def is_retryable(exc):
+    """Erros de quota (429) ou de sobrecarga temporária (503)."""
+    if getattr(exc, "code", None) in (429, 503):
+        return True
+    msg = str(exc).lower()
+    return "429" in msg or "quota" in msg or "resource exhausted" in msg or "503" in msg or "overloaded" in msg
+
+def retry_hint(exc):
+    """Espera (s) sugerida pelo servidor (RetryInfo / mensagem), ou None."""
+    for detail in getattr(exc, "details", None) or ():
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and getattr(delay, "seconds", None) is not None:
+            return delay.seconds + getattr(delay, "nanos", 0) / 1e9
+    msg = str(exc)
+    m = _RETRY_IN.search(msg) or _RETRY_DELAY.search(msg)
+    return float(m.group(1)) if m else None
+
+def backoff(api_key, model_name, exc, attempt):
+    """
+    Depois de um erro: devolve a espera (s) antes de nova tentativa, ou None
+    se o erro não é recuperável ou as tentativas se esgotaram. A espera é
+    aplicada ao par (chave, modelo) para todas as sessões.
+    """
+    if attempt >= MAX_RETRIES or not is_retryable(exc):
+        return None
+    hint = retry_hint(exc)
+    if hint is not None:
+        delay = hint + random.uniform(0, 1 + 0.1 * hint)
+    else:
+        delay = random.uniform(BACKOFF_BASE, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt + 1)))
+    with _state(api_key, model_name) as state:
+        state["blocked"] = max(state["blocked"], time.time() + delay)
+        if getattr(exc, "code", None) != 503:
+            state["factor"] = max(MIN_FACTOR, state["factor"] * 0.5)
+    return delay
+
+def record_success(api_key, model_name):
+    with _state(api_key, model_name) as state:
+        if state["factor"] < 1.0:
+            state["factor"] = min(1.0, state["factor"] + RECOVERY_STEP)
+
+def reset():
+    """Esquece o estado em memória (o partilhado expira sozinho com o refill)."""
+    with _states_lock:
+        _states.clear()
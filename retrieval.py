@@ -0,0 +1,137 @@
+"""
+Recuperação local de páginas (BM25) para montar prompts focados.
+
+Em vez de colar todas as páginas de todos os PDFs no prompt, cada secção do
+relatório (p.ex. "Fauna/Flora", "Distância à Rede Natura 2000") recebe só
+as k páginas mais relevantes, mantendo a citação original [DOC: x | PÁG. n].
+O índice é um índice invertido em memória, sem dependências externas.
+"""
+import re
+import math
+import heapq
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+
+# --- 1. CONFIGURAÇÃO ---
+DEFAULT_K = 4                 # Páginas por secção
+FULL_TEXT_MAX_BYTES = 120000  # Abaixo disto compensa enviar o corpus completo
+
+_STOPWORDS = set("""
+a ao aos as até com como da das de dela dele deles do dos e é ela elas ele eles em entre era
+essa esse esta este estas estes eu foi for há isso isto já la lhe mais mas me mesmo muito na
+nas nem no nos num numa o os ou para pela pelas pelo pelos por qual quando que quem se sem ser
+seu seus sua suas são só também te tem ter um uma umas uns à às nao não sobre após cada onde
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# ==========================================
+# --- 2. NORMALIZAÇÃO ---
+# ==========================================
+
+def _fold(text):
+    """Minúsculas e sem acentos ("Conservação" -> "conservacao")."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return text.encode("ascii", "ignore").decode("ascii")
+
+def _stem(tok):
+    # Redução leve do plural/flexão mais comum em português
+    if len(tok) > 5 and tok.endswith("mente"):
+        return tok[:-5]
+    if len(tok) > 4 and tok.endswith(("oes", "aes")):
+        return tok[:-3] + "ao"
+    if len(tok) > 4 and tok.endswith("is"):
+        return tok[:-2] + "l"
+    if len(tok) > 3 and tok.endswith("s"):
+        return tok[:-1]
+    return tok
+
+_STOP_FOLDED = {_fold(w) for w in _STOPWORDS}
+
+def tokenize(text):
+    return [_stem(t) for t in _TOKEN_RE.findall(_fold(text)) if t not in _STOP_FOLDED and len(t) > 1]
+
+# ==========================================
+# --- 3. ÍNDICE BM25 ---
+# ==========================================
+
+class BM25Index:
+    """Índice invertido sobre as páginas de um ou mais Documents."""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.pages = []
+        self._lengths = array("I")
+        self._postings = defaultdict(list)  # termo -> [(id da página, tf)]
+
+    def add_document(self, doc):
+        for page in doc:
+            counts = Counter(tokenize(page.text))
+            pid = len(self.pages)
+            self.pages.append(page)
+            self._lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings[term].append((pid, tf))
+        return self
+
+    def __len__(self):
+        return len(self.pages)
+
+    def search(self, query, k=DEFAULT_K):
+        """Devolve [(pontuação, Page)] das k páginas mais relevantes."""
+        n = len(self.pages)
+        if not n:
+            return []
+        avgdl = (sum(self._lengths) / n) or 1.0
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for pid, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[pid] / avgdl)
+                scores[pid] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+        return [(score, self.pages[pid]) for pid, score in best]
+
+# ==========================================
+# --- 4. MONTAGEM DO CONTEXTO ---
+# ==========================================
+
+def corpus_bytes(docs):
+    return sum(d.nbytes for d in docs)
+
+def build_focused_context(docs, sections, k=DEFAULT_K, blank="", simple_citation=False, index=None):
+    """
+    Texto do prompt com as páginas mais relevantes por secção.
+    `sections` = {título da secção: consulta}. Cada página é transcrita uma
+    única vez (na primeira secção que a seleciona); nas seguintes fica só a
+    referência, para o modelo poder citá-la.
+    """
+    if index is None:
+        index = BM25Index()
+        for doc in docs:
+            index.add_document(doc)
+
+    seen = set()
+    parts = []
+    for title, query in sections.items():
+        hits = index.search(query, k)
+        parts.append(f"\n\n##### EXCERTOS RELEVANTES: {title} #####\n")
+        if not hits:
+            parts.append("(Sem páginas relevantes encontradas.)\n")
+            continue
+        # Ordem do documento, para o modelo ler as páginas em sequência
+        hits.sort(key=lambda h: (h[1].doc.name, h[1].index))
+        for _, page in hits:
+            key = (page.doc.digest or page.doc.name, page.index)
+            citation = page.citation(simple_citation)
+            if key in seen:
+                parts.append(f"\n{citation} (transcrita acima)\n")
+                continue
+            seen.add(key)
+            parts.append(f"\n{citation}\n{page.text or blank}\n")
+    return "".join(parts)
@@ -0,0 +1,221 @@
+"""
+Instrumentação por etapa das análises.
+
+Os passos do st.status ("A ler documentos", "A realizar Auditoria", ...)
+não diziam se uma análise lenta se devia à leitura dos PDFs, ao tamanho do
+prompt, à espera pela quota ou ao modelo. Cada análise tem agora um Trace
+com as suas etapas: tempo de relógio, páginas e bytes lidos, tokens de
+entrada e de saída (estimados), novas tentativas, acertos na cache e
+segundos de espera imposta pelo limitador.
+
+As etapas ficam numa base SQLite em CACHE_ROOT (telemetry.sqlite), ligadas
+ao ID do trabalho, e — com SUPERAPP_TELEMETRY_JSONL=caminho — também num
+ficheiro JSONL, uma linha por etapa, para análise externa. As páginas
+mostram-nas numa tabela recolhida por baixo de cada resultado.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pdf_cache
+
+# --- 1. CONFIGURAÇÃO ---
+DB_PATH = os.path.join(pdf_cache.CACHE_ROOT, "telemetry.sqlite")
+JSONL_PATH = os.environ.get("SUPERAPP_TELEMETRY_JSONL", "")
+ENABLED = os.environ.get("SUPERAPP_TELEMETRY", "1") != "0"
+KEEP_DAYS = float(os.environ.get("SUPERAPP_TELEMETRY_KEEP_DAYS", "30"))
+
+COUNTERS = ("pages", "bytes", "tokens_in", "tokens_out", "retries", "cache_hits", "wait_s")
+
+# Cabeçalhos da tabela mostrada nas páginas
+LABELS = {
+    "stage": "Etapa",
+    "seconds": "Tempo (s)",
+    "pages": "Páginas",
+    "bytes": "Bytes",
+    "tokens_in": "Tokens entrada",
+    "tokens_out": "Tokens saída",
+    "retries": "Novas tentativas",
+    "cache_hits": "Acertos cache",
+    "wait_s": "Espera quota (s)",
+    "error": "Erro",
+}
+
+# ==========================================
+# --- 2. ETAPAS ---
+# ==========================================
+
+class Stage:
+    """Uma etapa em curso; add() é seguro entre threads (p.ex. as partes do map)."""
+
+    def __init__(self, name, seconds=0.0):
+        self.name = name
+        self.started = time.time()
+        self.seconds = seconds
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.counts[key] = self.counts.get(key, 0) + value
+        return self
+
+    def as_dict(self):
+        with self._lock:
+            return {"stage": self.name, "started": self.started, "seconds": round(self.seconds, 3),
+                    **self.counts, "error": self.error}
+
+
+class Trace:
+    """
+    Etapas de uma análise. Enquanto não tem ID (a página ainda está a
+    preparar os textos e o trabalho não foi criado) as etapas ficam em
+    memória; bind() grava-as e as seguintes são gravadas logo.
+    """
+
+    def __init__(self, kind, run_id=None):
+        self.kind = kind
+        self.run_id = None
+        self.stages = []
+        self._lock = threading.Lock()
+        if run_id:
+            self.bind(run_id)
+
+    def bind(self, run_id):
+        with self._lock:
+            self.run_id = run_id
+            pending = list(self.stages)
+        for stage in pending:
+            _store(self, stage)
+        return self
+
+    def branch(self, kind=None):
+        """Novo Trace com as etapas já medidas (p.ex. preparação comum a dois trabalhos)."""
+        other = Trace(kind or self.kind)
+        with self._lock:
+            other.stages = list(self.stages)
+        return other
+
+    def record(self, stage):
+        with self._lock:
+            self.stages.append(stage)
+            run_id = self.run_id
+        if run_id:
+            _store(self, stage)
+
+    def add(self, name, seconds, **counts):
+        """Etapa já medida noutro sítio (p.ex. o tempo em fila de um trabalho)."""
+        self.record(Stage(name, seconds).add(**counts))
+
+    @contextmanager
+    def stage(self, name, **counts):
+        stage = Stage(name).add(**counts)
+        start = time.perf_counter()
+        try:
+            yield stage
+        except BaseException as e:
+            stage.error = e.__class__.__name__
+            raise
+        finally:
+            stage.seconds = time.perf_counter() - start
+            self.record(stage)
+
+
+def of(progress):
+    """Trace do objeto de progresso (um jobs.Job), ou um Trace que não é gravado."""
+    return getattr(progress, "trace", None) or Trace(None)
+
+def doc_stats(docs):
+    """Páginas e bytes de texto extraídos de Documents."""
+    docs = [d for d in docs or [] if d is not None]
+    return {"pages": sum(len(d) for d in docs), "bytes": sum(d.nbytes for d in docs)}
+
+# ==========================================
+# --- 3. ARMAZENAMENTO ---
+# ==========================================
+
+_db_lock = threading.Lock()
+_jsonl_lock = threading.Lock()
+_initialized = False
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if not _initialized:
+        with _db_lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS stages (
+                        run_id TEXT,
+                        kind TEXT,
+                        stage TEXT,
+                        started REAL,
+                        seconds REAL,
+                        pages INTEGER,
+                        bytes INTEGER,
+                        tokens_in INTEGER,
+                        tokens_out INTEGER,
+                        retries INTEGER,
+                        cache_hits INTEGER,
+                        wait_s REAL,
+                        error TEXT
+                    )""")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_stages_run ON stages(run_id, started)")
+                conn.execute("DELETE FROM stages WHERE started < ?", (time.time() - KEEP_DAYS * 86400,))
+                conn.commit()
+                _initialized = True
+    return conn
+
+def _store(trace, stage):
+    if not ENABLED:
+        return
+    row = {"run_id": trace.run_id, "kind": trace.kind, **stage.as_dict()}
+    try:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT INTO stages (run_id, kind, stage, started, seconds, pages, bytes, tokens_in, "
+                "tokens_out, retries, cache_hits, wait_s, error) "
+                "VALUES (:run_id, :kind, :stage, :started, :seconds, :pages, :bytes, :tokens_in, "
+                ":tokens_out, :retries, :cache_hits, :wait_s, :error)",
+                row
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
+    if JSONL_PATH:
+        try:
+            with _jsonl_lock, open(JSONL_PATH, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(row, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+def for_run(run_id):
+    """Etapas gravadas de uma análise, por ordem de início."""
+    try:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                "SELECT * FROM stages WHERE run_id = ? ORDER BY started", (run_id,)
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return []
+    return [dict(r) for r in rows]
+
+def table(rows):
+    """Linhas prontas para st.dataframe (cabeçalhos em português, sem colunas vazias)."""
+    keys = [k for k in LABELS if any(r.get(k) for r in rows)] or ["stage", "seconds"]
+    return [{LABELS[k]: (round(r[k], 2) if isinstance(r.get(k), float) else r.get(k)) for k in keys} for r in rows]
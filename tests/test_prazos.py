@@ -0,0 +1,28 @@
+"""
+Verificação diferencial do motor de prazos (prazos.check): calendário
+vetorizado, feriados, suspensões e carteira contra a contagem dia a dia.
+
+    python -m pytest tests      (ou python -m unittest discover tests)
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import prazos
+
+SAMPLES = int(os.environ.get("SUPERAPP_CHECK_SAMPLES", "2000"))
+
+
+class CheckTest(unittest.TestCase):
+
+    def test_no_divergences(self):
+        mismatches = prazos.check(samples=SAMPLES, seed=0)
+        self.assertEqual(mismatches[:5], [])
+
+    def test_other_seed(self):
+        self.assertEqual(prazos.check(samples=SAMPLES // 4, seed=1)[:5], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Limpeza de ruído do texto extraído, entre a extração e o prompt.
+
+Os volumes de EIA repetem em todas as páginas os mesmos cabeçalhos,
+rodapés, números de página, logótipos de consultoras e linhas de índice,
+e o pypdf deixa hifenizações partidas e espaços em excesso. O limpador
+trabalha página a página (cada linha é normalizada ao ser observada e de
+novo ao ser limpa): conta em quantas páginas aparece cada linha, remove as
+que se repetem, volta a juntar as palavras hifenizadas e colapsa os
+espaços. Linhas só com números (números de página, mas também células de
+tabelas que o pypdf põe em linhas próprias) só são removidas nas primeiras
+e últimas EDGE_LINES linhas da página. Como trabalha sobre o texto de cada
+página, os marcadores [DOC: x | PÁG. n] (gerados depois, no render) ficam
+intactos.
+"""
+import re
+from collections import Counter
+
+# --- 1. PADRÕES ---
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"[ \t\u00a0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+# Só junta quando a linha seguinte continua em minúscula ("monitori-\nzação"),
+# preservando compostos como "Decreto-\nLei"
+_HYPHEN_BREAK = re.compile(r"(\w)[-\u00ad][ \t]*\n[ \t]*([a-zà-ÿ])")
+_PAGE_NUMBER = re.compile(r"^(p[aá]g(ina)?\.?\s*)?\d{1,4}(\s*(de|/|of)\s*\d{1,4})?$", re.IGNORECASE)
+_TOC_LINE = re.compile(r"(\.{4,}|…{2,}|_{4,})\s*\d{1,4}$")
+_NO_LETTERS = re.compile(r"^[\W\d_#]*$")   # Chave sem letras: valor numérico (p.ex. célula de tabela)
+
+MIN_REPEATS = 3      # Uma linha tem de surgir em pelo menos 3 páginas...
+REPEAT_RATIO = 0.5   # ...e em metade das páginas observadas
+EDGE_LINES = 2       # Linhas no topo/fundo da página onde podem estar cabeçalhos e números de página
+
+
+def _key(line):
+    # Números variam entre páginas ("Página 3 de 40"), por isso são ignorados
+    return _normalised_key(_SPACES.sub(" ", line.strip()))
+
+def _normalised_key(line):
+    """_key de uma linha já com os espaços colapsados."""
+    return _DIGITS.sub("#", line.lower())
+
+
+class BoilerplateCleaner:
+    """
+    Limpador incremental para um documento.
+    observe() regista as linhas de uma página; clean() devolve a página sem
+    ruído. Para documentos lidos a pedido basta observar algumas páginas à
+    frente da que se limpa (ver PageStream).
+    """
+
+    def __init__(self, min_repeats=MIN_REPEATS, ratio=REPEAT_RATIO):
+        self.min_repeats = min_repeats
+        self.ratio = ratio
+        self.pages_seen = 0
+        self.chars_in = 0
+        self.chars_out = 0
+        self._counts = Counter()
+
+    def observe(self, text):
+        self._counts.update({_key(l) for l in (text or "").splitlines() if l.strip()})
+        self.pages_seen += 1
+
+    def _repeated(self, key):
+        n = self._counts.get(key, 0)
+        return n >= self.min_repeats and n >= self.ratio * self.pages_seen
+
+    def clean(self, text):
+        text = text or ""
+        self.chars_in += len(text)
+        text = _HYPHEN_BREAK.sub(r"\1\2", text)
+        lines = [_SPACES.sub(" ", line).strip() for line in text.splitlines()]
+        filled = [i for i, s in enumerate(lines) if s]
+        edges = set(filled[:EDGE_LINES] + filled[-EDGE_LINES:])
+        kept = []
+        for i, s in enumerate(lines):
+            if not s:
+                if kept and kept[-1]:
+                    kept.append("")
+                continue
+            key = _normalised_key(s)
+            if _NO_LETTERS.match(key):
+                # Só números: número de página no topo/fundo, dado (tabela) no meio
+                if i in edges and _PAGE_NUMBER.match(s):
+                    continue
+            elif _PAGE_NUMBER.match(s) or _TOC_LINE.search(s) or self._repeated(key):
+                continue
+            kept.append(s)
+        out = _BLANK_LINES.sub("\n\n", "\n".join(kept).strip())
+        self.chars_out += len(out)
+        return out
+
+    @property
+    def reduction(self):
+        """Fração do texto removida (0-1)."""
+        return 1 - self.chars_out / self.chars_in if self.chars_in else 0.0
+
+
+def clean_pages(pages):
+    """Limpa uma lista de páginas completa. Devolve (páginas limpas, limpador)."""
+    cleaner = BoilerplateCleaner()
+    for p in pages:
+        cleaner.observe(p)
+    return [cleaner.clean(p) for p in pages], cleaner
+
+
+def summary(cleaners):
+    """Texto curto com a redução total obtida por vários limpadores."""
+    cleaners = [c for c in cleaners if c is not None]
+    chars_in = sum(c.chars_in for c in cleaners)
+    chars_out = sum(c.chars_out for c in cleaners)
+    if not chars_in:
+        return "🧹 Limpeza de texto: sem conteúdo."
+    pct = 100 * (1 - chars_out / chars_in)
+    return f"🧹 Limpeza de texto: {chars_in:,} → {chars_out:,} carateres (-{pct:.0f}%)".replace(",", " ")
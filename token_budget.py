@@ -0,0 +1,153 @@
+"""
+Planeamento do orçamento de tokens de um prompt.
+
+Estima localmente os tokens de cada página e de cada parte fixa do prompt
+e distribui a janela de contexto do modelo pelas fontes (SIM, FORM, PROJ,
+LOCAL, ...) segundo a sua prioridade. As páginas são lidas a pedido
+(PageStream), por isso as que não cabem nunca chegam a ser extraídas; o
+plano indica o que ficou de fora de cada fonte.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 1. JANELAS DE CONTEXTO CONHECIDAS (tokens de entrada) ---
+# Usado quando o catálogo da API não indica input_token_limit.
+KNOWN_CONTEXT_LIMITS = [
+    ("gemini-1.5-pro", 2_097_152),
+    ("gemini-1.5-flash", 1_048_576),
+    ("gemini-2.0-flash", 1_048_576),
+    ("gemini-2.5", 1_048_576),
+    ("gemini-exp", 1_048_576),
+    ("gemini-1.0-pro", 30_720),
+    ("gemini-pro", 30_720),
+    ("gemma", 8_192),
+]
+DEFAULT_CONTEXT_LIMIT = 32_768
+OUTPUT_RESERVE = 8_192   # Margem para a resposta do modelo
+SAFETY_MARGIN = 0.05     # A estimativa local não é exata
+
+# Palavras longas (típicas do português técnico) partem-se em vários tokens
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# ==========================================
+# --- 2. ESTIMATIVA ---
+# ==========================================
+
+def estimate_tokens(text):
+    """Estimativa local de tokens (~1 token por cada 6 carateres de palavra + pontuação)."""
+    if not text:
+        return 0
+    return sum(1 + (len(w) - 1) // 6 for w in _WORD_RE.findall(text))
+
+def context_limit(model_name, catalog_limit=None):
+    """Janela de entrada do modelo (tokens)."""
+    if catalog_limit:
+        return int(catalog_limit)
+    name = (model_name or "").lower()
+    for key, limit in KNOWN_CONTEXT_LIMITS:
+        if key in name:
+            return limit
+    return DEFAULT_CONTEXT_LIMIT
+
+# ==========================================
+# --- 3. PLANEAMENTO ---
+# ==========================================
+
+class Source:
+    """Fonte de texto para o prompt: fluxos de páginas com prioridade e peso."""
+
+    def __init__(self, name, streams, priority=1, weight=1.0):
+        self.name = name
+        self.streams = list(streams)
+        self.priority = priority   # 1 = mais importante
+        self.weight = weight       # Quota relativa na primeira ronda
+        self.tokens = 0
+        self._taken = [0] * len(self.streams)
+        self._stream = 0
+        self._pending = None       # Tokens da próxima página (já estimados, ainda não incluída)
+
+    @property
+    def exhausted(self):
+        return self._stream >= len(self.streams)
+
+    def _next_cost(self):
+        if self._pending is None:
+            while not self.exhausted:
+                s = self.streams[self._stream]
+                i = self._taken[self._stream]
+                if i < s.n_pages:
+                    self._pending = estimate_tokens(s.page(i).text)
+                    break
+                self._stream += 1
+        return self._pending
+
+    def fill(self, budget):
+        """Acrescenta páginas, por ordem, até esgotar `budget`. Devolve os tokens usados."""
+        used = 0
+        while True:
+            cost = self._next_cost()
+            if cost is None or used + cost > budget:
+                return used
+            used += cost
+            self.tokens += cost
+            self._taken[self._stream] += 1
+            self._pending = None
+
+    def documents(self):
+        """Documents (cortes) com as páginas incluídas."""
+        return [s.document[:n] for s, n in zip(self.streams, self._taken) if n]
+
+    def dropped(self):
+        """[(nome do ficheiro, páginas incluídas, total de páginas)] das fontes cortadas."""
+        return [(s.name, n, s.n_pages) for s, n in zip(self.streams, self._taken) if n < s.n_pages]
+
+
+class BudgetPlan:
+    def __init__(self, limit, fixed_tokens, sources):
+        self.limit = limit
+        self.fixed_tokens = fixed_tokens
+        self.sources = {s.name: s for s in sources}
+
+    @property
+    def used_tokens(self):
+        return self.fixed_tokens + sum(s.tokens for s in self.sources.values())
+
+    def documents(self, name):
+        return self.sources[name].documents() if name in self.sources else []
+
+    def report(self):
+        """Linhas legíveis com o uso por fonte e o que ficou de fora."""
+        lines = [f"Orçamento: {self.used_tokens:,} / {self.limit:,} tokens (estimados)".replace(",", " ")]
+        for s in self.sources.values():
+            cut = s.dropped()
+            if cut:
+                detail = "; ".join(f"{n}: {k}/{t} págs." for n, k, t in cut)
+                lines.append(f"- {s.name}: {s.tokens:,} tokens — cortado ({detail})".replace(",", " "))
+            elif s.streams:
+                lines.append(f"- {s.name}: {s.tokens:,} tokens — completo".replace(",", " "))
+        return lines
+
+
+def plan(sources, limit, fixed_parts=(), output_reserve=OUTPUT_RESERVE):
+    """
+    Distribui `limit` tokens pelas fontes.
+    1.ª ronda: cada fonte recebe a sua quota (peso) do orçamento disponível;
+    as fontes são lidas em simultâneo.
+    2.ª ronda: a sobra das fontes que não precisaram da quota é oferecida,
+    por ordem de prioridade, às fontes que ficaram cortadas.
+    """
+    fixed = sum(estimate_tokens(p) for p in fixed_parts)
+    available = int(limit * (1 - SAFETY_MARGIN)) - output_reserve - fixed
+    sources = sorted(sources, key=lambda s: s.priority)
+    if available <= 0 or not sources:
+        return BudgetPlan(limit, fixed, sources)
+
+    total_weight = sum(s.weight for s in sources) or 1
+    with ThreadPoolExecutor(max_workers=len(sources)) as ex:
+        used = list(ex.map(lambda s: s.fill(available * s.weight / total_weight), sources))
+    leftover = available - sum(used)
+    for s in sources:
+        if leftover <= 0:
+            break
+        leftover -= s.fill(leftover)
+    return BudgetPlan(limit, fixed, sources)
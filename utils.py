@@ -1,5 +1,8 @@
+from datetime import datetime
 import streamlit as st
-import google.generativeai as genai
+import gemini_client
+import jobs
+import telemetry
 
 def sidebar_comum():
     """
@@ -60,14 +63,109 @@ def sidebar_comum():
         # --- 3. VALIDAÇÃO VISUAL ---
         if st.session_state.api_key:
             st.success("✅ Chave Guardada!")
-            # Tenta configurar a IA silenciosamente
+            # Prepara o cliente desta chave (partilhado, sem tocar no estado global do SDK)
             try:
-                genai.configure(api_key=st.session_state.api_key)
+                gemini_client.get_client(st.session_state.api_key)
             except:
                 pass
         else:
             st.warning("⚠️ Chave em falta.")
 
+        # Respostas idênticas (mesmo modelo, prompt e ficheiros) vêm da cache
+        st.checkbox(
+            "🔁 Forçar nova geração",
+            key="force_regenerate",
+            help="Ignora as respostas guardadas em cache e volta a chamar o modelo."
+        )
+
         st.divider()
         if st.button("🏠 Voltar ao Início"):
             st.switch_page("main.py")
+
+
+# ==========================================
+# --- TRABALHOS EM SEGUNDO PLANO ---
+# ==========================================
+
+@st.fragment(run_every=2)
+def _job_panel(job_key, state_key, meta_key, render):
+    job_id = st.session_state.get(job_key)
+    job = jobs.get(job_id) if job_id else None
+    if job is None or job.finished:
+        st.session_state[job_key] = None
+        if job is not None and job.status == jobs.DONE:
+            st.session_state[state_key] = job.text
+            st.session_state[f"{state_key}_run"] = job.id
+            if meta_key:
+                st.session_state[meta_key] = job.meta
+        elif job is not None:
+            st.session_state[f"{job_key}_error"] = job.error or job.status
+        st.rerun(scope="app")
+
+    label = job.messages[-1] if job.messages else "⏳ Em fila de espera..."
+    st.progress(job.fraction, text=f"**{job.title}** — {label}")
+    with st.expander("Registo do trabalho", expanded=False):
+        st.caption("  \n".join(job.messages[-30:]) or "—")
+    if job.text:
+        getattr(st, render)(job.text + " ▌")
+    if st.button("⏹️ Cancelar", key=f"cancel_{job.id}"):
+        jobs.cancel(job.id)
+    st.caption("Pode mudar de página ou fechar o browser: o trabalho continua no servidor "
+               "e fica disponível em «Trabalhos recentes».")
+
+def job_monitor(job_key, state_key, meta_key=None, render="markdown"):
+    """
+    Acompanha o trabalho cujo ID está em st.session_state[job_key]: mostra o
+    progresso e o texto parcial (atualizados a cada 2 s) e, quando termina,
+    passa o resultado para st.session_state[state_key] (e o meta para
+    st.session_state[meta_key]).
+    """
+    error = st.session_state.pop(f"{job_key}_error", None)
+    if error == jobs.CANCELLED:
+        st.warning("⏹️ Trabalho cancelado.")
+    elif error:
+        st.error(f"❌ O trabalho falhou: {error}")
+    if st.session_state.get(job_key):
+        _job_panel(job_key, state_key, meta_key, render)
+
+def recent_jobs(kind, job_key, state_key, meta_key=None):
+    """Lista (na barra lateral) os trabalhos recentes desta API key, para retomar ou reabrir."""
+    api_key = st.session_state.get("api_key", "")
+    if not api_key:
+        return
+    recent = jobs.recent(jobs.owner_id(api_key), kind)
+    if not recent:
+        return
+    icons = {jobs.DONE: "✅", jobs.RUNNING: "⏳", jobs.QUEUED: "⏳", jobs.ERROR: "❌"}
+    with st.sidebar.expander("🗂️ Trabalhos recentes", expanded=False):
+        labels = {
+            j.id: f"{icons.get(j.status, '⏹️')} {datetime.fromtimestamp(j.created):%d/%m %H:%M} — {j.title}"
+            for j in recent
+        }
+        job_id = st.selectbox("Trabalho:", list(labels), format_func=labels.get, key=f"recent_{kind}")
+        if st.button("📂 Abrir", key=f"open_{kind}"):
+            job = jobs.get(job_id)
+            if job is None:
+                return
+            if job.finished:
+                st.session_state[job_key] = None
+                if job.status == jobs.DONE:
+                    st.session_state[state_key] = job.text
+                    st.session_state[f"{state_key}_run"] = job.id
+                    if meta_key:
+                        st.session_state[meta_key] = job.meta
+                else:
+                    st.session_state[f"{job_key}_error"] = job.error or job.status
+            else:
+                st.session_state[job_key] = job.id
+            st.rerun()
+
+def timing_table(state_key):
+    """Tabela (recolhida) com o tempo e os contadores de cada etapa da análise que gerou st.session_state[state_key]."""
+    run_id = st.session_state.get(f"{state_key}_run")
+    rows = telemetry.for_run(run_id) if run_id else []
+    if not rows:
+        return
+    with st.expander("⏱️ Tempos por etapa", expanded=False):
+        st.dataframe(telemetry.table(rows), hide_index=True, use_container_width=True)
+        st.caption(f"Total: {sum(r['seconds'] or 0 for r in rows):.1f} s, incluindo a espera em fila e por quota.")